@@ -14,9 +14,15 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy import desc
-from sqlmodel import Field, Session, SQLModel, create_engine, select
+from sqlmodel import Field, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from . import propagation, settings, submit_spot
+from .spot_window import COLUMNS, SpotWindow
+from .spot_stream import SpotFilter, SpotStream
+from .change_feed import SpotsChangeFeed
+from .database import create_async_db_engine
+from .response_cache import SpotsResponseCache
 
 
 class DX(SQLModel, table=True):
@@ -24,17 +30,17 @@ class DX(SQLModel, table=True):
 
     id: Optional[int] = Field(default=None, primary_key=True)
     dx_callsign: str
-    dx_lat: str
-    dx_lon: str
+    dx_lat: float
+    dx_lon: float
     dx_country: str
     dx_continent: str
     spotter_callsign: str
-    spotter_lat: str
-    spotter_lon: str
+    spotter_lat: float
+    spotter_lon: float
     spotter_country: str
     spotter_continent: str
-    frequency: str
-    band: str
+    frequency: float
+    band: int
     mode: str
     date_time: datetime.datetime
     comment: str
@@ -45,17 +51,17 @@ class SpotsWithIssues(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     time: datetime.time
     date: datetime.date
-    band: str
-    frequency: str
+    band: int
+    frequency: float
     spotter_callsign: str
     spotter_locator: str
-    spotter_lat: str
-    spotter_lon: str
+    spotter_lat: float
+    spotter_lon: float
     spotter_country: str
     dx_callsign: str
     dx_locator: str
-    dx_lat: str
-    dx_lon: str
+    dx_lat: float
+    dx_lon: float
     dx_country: str
     comment: str
 
@@ -83,13 +89,79 @@ async def propagation_data_collector(app):
         await asyncio.sleep(sleep)
 
 
+async def fetch_new_spots(last_id: Optional[int], start: float):
+    """holy_spots rows (in spot_window.COLUMNS order) after last_id, or since start on the first load."""
+    async with AsyncSession(engine) as session:
+        query = select(*[getattr(DX, column) for column in COLUMNS])
+        if last_id is None:
+            query = query.where(DX.date_time > datetime.datetime.fromtimestamp(start, tz=datetime.timezone.utc))
+        else:
+            query = query.where(DX.id > last_id)
+        return (await session.exec(query.order_by(DX.id))).all()
+
+
+async def fetch_spots_by_id(ids: list):
+    """holy_spots rows (in spot_window.COLUMNS order) with these ids."""
+    async with AsyncSession(engine) as session:
+        query = select(*[getattr(DX, column) for column in COLUMNS]).where(DX.id.in_(ids))
+        return (await session.exec(query.order_by(DX.id))).all()
+
+
+async def refresh_spot_window(updated: set = frozenset()):
+    now = time.time()
+    last_id = spot_window.last_id
+    rows = await fetch_new_spots(last_id, now - spot_window.seconds)
+    # Rows the collector changed in place (re-enriched locations)
+    first_id = spot_window.ids[0] if len(spot_window) else None
+    updated = sorted(spot_id for spot_id in updated if first_id is not None and first_id <= spot_id <= last_id)
+    updated_rows = await fetch_spots_by_id(updated) if updated else []
+    spot_window.append(rows)
+    spot_window.evict(now)
+    indexes = spot_window.update(updated_rows)
+    if spot_window.loaded and rows:
+        spot_stream.publish(spot_window.query(since=spot_window.start, last_id=last_id))
+    if indexes:
+        spot_stream.publish(spot_window.spots(indexes), "update")
+    spot_window.loaded = True
+    spot_window_loaded.set()
+
+
+async def spot_window_refresher():
+    """Refresh when the collector NOTIFYs new spots, with a poll every SPOTS_WINDOW_FALLBACK_POLL
+    seconds; poll every SPOTS_WINDOW_REFRESH seconds while the LISTEN connection is down."""
+    while True:
+        if change_feed is None or change_feed.has_news(spot_window.last_id):
+            updated = change_feed.take_updated() if change_feed is not None else set()
+            try:
+                await refresh_spot_window(updated)
+            except Exception as e:
+                if change_feed is not None:
+                    change_feed.updated |= updated
+                logger.exception(f"Failed to refresh spots window: {str(e)}")
+        if change_feed is not None and change_feed.listening:
+            await change_feed.wait(timeout=settings.SPOTS_WINDOW_FALLBACK_POLL)
+        else:
+            await asyncio.sleep(settings.SPOTS_WINDOW_REFRESH)
+
+
 @asynccontextmanager
 async def lifespan(app: fastapi.FastAPI):
     asyncio.get_running_loop().create_task(propagation_data_collector(app))
+    if change_feed is not None:
+        asyncio.get_running_loop().create_task(change_feed.run())
+    asyncio.get_running_loop().create_task(spot_window_refresher())
     yield
+    await engine.dispose()
 
 
-engine = create_engine(settings.DB_URL)
+engine = create_async_db_engine()
+spot_window = SpotWindow(hours=settings.SPOTS_WINDOW_HOURS)
+spot_window_loaded = asyncio.Event()  # /spots/stream snapshots wait for the first load
+spot_stream = SpotStream(queue_size=settings.SPOTS_STREAM_QUEUE_SIZE)
+spots_cache = SpotsResponseCache(size=settings.SPOTS_CACHE_SIZE)
+change_feed = SpotsChangeFeed(
+    settings.DB_URL, channel=settings.SPOTS_NOTIFY_CHANNEL, reconnect_delay=settings.SPOTS_LISTEN_RECONNECT
+) if settings.SPOTS_NOTIFY_CHANNEL else None
 app = fastapi.FastAPI(lifespan=lifespan)
 
 if settings.SSL_AVAILABLE:
@@ -103,61 +175,71 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["GET"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 
 def cleanup_spot(spot):
-    if spot.mode.upper() in ("SSB", "USB", "LSB"):
-        mode = "SSB"
-    else:
-        mode = spot.mode.upper()
-
+    # Columns are typed and mode is canonical (SSB for USB/LSB) since ingest, so this is plain copying
     return {
         "id": spot.id,
         "spotter_callsign": spot.spotter_callsign,
-        "spotter_loc": [float(spot.spotter_lon), float(spot.spotter_lat)],
+        "spotter_loc": [spot.spotter_lon, spot.spotter_lat],
         "spotter_country": spot.spotter_country,
         "spotter_continent": spot.spotter_continent,
         "dx_callsign": spot.dx_callsign,
-        "dx_loc": [float(spot.dx_lon), float(spot.dx_lat)],
+        "dx_loc": [spot.dx_lon, spot.dx_lat],
         "dx_country": spot.dx_country,
         "dx_continent": spot.dx_continent,
-        "freq": float(spot.frequency),
-        "band": int(float(spot.band)),
-        "mode": mode,
+        "freq": spot.frequency,
+        "band": spot.band,
+        "mode": spot.mode,
         "time": int(spot.date_time.timestamp()),
         "comment": spot.comment,
     }
 
 
-@app.get("/spots")
-def spots(since: Optional[int] = None, last_id: Optional[int] = None):
-    with Session(engine) as session:
-        if since is None:
-            since = int(time.time() - 3600)
-
-        query = select(DX).where(DX.date_time > datetime.datetime.fromtimestamp(since))
+async def query_spots(since: int, last_id: Optional[int] = None):
+    async with AsyncSession(engine) as session:
+        query = select(DX).where(DX.date_time > datetime.datetime.fromtimestamp(since, tz=datetime.timezone.utc))
         if last_id is not None:
             query = query.where(DX.id > last_id)
 
         query = query.order_by(desc(DX.id))
-        spots = session.exec(query).all()
+        spots = (await session.exec(query)).all()
         spots = [cleanup_spot(spot) for spot in spots]
         return spots
 
 
+@app.get("/spots")
+async def spots(request: Request, since: Optional[int] = None, last_id: Optional[int] = None):
+    if since is None:
+        since = int(time.time() - 3600)
+    if spot_window.covers(since):
+        # Encoded (and compressed) once per distinct result, with ETag / If-None-Match
+        return spots_cache.response(
+            spot_window,
+            since=since,
+            last_id=last_id,
+            accept_encoding=request.headers.get("accept-encoding"),
+            if_none_match=request.headers.get("if-none-match"),
+        )
+    # Older than the window (or before its first load)
+    return await query_spots(since, last_id)
+
+
 @app.get("/geocache/all")
-def geocache_all():
-    with Session(engine) as session:
-        geodata = session.exec(select(GeoCache)).all()
+async def geocache_all():
+    async with AsyncSession(engine) as session:
+        geodata = (await session.exec(select(GeoCache))).all()
         return [data.model_dump() for data in geodata]
 
 
 @app.get("/geocache/{callsign}")
-def geocache(callsign: str):
-    with Session(engine) as session:
+async def geocache(callsign: str):
+    async with AsyncSession(engine) as session:
         query = select(GeoCache).where(GeoCache.callsign == callsign.upper())
-        geodata = session.exec(query).one_or_none()
+        geodata = (await session.exec(query)).one_or_none()
         if geodata is not None:
             return geodata.model_dump()
         else:
@@ -165,9 +247,9 @@ def geocache(callsign: str):
 
 
 @app.get("/spots_with_issues")
-def spots_with_issues():
-    with Session(engine) as session:
-        spots = session.exec(select(SpotsWithIssues)).all()
+async def spots_with_issues():
+    async with AsyncSession(engine) as session:
+        spots = (await session.exec(select(SpotsWithIssues))).all()
         spots = [spot.model_dump() for spot in spots]
         return spots
 
@@ -185,6 +267,26 @@ async def radio(websocket: fastapi.WebSocket):
     await websocket.close()
 
 
+@app.websocket("/spots/stream")
+async def spots_stream(
+    websocket: fastapi.WebSocket,
+    bands: Optional[str] = None,
+    modes: Optional[str] = None,
+    continents: Optional[str] = None,
+):
+    """A snapshot of the last hour of spots, then new spots as they are stored and "update" messages
+    with spots whose locations were corrected (replace them by id), e.g.
+    /spots/stream?bands=20,40&modes=CW,FT8&continents=EU,AS (dx continent)."""
+
+    def snapshot(spot_filter: SpotFilter) -> list:
+        since = int(time.time() - settings.SPOTS_STREAM_SNAPSHOT_SECONDS)
+        return spot_filter.apply(spot_window.query(since=max(since, spot_window.start or since)))
+
+    await spot_stream.serve(
+        websocket, SpotFilter(bands=bands, modes=modes, continents=continents), snapshot, ready=spot_window_loaded
+    )
+
+
 @app.websocket("/submit_spot")
 async def submit_spot_one_spot(websocket: fastapi.WebSocket):
     await websocket.accept()
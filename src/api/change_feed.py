@@ -0,0 +1,130 @@
+import asyncio
+import json
+import logging
+
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+
+class SpotsChangeFeed:
+    """
+    A LISTEN connection on the channel the collector NOTIFYs after committing new holy_spots.
+
+    The psycopg2 connection's socket is watched with loop.add_reader, so notifications wake
+    wait() without a thread or a query. Besides new ids ({"last_id": ...}) the collector announces
+    rows it changed ({"updated": [ids]}); those are collected until take_updated(). A dropped connection is reopened every `reconnect_delay`
+    seconds; until then `listening` is False and callers fall back to polling.
+    """
+
+    def __init__(self, url: str, channel: str, reconnect_delay: float):
+        self.url = url
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.connection = None
+        self.fileno = None  # kept, the closed connection can't tell it
+        self.changed = asyncio.Event()
+        self.last_id = None  # highest id announced since the last poll, None: poll
+        self.updated = set()  # ids of changed rows announced since the last take_updated()
+        self.notifications = 0
+
+    @property
+    def listening(self) -> bool:
+        return self.connection is not None
+
+    def open_connection(self):
+        # A plain psycopg2 connection outside the async engine's pool: it stays open and idle for LISTEN
+        url = make_url(self.url)
+        connection = psycopg2.connect(**url.translate_connect_args(username="user", database="dbname"), **url.query)
+        connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with connection.cursor() as cursor:
+            cursor.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self.channel)))
+        return connection
+
+    async def connect(self):
+        connection = await asyncio.to_thread(self.open_connection)
+        self.fileno = connection.fileno()
+        asyncio.get_running_loop().add_reader(self.fileno, self.on_readable)
+        self.connection = connection
+        logger.info(f"Listening for new spots on {self.channel}")
+        # Spots stored while not listening were never announced
+        self.last_id = None
+        self.changed.set()
+
+    def disconnect(self):
+        if self.connection is None:
+            return
+        try:
+            asyncio.get_running_loop().remove_reader(self.fileno)
+        except (ValueError, OSError):
+            pass
+        try:
+            self.connection.close()
+        except psycopg2.Error:
+            pass
+        self.connection = None
+
+    def on_readable(self):
+        connection = self.connection
+        try:
+            connection.poll()
+        except psycopg2.Error as e:
+            logger.warning(f"LISTEN connection lost, falling back to polling: {e}")
+            self.disconnect()
+            self.last_id = None
+            self.changed.set()
+            return
+        if not connection.notifies:
+            return
+        for notify in connection.notifies:
+            self.notifications += 1
+            try:
+                payload = json.loads(notify.payload)
+            except ValueError:
+                continue
+            if not isinstance(payload, dict):
+                continue
+            if isinstance(payload.get("updated"), list):
+                self.updated.update(spot_id for spot_id in payload["updated"] if isinstance(spot_id, int))
+            last_id = payload.get("last_id")
+            if isinstance(last_id, int):
+                self.last_id = last_id if self.last_id is None else max(self.last_id, last_id)
+        connection.notifies.clear()
+        self.changed.set()
+
+    def has_news(self, last_id: int|None) -> bool:
+        """Whether spots after last_id or changed spots were announced (or new spots may have been:
+        after a timeout or reconnect)."""
+        return self.last_id is None or last_id is None or self.last_id > last_id or bool(self.updated)
+
+    def take_updated(self) -> set:
+        updated = self.updated
+        self.updated = set()
+        return updated
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for a notification (True) or the timeout (False, and has_news() until the next one)."""
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.last_id = None
+            return False
+        finally:
+            self.changed.clear()
+
+    async def run(self):
+        """Keep the LISTEN connection open."""
+        try:
+            while True:
+                if self.connection is None:
+                    try:
+                        await self.connect()
+                    except Exception as e:
+                        logger.warning(f"Can't LISTEN on {self.channel}: {e}")
+                await asyncio.sleep(self.reconnect_delay)
+        finally:
+            self.disconnect()
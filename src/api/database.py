@@ -0,0 +1,16 @@
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from . import settings
+
+
+def create_async_db_engine(url: str = settings.ASYNC_DB_URL) -> AsyncEngine:
+    """asyncpg engine for the API handlers: a bounded pool, pre-ping, and a server side statement
+    timeout so a slow query gives up instead of holding a pool connection."""
+    return create_async_engine(
+        url,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+        connect_args={"server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT)}},
+    )
@@ -0,0 +1,109 @@
+import gzip
+import importlib.util
+from collections import OrderedDict
+
+import orjson
+from fastapi import Response
+
+# brotli is optional: without it clients get gzip
+if importlib.util.find_spec("brotli") is not None:
+    import brotli
+else:
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+MIN_COMPRESS_SIZE = 512  # smaller bodies are sent as they are
+
+
+def accepted_encodings(accept_encoding: str|None) -> set:
+    """Content codings of an Accept-Encoding header, without the ones refused with q=0."""
+    encodings = set()
+    for item in (accept_encoding or "").split(","):
+        coding, _, parameters = item.strip().partition(";")
+        parameters = parameters.replace(" ", "")
+        if coding and parameters not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            encodings.add(coding.lower())
+    return encodings
+
+
+def etag_matches(if_none_match: str|None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" are the same
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+class CachedBody:
+    """One JSON body, encoded once, with its compressed variants made on first use."""
+
+    def __init__(self, body: bytes, etag: str):
+        self.body = body
+        self.etag = etag
+        self.variants = {}
+
+    def encoded(self, encodings: set) -> tuple:
+        """(body, Content-Encoding or None) for a client accepting encodings."""
+        if len(self.body) < MIN_COMPRESS_SIZE:
+            return self.body, None
+        if brotli is not None and "br" in encodings:
+            coding = "br"
+        elif "gzip" in encodings:
+            coding = "gzip"
+        else:
+            return self.body, None
+        if coding not in self.variants:
+            if coding == "br":
+                self.variants[coding] = brotli.compress(self.body, quality=BROTLI_QUALITY)
+            else:
+                self.variants[coding] = gzip.compress(self.body, compresslevel=GZIP_LEVEL, mtime=0)
+        return self.variants[coding], coding
+
+
+class SpotsResponseCache:
+    """
+    /spots bodies from the window by key, least recently used first out.
+
+    The key is the normalized query: the window's version (bumped when stored rows change), the
+    first row the query may include, the window's last id (new rows are only appended, so with the
+    version this pins the data) and how many of the candidate rows the `since` filter dropped.
+    Different since/last_id values selecting the same spots share one entry, and the key doubles as
+    the ETag.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def body(self, window, since: int, last_id: int|None) -> CachedBody:
+        first, indexes = window.match(since=since, last_id=last_id)
+        first_id = window.ids[first] if first < len(window) else None
+        key = (window.version, first_id, window.last_id, len(window) - first - len(indexes))
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+        self.misses += 1
+        etag = f'W/"{window.version}-{first_id}-{window.last_id}-{key[3]}"' if indexes else f'W/"empty-{window.last_id}"'
+        entry = CachedBody(orjson.dumps(window.spots(indexes)), etag=etag)
+        self.entries[key] = entry
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return entry
+
+    def response(self, window, since: int, last_id: int|None,
+                 accept_encoding: str|None, if_none_match: str|None) -> Response:
+        entry = self.body(window, since=since, last_id=last_id)
+        headers = {"ETag": entry.etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+        if etag_matches(if_none_match, entry.etag):
+            return Response(status_code=304, headers=headers)
+        body, coding = entry.encoded(accepted_encodings(accept_encoding))
+        if coding is not None:
+            headers["Content-Encoding"] = coding
+        return Response(content=body, media_type="application/json", headers=headers)
@@ -12,6 +12,13 @@ PSQL_PASSWORD = env.str("PSQL_PASSWORD")
 DATABASE = "holy_cluster"
 GENERAL_DB_URL = f"postgresql+psycopg2://{PSQL_USERNAME}:{PSQL_PASSWORD}@{HOST}:{PORT}"
 DB_URL = f"{GENERAL_DB_URL}/{DATABASE}"
+ASYNC_DB_URL = f"postgresql+asyncpg://{PSQL_USERNAME}:{PSQL_PASSWORD}@{HOST}:{PORT}/{DATABASE}"
+
+# Async engine used by the API handlers
+DB_POOL_SIZE = env.int("DB_POOL_SIZE", 10)
+DB_MAX_OVERFLOW = env.int("DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = env.float("DB_POOL_TIMEOUT", 10)  # seconds to wait for a free connection
+DB_STATEMENT_TIMEOUT = env.int("DB_STATEMENT_TIMEOUT", 5000)  # milliseconds, enforced by Postgres
 
 SSL_KEYFILE = env.str("SSL_KEYFILE", None)
 SSL_CERTFILE = env.str("SSL_CERTFILE", None)
@@ -19,3 +26,20 @@ SSL_AVAILABLE = SSL_KEYFILE is not None and SSL_CERTFILE is not None
 
 UI_DIR = env.path("UI_DIR")
 CATSERVER_MSI_DIR = env.path("CATSERVER_MSI_DIR")
+
+# /spots is answered from an in-memory window of the last SPOTS_WINDOW_HOURS of holy_spots,
+# refreshed from the database every SPOTS_WINDOW_REFRESH seconds
+SPOTS_WINDOW_HOURS = env.float("SPOTS_WINDOW_HOURS", 3)
+SPOTS_WINDOW_REFRESH = env.float("SPOTS_WINDOW_REFRESH", 2)
+SPOTS_CACHE_SIZE = env.int("SPOTS_CACHE_SIZE", 256)  # encoded /spots responses kept
+
+# The collector NOTIFYs this channel after storing spots; while the API's LISTEN connection is up
+# the window refreshes on notifications, plus a poll every SPOTS_WINDOW_FALLBACK_POLL seconds
+SPOTS_NOTIFY_CHANNEL = env.str("SPOTS_NOTIFY_CHANNEL", "holy_spots")  # empty: poll only
+SPOTS_WINDOW_FALLBACK_POLL = env.float("SPOTS_WINDOW_FALLBACK_POLL", 30)
+SPOTS_LISTEN_RECONNECT = env.float("SPOTS_LISTEN_RECONNECT", 5)
+
+# /spots/stream: seconds of spots in the initial snapshot, and messages queued per client before
+# a client that doesn't keep up is disconnected
+SPOTS_STREAM_SNAPSHOT_SECONDS = env.int("SPOTS_STREAM_SNAPSHOT_SECONDS", 3600)
+SPOTS_STREAM_QUEUE_SIZE = env.int("SPOTS_STREAM_QUEUE_SIZE", 100)
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import logging
+
+import fastapi
+from fastapi import websockets
+
+logger = logging.getLogger(__name__)
+
+SLOW_CONSUMER_CLOSE_CODE = 1013  # "try again later": the client reconnects and gets a fresh snapshot
+
+
+def parse_list(value) -> frozenset|None:
+    """"20,40" or ["20", 40] -> frozenset of strings; empty or missing means no filter."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(",")
+    values = frozenset(str(item).strip().upper() for item in value if str(item).strip())
+    return values or None
+
+
+class SpotFilter:
+    """Bands, modes and dx continents a connection wants; None lets everything through."""
+
+    def __init__(self, bands=None, modes=None, continents=None):
+        self.bands = parse_list(bands)
+        self.modes = parse_list(modes)
+        self.continents = parse_list(continents)
+
+    @classmethod
+    def from_message(cls, message: dict) -> "SpotFilter":
+        return cls(bands=message.get("bands"), modes=message.get("modes"), continents=message.get("continents"))
+
+    @property
+    def key(self) -> tuple:
+        return self.bands, self.modes, self.continents
+
+    def matches(self, spot: dict) -> bool:
+        if self.bands is not None and str(spot["band"]) not in self.bands:
+            return False
+        if self.modes is not None and (spot["mode"] or "").upper() not in self.modes:
+            return False
+        if self.continents is not None and (spot["dx_continent"] or "").upper() not in self.continents:
+            return False
+        return True
+
+    def apply(self, spots: list) -> list:
+        if self.key == (None, None, None):
+            return spots
+        return [spot for spot in spots if self.matches(spot)]
+
+
+def encode_message(message_type: str, spots: list) -> str:
+    return json.dumps({"type": message_type, "spots": spots}, separators=(",", ":"))
+
+
+class Subscriber:
+    def __init__(self, spot_filter: SpotFilter, queue_size: int):
+        self.filter = spot_filter
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.slow = asyncio.Event()
+
+
+class SpotStream:
+    """
+    Fans newly stored spots out to the /spots/stream WebSockets.
+
+    publish() is called on the event loop with the spots the window just added (or, as "update"
+    messages, the ones it replaced); each subscriber gets them filtered and encoded (once per
+    distinct filter) on its own bounded queue. A
+    subscriber whose queue is full is disconnected instead of blocking the others or silently
+    missing spots.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self.subscribers)
+
+    def subscribe(self, spot_filter: SpotFilter) -> Subscriber:
+        subscriber = Subscriber(spot_filter, queue_size=self.queue_size)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def publish(self, spots: list, message_type: str = "spots"):
+        if not spots or not self.subscribers:
+            return
+        encoded = {}
+        for subscriber in list(self.subscribers):
+            key = subscriber.filter.key
+            if key not in encoded:
+                matching = subscriber.filter.apply(spots)
+                encoded[key] = encode_message(message_type, matching) if matching else None
+            if encoded[key] is not None:
+                self.send(subscriber, encoded[key])
+
+    def send(self, subscriber: Subscriber, message: str):
+        try:
+            subscriber.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self.unsubscribe(subscriber)
+            subscriber.slow.set()
+
+    async def serve(self, websocket: fastapi.WebSocket, spot_filter: SpotFilter, snapshot,
+                    ready: asyncio.Event|None = None):
+        """Send snapshot(filter) and then every published spot until the client goes away.
+        Sending {"bands": [...], "modes": [...], "continents": [...]} changes the filter and gets a
+        new snapshot. With ready, the snapshot waits until it is set (the window's first load, which
+        isn't published)."""
+        await websocket.accept()
+        if ready is not None:
+            await ready.wait()
+        # Subscribed before the snapshot is taken, with no await in between: no spot falls in the gap
+        subscriber = self.subscribe(spot_filter)
+        self.send(subscriber, encode_message("snapshot", snapshot(spot_filter)))
+        sender = asyncio.create_task(self.send_messages(websocket, subscriber))
+        receiver = asyncio.create_task(self.receive_filters(websocket, subscriber, snapshot))
+        slow = asyncio.create_task(subscriber.slow.wait())
+        try:
+            await asyncio.wait([sender, receiver, slow], return_when=asyncio.FIRST_COMPLETED)
+            if subscriber.slow.is_set():
+                logger.warning(f"Disconnecting slow /spots/stream client {websocket.client}")
+                await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        except (websockets.WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            self.unsubscribe(subscriber)
+            for task in (sender, receiver, slow):
+                task.cancel()
+            await asyncio.gather(sender, receiver, slow, return_exceptions=True)
+
+    async def send_messages(self, websocket: fastapi.WebSocket, subscriber: Subscriber):
+        while True:
+            message = await subscriber.queue.get()
+            await websocket.send_text(message)
+
+    async def receive_filters(self, websocket: fastapi.WebSocket, subscriber: Subscriber, snapshot):
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except (json.JSONDecodeError, KeyError):
+                continue
+            except websockets.WebSocketDisconnect:
+                return
+            if isinstance(message, dict):
+                subscriber.filter = SpotFilter.from_message(message)
+                self.send(subscriber, encode_message("snapshot", snapshot(subscriber.filter)))
@@ -0,0 +1,220 @@
+import math
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+# holy_spots columns held by the window, in the order refresh() selects them
+COLUMNS = (
+    "id",
+    "date_time",
+    "spotter_callsign",
+    "spotter_lat",
+    "spotter_lon",
+    "spotter_country",
+    "spotter_continent",
+    "dx_callsign",
+    "dx_lat",
+    "dx_lon",
+    "dx_country",
+    "dx_continent",
+    "frequency",
+    "band",
+    "mode",
+    "comment",
+)
+# Few distinct values, repeated on many spots: stored as codes into a StringDictionary
+ENCODED_COLUMNS = (
+    "spotter_callsign",
+    "spotter_country",
+    "spotter_continent",
+    "dx_callsign",
+    "dx_country",
+    "dx_continent",
+    "mode",
+)
+FLOAT_COLUMNS = ("spotter_lat", "spotter_lon", "dx_lat", "dx_lon", "frequency")
+NO_BAND = -1
+# Rebuild a dictionary when it holds this many times more strings than the window has rows
+COMPACT_RATIO = 4
+COMPACT_MIN_SIZE = 1024
+
+
+class StringDictionary:
+    """Interned strings by code; code 0 is None."""
+
+    def __init__(self):
+        self.values = [None]
+        self.codes = {None: 0}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, value: str|None) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+
+def float_or_none(value: float) -> float|None:
+    return None if math.isnan(value) else value
+
+
+class SpotWindow:
+    """
+    The last `hours` of holy_spots, held column by column in the API process.
+
+    Rows are appended in id order; the API only asks the database for ids above last_id, so the
+    query load doesn't grow with the number of clients. Rows the collector changes later (locations
+    corrected by re-enrichment) are replaced with update(), which bumps `version`. Repeated strings
+    are dictionary encoded, numbers live in typed arrays.
+
+    Lookups by last_id bisect the id column. date_time isn't strictly increasing with id (spots are
+    stored with the time they were spotted), so `since` bisects a running maximum of the times:
+    every row before that point is at or before `since`, the rest are checked one by one.
+    """
+
+    def __init__(self, hours: float):
+        self.seconds = hours * 3600
+        self.dictionaries = {column: StringDictionary() for column in ENCODED_COLUMNS}
+        self.ids = array("q")
+        self.times = array("q")
+        self.max_times = array("q")  # running maximum of times
+        self.codes = {column: array("i") for column in ENCODED_COLUMNS}
+        self.floats = {column: array("d") for column in FLOAT_COLUMNS}
+        self.bands = array("h")
+        self.comments = []
+        self.loaded = False
+        self.start = None  # spots after this time (unix seconds) are all in the window
+        self.version = 0  # bumped when rows already in the window change
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def last_id(self) -> int|None:
+        return self.ids[-1] if self.ids else None
+
+    def covers(self, since: int) -> bool:
+        return self.loaded and since >= self.start
+
+    def append(self, rows):
+        """Add holy_spots rows (tuples in COLUMNS order) with ids above last_id, in id order."""
+        last_id = self.last_id
+        max_time = self.max_times[-1] if self.max_times else 0
+        for row in rows:
+            (spot_id, date_time, spotter_callsign, spotter_lat, spotter_lon, spotter_country, spotter_continent,
+             dx_callsign, dx_lat, dx_lon, dx_country, dx_continent, frequency, band, mode, comment) = row
+            if last_id is not None and spot_id <= last_id:
+                continue
+            last_id = spot_id
+            spot_time = int(date_time.timestamp())
+            max_time = max(max_time, spot_time)
+            self.ids.append(spot_id)
+            self.times.append(spot_time)
+            self.max_times.append(max_time)
+            for column, value in (
+                ("spotter_callsign", spotter_callsign),
+                ("spotter_country", spotter_country),
+                ("spotter_continent", spotter_continent),
+                ("dx_callsign", dx_callsign),
+                ("dx_country", dx_country),
+                ("dx_continent", dx_continent),
+                ("mode", mode),
+            ):
+                self.codes[column].append(self.dictionaries[column].encode(value))
+            for column, value in (
+                ("spotter_lat", spotter_lat),
+                ("spotter_lon", spotter_lon),
+                ("dx_lat", dx_lat),
+                ("dx_lon", dx_lon),
+                ("frequency", frequency),
+            ):
+                self.floats[column].append(math.nan if value is None else value)
+            self.bands.append(NO_BAND if band is None else band)
+            self.comments.append(comment)
+
+    def update(self, rows) -> list:
+        """Replace the rows with these ids (tuples in COLUMNS order) that are in the window; date_time
+        is kept. Returns their indexes."""
+        indexes = []
+        for row in rows:
+            index = bisect_left(self.ids, row[0])
+            if index == len(self.ids) or self.ids[index] != row[0]:
+                continue
+            values = dict(zip(COLUMNS, row))
+            for column in ENCODED_COLUMNS:
+                self.codes[column][index] = self.dictionaries[column].encode(values[column])
+            for column in FLOAT_COLUMNS:
+                self.floats[column][index] = math.nan if values[column] is None else values[column]
+            self.bands[index] = NO_BAND if values["band"] is None else values["band"]
+            self.comments[index] = values["comment"]
+            indexes.append(index)
+        if indexes:
+            self.version += 1
+        return indexes
+
+    def evict(self, now: float|None = None):
+        """Drop the rows older than the window."""
+        start = int((now if now is not None else time.time()) - self.seconds)
+        self.start = start if self.start is None else max(self.start, start)
+        count = bisect_right(self.max_times, self.start)
+        if count:
+            for column in (self.ids, self.times, self.max_times, self.bands, self.comments,
+                           *self.codes.values(), *self.floats.values()):
+                del column[:count]
+        for column, dictionary in self.dictionaries.items():
+            if len(dictionary) > max(COMPACT_MIN_SIZE, COMPACT_RATIO * len(self.ids)):
+                self.compact(column)
+
+    def compact(self, column: str):
+        """Re-encode a column with a dictionary of only the strings still in the window."""
+        old_values = self.dictionaries[column].values
+        dictionary = StringDictionary()
+        self.codes[column] = array("i", [dictionary.encode(old_values[code]) for code in self.codes[column]])
+        self.dictionaries[column] = dictionary
+
+    def spot(self, index: int, values: dict|None = None) -> dict:
+        """The row at index, in the /spots JSON format."""
+        codes = self.codes
+        if values is None:
+            values = {column: dictionary.values for column, dictionary in self.dictionaries.items()}
+        floats = self.floats
+        band = self.bands[index]
+        return {
+            "id": self.ids[index],
+            "spotter_callsign": values["spotter_callsign"][codes["spotter_callsign"][index]],
+            "spotter_loc": [float_or_none(floats["spotter_lon"][index]), float_or_none(floats["spotter_lat"][index])],
+            "spotter_country": values["spotter_country"][codes["spotter_country"][index]],
+            "spotter_continent": values["spotter_continent"][codes["spotter_continent"][index]],
+            "dx_callsign": values["dx_callsign"][codes["dx_callsign"][index]],
+            "dx_loc": [float_or_none(floats["dx_lon"][index]), float_or_none(floats["dx_lat"][index])],
+            "dx_country": values["dx_country"][codes["dx_country"][index]],
+            "dx_continent": values["dx_continent"][codes["dx_continent"][index]],
+            "freq": float_or_none(floats["frequency"][index]),
+            "band": None if band == NO_BAND else band,
+            "mode": values["mode"][codes["mode"][index]],
+            "time": self.times[index],
+            "comment": self.comments[index],
+        }
+
+    def match(self, since: int, last_id: int|None = None) -> tuple:
+        """(first, indexes): the rows with time > since and id > last_id, newest id first, are all at
+        or after index first."""
+        first = bisect_right(self.max_times, since)
+        if last_id is not None:
+            first = max(first, bisect_right(self.ids, last_id))
+        times = self.times
+        return first, [index for index in range(len(self.ids) - 1, first - 1, -1) if times[index] > since]
+
+    def spots(self, indexes: list) -> list:
+        values = {column: dictionary.values for column, dictionary in self.dictionaries.items()}
+        return [self.spot(index, values) for index in indexes]
+
+    def query(self, since: int, last_id: int|None = None) -> list:
+        """Spots with time > since and id > last_id, newest id first (like the /spots query)."""
+        _, indexes = self.match(since=since, last_id=last_id)
+        return self.spots(indexes)
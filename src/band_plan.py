@@ -0,0 +1,135 @@
+import re
+from bisect import bisect_left
+from typing import NamedTuple
+
+
+class BandSegment(NamedTuple):
+    lower: float    # kHz, inclusive
+    upper: float    # kHz, inclusive
+    band: int|None  # meters; None for sub-bands that only set the mode
+    mode: str|None
+
+
+# The whole band plan in one table. Bands first, then digital sub-bands; where sub-bands touch
+# (e.g. 3575.0 is both FT8 and FT4) the earlier row wins.
+BAND_PLAN = [
+    BandSegment(1800.0, 2000.0, 160, None),
+    BandSegment(3500.0, 4000.0, 80, None),
+    BandSegment(5250.0, 5450.0, 60, None),
+    BandSegment(7000.0, 7300.0, 40, None),
+    BandSegment(10100.0, 10150.0, 30, None),
+    BandSegment(14000.0, 14350.0, 20, None),
+    BandSegment(18068.0, 18168.0, 17, None),
+    BandSegment(21000.0, 21450.0, 15, None),
+    BandSegment(24890.0, 24990.0, 12, None),
+    BandSegment(28000.0, 29700.0, 10, None),
+    BandSegment(50000.0, 54000.0, 6, None),
+    BandSegment(70000.0, 70500.0, 4, None),
+    BandSegment(144000.0, 148000.0, 2, None),
+
+    BandSegment(1840.0, 1843.0, None, "FT8"),
+    BandSegment(3573.0, 3575.0, None, "FT8"),
+    BandSegment(5357.0, 5360.5, None, "FT8"),
+    BandSegment(7074.0, 7077.0, None, "FT8"),
+    BandSegment(10136.0, 10139.0, None, "FT8"),
+    BandSegment(14074.0, 14077.0, None, "FT8"),
+    BandSegment(18100.0, 18104.0, None, "FT8"),
+    BandSegment(21074.0, 21077.0, None, "FT8"),
+    BandSegment(24915.0, 24918.0, None, "FT8"),
+    BandSegment(28074.0, 28077.0, None, "FT8"),
+    BandSegment(50313.0, 50316.0, None, "FT8"),
+    BandSegment(50323.0, 50326.0, None, "FT8"),  # 6m alternative
+
+    BandSegment(3575.0, 3578.0, None, "FT4"),
+    BandSegment(7047.5, 7050.5, None, "FT4"),
+    BandSegment(10140.0, 10143.0, None, "FT4"),
+    BandSegment(14080.0, 14083.0, None, "FT4"),
+    BandSegment(18104.0, 18107.0, None, "FT4"),
+    BandSegment(21140.0, 21143.0, None, "FT4"),
+    BandSegment(24919.0, 24922.0, None, "FT4"),
+    BandSegment(28180.0, 28183.0, None, "FT4"),
+    BandSegment(50318.0, 50321.0, None, "FT4"),
+]
+
+FT8_COMMENT_REGEX = re.compile("FT8", re.IGNORECASE)
+FT4_COMMENT_REGEX = re.compile("FT4", re.IGNORECASE)
+
+# Sources report sideband modes separately, clients only know SSB
+CANONICAL_MODES = {"USB": "SSB", "LSB": "SSB"}
+
+
+def classify_with_table(frequency: float, band_plan: list) -> tuple:
+    # Linear scan, only used to build the index
+    band = None
+    mode = None
+    for segment in band_plan:
+        if segment.lower <= frequency <= segment.upper:
+            if band is None and segment.band is not None:
+                band = segment.band
+            if mode is None and segment.mode is not None:
+                mode = segment.mode
+    return band, mode
+
+
+def build_interval_index(band_plan: list) -> tuple:
+    """
+    Flatten the (overlapping) segments into sorted boundaries.
+    points[i] is classified as at_points[i], the open interval (points[i], points[i+1]) as between_points[i].
+    """
+    points = sorted({bound for segment in band_plan for bound in (segment.lower, segment.upper)})
+    at_points = [classify_with_table(point, band_plan) for point in points]
+    between_points = [
+        classify_with_table((lower + upper) / 2, band_plan)
+        for lower, upper in zip(points, points[1:])
+    ]
+    between_points.append((None, None))
+    return points, at_points, between_points
+
+
+BAND_PLAN_INDEX = build_interval_index(BAND_PLAN)
+
+
+def parse_frequency(frequency) -> float|None:
+    try:
+        return float(frequency)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_band(band) -> int|None:
+    # "20", "20.0" and 20 are all the 20m band
+    try:
+        return int(float(band))
+    except (TypeError, ValueError):
+        return None
+
+
+def canonical_mode(mode: str|None) -> str|None:
+    if mode is None:
+        return None
+    mode = mode.upper()
+    return CANONICAL_MODES.get(mode, mode)
+
+
+def classify_frequency(frequency) -> tuple:
+    """Return (band, mode) for a frequency in kHz; mode is only set inside FT8/FT4 sub-bands."""
+    frequency = parse_frequency(frequency)
+    if frequency is None:
+        return None, None
+    points, at_points, between_points = BAND_PLAN_INDEX
+    index = bisect_left(points, frequency)
+    if index < len(points) and points[index] == frequency:
+        return at_points[index]
+    if index == 0:
+        return None, None
+    return between_points[index - 1]
+
+
+def classify_spot(frequency, comment: str|None, mode: str) -> tuple:
+    """Return (band, mode) for a spot: FT8/FT4 by sub-band or comment, otherwise the reported mode (canonical)."""
+    band, segment_mode = classify_frequency(frequency)
+    if segment_mode == "FT8" or (comment and FT8_COMMENT_REGEX.search(comment)):
+        mode = "FT8"
+    elif segment_mode == "FT4" or (comment and FT4_COMMENT_REGEX.search(comment)):
+        mode = "FT4"
+    return band, canonical_mode(mode)
@@ -0,0 +1,68 @@
+from loguru import logger
+from sqlalchemy import literal_column
+from sqlalchemy.dialects.postgresql import insert
+
+from settings import BULK_INSERT_CHUNK_SIZE
+
+
+def chunks(records: list, size: int = BULK_INSERT_CHUNK_SIZE):
+    for index in range(0, len(records), size):
+        yield records[index:index + size]
+
+
+def bulk_insert_do_nothing_returning_ids(session, model, records: list, index_elements: list) -> list:
+    """Insert records (list of dicts) with one multi-row INSERT ... ON CONFLICT DO NOTHING per chunk.
+
+    Returns the primary keys of the inserted rows.
+    """
+    primary_key = list(model.__table__.primary_key.columns)[0]
+    ids = []
+    for chunk in chunks(records):
+        stmt = insert(model).values(chunk)
+        stmt = stmt.on_conflict_do_nothing(index_elements=index_elements).returning(primary_key)
+        ids.extend(row[0] for row in session.execute(stmt).all())
+    return ids
+
+
+def bulk_insert_do_nothing(session, model, records: list, index_elements: list, debug: bool = False) -> tuple:
+    """Insert records (list of dicts) with one multi-row INSERT ... ON CONFLICT DO NOTHING per chunk.
+
+    Returns (inserted, skipped).
+    """
+    if not records:
+        return 0, 0
+    inserted = len(bulk_insert_do_nothing_returning_ids(session, model, records, index_elements))
+    skipped = len(records) - inserted
+    if debug:
+        logger.debug(f"{model.__tablename__}: {inserted=} {skipped=}")
+    return inserted, skipped
+
+
+def bulk_upsert(session, model, records: list, index_elements: list, debug: bool = False) -> tuple:
+    """Insert or update records (list of dicts) with one multi-row INSERT ... ON CONFLICT DO UPDATE per chunk.
+
+    Records are deduplicated by index_elements first (the last one wins), as Postgres refuses
+    to update the same row twice in one statement. Returns (inserted, updated).
+    """
+    if not records:
+        return 0, 0
+    unique_records = {tuple(record[key] for key in index_elements): record for record in records}
+    records = list(unique_records.values())
+    inserted = 0
+    updated = 0
+    for chunk in chunks(records):
+        stmt = insert(model).values(chunk)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={col: getattr(stmt.excluded, col) for col in chunk[0] if col not in index_elements}
+        )
+        # xmax is 0 only for freshly inserted rows
+        stmt = stmt.returning(literal_column("xmax = 0"))
+        for (was_inserted,) in session.execute(stmt).all():
+            if was_inserted:
+                inserted += 1
+            else:
+                updated += 1
+    if debug:
+        logger.debug(f"{model.__tablename__}: {inserted=} {updated=}")
+    return inserted, updated
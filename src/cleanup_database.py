@@ -5,7 +5,7 @@ from sqlalchemy import inspect
 from sqlalchemy.exc import SQLAlchemyError, ProgrammingError, OperationalError
 from sqlalchemy.orm import sessionmaker
 
-from db_classes import HolySpot, DxheatRaw, GeoCache 
+from db_classes import HolySpot, DxheatRaw, GeoCache, QrzNegativeCache
 from misc import string_to_boolean, open_log_file
 
 from settings import (
@@ -44,14 +44,19 @@ def main(debug: bool = False):
                 logger.info(f"Before cleanup: Table: {table_name:12}   records: {record_count}")
 
                 # Perform deletion
-                records = session.query(model).filter(model.date_time < cutoff_datetime).all()
+                if model is GeoCache:
+                    # geo_cache.date_time is naive UTC (see geo_cache_store)
+                    cutoff = cutoff_datetime.replace(tzinfo=None)
+                else:
+                    cutoff = cutoff_datetime
+                records = session.query(model).filter(model.date_time < cutoff).all()
                 logger.info(f"records to delete: {len(records)}")
                 for record in records:
                     if debug:
                         logger.debug(f"Record date_time: {record.date_time.replace(tzinfo=timezone.utc)}, Cutoff: {cutoff_datetime.replace(tzinfo=timezone.utc)}")
 
                 deleted_count = session.query(model).filter(
-                        model.date_time < cutoff_datetime
+                        model.date_time < cutoff
                 ).delete(synchronize_session="fetch")
                 if debug:
                     logger.debug(f"Deleted {deleted_count} records from {table_name}")
@@ -61,6 +66,13 @@ def main(debug: bool = False):
                 record_count = session.query(func.count(getattr(model, pk))).scalar()
                 logger.info(f"After  cleanup: Table: {table_name:12}   records: {record_count}")
 
+            # qrz_negative_cache entries have their own expiry time
+            deleted_count = session.query(QrzNegativeCache).filter(
+                    QrzNegativeCache.expires < datetime.now(timezone.utc).replace(tzinfo=None)  # naive UTC column
+            ).delete(synchronize_session=False)
+            session.commit()
+            logger.info(f"Expired records deleted from qrz_negative_cache: {deleted_count}")
+
         except (ProgrammingError, OperationalError) as e:
             logger.error(f"Database error: {e}")
         except Exception as e:
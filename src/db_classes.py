@@ -1,4 +1,4 @@
-from sqlalchemy import UniqueConstraint, Column, Integer, Text, Boolean, Time, Date, DateTime
+from sqlalchemy import UniqueConstraint, Column, Integer, SmallInteger, Double, Text, Boolean, Time, Date, DateTime
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -8,8 +8,8 @@ class GeoCache(Base):
      __tablename__ = 'geo_cache'
      callsign = Column(Text, primary_key=True)
      locator = Column(Text)
-     lat = Column(Text)
-     lon = Column(Text)
+     lat = Column(Double)
+     lon = Column(Double)
      country = Column(Text)
      continent = Column(Text)
      date = Column(Date)
@@ -34,6 +34,28 @@ class GeoCache(Base):
         }
 
 
+class QrzNegativeCache(Base):
+     __tablename__ = 'qrz_negative_cache'
+     callsign = Column(Text, primary_key=True)
+     error = Column(Text)
+     permanent = Column(Boolean)
+     expires = Column(DateTime)
+     date_time = Column(DateTime)
+
+     def __repr__(self):
+        return(f"<QrzNegativeCache(callsign={self.callsign}, error={self.error}, permanent={self.permanent}, "
+               f"expires={self.expires}, date_time={self.date_time}>")
+
+     def to_dict(self):
+        return {
+            'callsign': self.callsign,
+            'error': self.error,
+            'permanent': self.permanent,
+            'expires': self.expires,
+            'date_time': self.date_time,
+        }
+
+
 class DxheatRaw(Base):
     __tablename__ = 'dxheat_raw'
     id = Column(Integer, primary_key=True) 
@@ -109,18 +131,18 @@ class HolySpot(Base):
     date_time = Column(DateTime)
     mode = Column(Text)
     missing_mode = Column(Boolean)
-    band = Column(Text)
-    frequency = Column(Text)
+    band = Column(SmallInteger)
+    frequency = Column(Double)
     spotter_callsign = Column(Text)
     spotter_locator = Column(Text)
-    spotter_lat = Column(Text)
-    spotter_lon = Column(Text)
+    spotter_lat = Column(Double)
+    spotter_lon = Column(Double)
     spotter_country = Column(Text)
     spotter_continent = Column(Text)
     dx_callsign = Column(Text)
     dx_locator = Column(Text)
-    dx_lat = Column(Text)
-    dx_lon = Column(Text)
+    dx_lat = Column(Double)
+    dx_lon = Column(Double)
     dx_country = Column(Text)
     dxcc_number = Column(Integer)
     dx_continent = Column(Text)
@@ -170,18 +192,18 @@ class SpotWithIssue(Base):
     date_time = Column(DateTime)
     mode = Column(Text)
     missing_mode = Column(Boolean)
-    band = Column(Text)
-    frequency = Column(Text)
+    band = Column(SmallInteger)
+    frequency = Column(Double)
     spotter_callsign = Column(Text)
     spotter_locator = Column(Text)
-    spotter_lat = Column(Text)
-    spotter_lon = Column(Text)
+    spotter_lat = Column(Double)
+    spotter_lon = Column(Double)
     spotter_country = Column(Text)
     spotter_continent = Column(Text)
     dx_callsign = Column(Text)
     dx_locator = Column(Text)
-    dx_lat = Column(Text)
-    dx_lon = Column(Text)
+    dx_lat = Column(Double)
+    dx_lon = Column(Double)
     dx_country = Column(Text)
     dxcc_number = Column(Integer)
     dx_continent = Column(Text)
@@ -0,0 +1,99 @@
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple
+
+grandparent_folder = Path(__file__).parents[1]
+dxcc_filename = f"{grandparent_folder}/src/dxcc.json"
+
+# Portable designators that don't change the DXCC entity
+IGNORED_SUFFIXES = {"P", "M", "QRP", "A", "B", "LH", "J"}
+# Maritime / aeronautical mobile don't count for any entity
+NO_ENTITY_SUFFIXES = {"MM", "AM"}
+
+
+class DxccEntity(NamedTuple):
+    entity_code: int
+    name: str
+    country_code: str
+    continent: str
+    cq_zones: tuple
+    itu_zones: tuple
+
+
+class DxccMatcher(NamedTuple):
+    regex: re.Pattern
+    prefixes: tuple
+    entity: DxccEntity
+
+
+def read_dxcc_matchers(filename: str) -> list:
+    with open(filename, 'r') as file:
+        dxcc = json.load(file)["dxcc"]
+    matchers = []
+    for entry in dxcc:
+        if entry["deleted"] or not entry["prefixRegex"]:
+            continue
+        entity = DxccEntity(
+            entity_code=entry["entityCode"],
+            name=entry["name"],
+            country_code=entry["countryCode"],
+            continent=entry["continent"][0] if entry["continent"] else None,
+            cq_zones=tuple(entry["cq"]),
+            itu_zones=tuple(entry["itu"]),
+        )
+        prefixes = tuple(prefix for prefix in entry["prefix"].split(",") if prefix)
+        matchers.append(DxccMatcher(regex=re.compile(entry["prefixRegex"]), prefixes=prefixes, entity=entity))
+    return matchers
+
+
+def build_first_character_index(matchers: list) -> dict:
+    # Every entity's prefixes start with the characters its regex can start with, so bucketing by the
+    # prefixes' first characters narrows ~340 regexes down to the few that can match.
+    index = {}
+    for matcher in matchers:
+        for first_character in {prefix[0] for prefix in matcher.prefixes}:
+            index.setdefault(first_character, []).append(matcher)
+    return index
+
+
+DXCC_MATCHERS = read_dxcc_matchers(filename=dxcc_filename)
+DXCC_INDEX = build_first_character_index(DXCC_MATCHERS)
+
+
+def entity_callsign(callsign: str) -> str|None:
+    """The part of a (possibly compound) callsign that decides its DXCC entity, None for /MM and /AM.
+
+    EA8/DL1ABC and DL1ABC/EA8 -> EA8, DL1ABC/P -> DL1ABC, W1ABC/4 -> W1ABC.
+    """
+    parts = [part for part in callsign.strip().upper().split("/") if part]
+    if any(part in NO_ENTITY_SUFFIXES for part in parts[1:]):
+        return None
+    parts = [part for index, part in enumerate(parts) if index == 0 or part not in IGNORED_SUFFIXES]
+    # A single digit only moves the station to another call area of the same entity
+    parts = [part for index, part in enumerate(parts) if index == 0 or not (len(part) == 1 and part.isdigit())]
+    if not parts:
+        return None
+    if len(parts) == 1:
+        return parts[0]
+    # Prefix/callsign or callsign/prefix: the shorter part is the prefix
+    return min(parts[:2], key=len)
+
+
+@lru_cache(maxsize=16384)
+def resolve_dxcc(callsign: str) -> DxccEntity|None:
+    callsign = entity_callsign(callsign)
+    if not callsign:
+        return None
+    best = None
+    best_length = -1
+    for matcher in DXCC_INDEX.get(callsign[0], ()):
+        if not matcher.regex.match(callsign):
+            continue
+        # Several entities can match (KH6 is both Hawaii and USA), the longest listed prefix wins
+        length = max((len(prefix) for prefix in matcher.prefixes if callsign.startswith(prefix)), default=0)
+        if length > best_length:
+            best = matcher.entity
+            best_length = length
+    return best
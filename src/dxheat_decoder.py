@@ -0,0 +1,148 @@
+from datetime import date, time, datetime, timezone
+from functools import lru_cache
+import json
+from loguru import logger
+
+from records import DxheatRecord
+
+try:
+    import orjson
+except ImportError:  # optional, json is used without it
+    orjson = None
+
+# DXHeat spot fields and the JSON types they must have. Optional fields may be missing.
+DXHEAT_REQUIRED_FIELDS = {
+    'Nr': int,
+    'Spotter': str,
+    'Frequency': (str, int, float),
+    'DXCall': str,
+    'Time': str,
+    'Date': str,
+    'Beacon': bool,
+    'MM': bool,
+    'AM': bool,
+    'Valid': bool,
+    'DXHomecall': str,
+    'Comment': str,
+    'Band': (int, str),
+    'Continent_spotter': str,
+}
+DXHEAT_OPTIONAL_FIELDS = {
+    'LOTW': bool,
+    'LOTW_Date': str,
+    'EQSL': bool,
+    'Flag': str,
+    'Mode': str,
+    'Continent_dx': str,
+    'DXLocator': str,
+}
+DEFAULT_MODE = "SSB"  # DXHeat leaves Mode out on some spots
+
+# Date and time strings repeat across the spots of a pull, so the parsers are memoised
+PARSER_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=PARSER_CACHE_SIZE)
+def parse_dxheat_time(value: str) -> time:
+    """"14:42" -> time(14, 42)"""
+    if len(value) != 5 or value[2] != ':':
+        raise ValueError(f"bad Time {value!r}")
+    return time(int(value[:2]), int(value[3:]))
+
+
+@lru_cache(maxsize=PARSER_CACHE_SIZE)
+def parse_dxheat_date(value: str) -> date:
+    """"18/05/25" (dd/mm/yy) -> date(2025, 5, 18)"""
+    if len(value) != 8 or value[2] != '/' or value[5] != '/':
+        raise ValueError(f"bad Date {value!r}")
+    return date(2000 + int(value[6:]), int(value[3:5]), int(value[:2]))
+
+
+@lru_cache(maxsize=PARSER_CACHE_SIZE)
+def parse_lotw_date(value: str) -> date:
+    """"05/18/2025" (mm/dd/yyyy) -> date(2025, 5, 18)"""
+    if len(value) != 10 or value[2] != '/' or value[5] != '/':
+        raise ValueError(f"bad LOTW_Date {value!r}")
+    return date(int(value[6:]), int(value[:2]), int(value[3:5]))
+
+
+@lru_cache(maxsize=256)
+def missing_fields(fields: tuple) -> tuple:
+    # Spots of one payload share their key layout, so each layout is checked once
+    return tuple(field for field in DXHEAT_REQUIRED_FIELDS if field not in fields)
+
+
+def validate_dxheat_spot(spot) -> str|None:
+    """What is wrong with a decoded DXHeat spot, or None if it matches the schema."""
+    if not isinstance(spot, dict):
+        return f"not an object: {type(spot).__name__}"
+    missing = missing_fields(tuple(spot))
+    if missing:
+        return f"missing {', '.join(missing)}"
+    for field, types in DXHEAT_REQUIRED_FIELDS.items():
+        if not isinstance(spot[field], types):
+            return f"{field} is {type(spot[field]).__name__}"
+    for field, types in DXHEAT_OPTIONAL_FIELDS.items():
+        value = spot.get(field)
+        if value is not None and not isinstance(value, types):
+            return f"{field} is {type(value).__name__}"
+    return None
+
+
+def decode_dxheat_spot(spot: dict) -> DxheatRecord:
+    """DxheatRecord of a spot that passed validate_dxheat_spot. The spot dict is not modified."""
+    spot_time = parse_dxheat_time(spot['Time'])
+    spot_date = parse_dxheat_date(spot['Date'])
+    mode = spot.get('Mode')
+    lotw_date = spot.get('LOTW_Date')
+    return DxheatRecord(
+        number=spot['Nr'],
+        spotter=spot['Spotter'],
+        frequency=str(spot['Frequency']),
+        dx_call=spot['DXCall'],
+        time=spot_time,
+        date=spot_date,
+        date_time=datetime.combine(spot_date, spot_time, tzinfo=timezone.utc),
+        beacon=spot['Beacon'],
+        mm=spot['MM'],
+        am=spot['AM'],
+        valid=spot['Valid'],
+        lotw=spot.get('LOTW'),
+        lotw_date=parse_lotw_date(lotw_date) if lotw_date else None,
+        esql=spot.get('EQSL'),
+        dx_homecall=spot['DXHomecall'],
+        comment=spot['Comment'],
+        flag=spot.get('Flag'),
+        band=str(spot['Band']),
+        mode=mode if mode is not None else DEFAULT_MODE,
+        missing_mode=mode is None,
+        continent_dx=spot.get('Continent_dx'),
+        continent_spotter=spot['Continent_spotter'],
+        dx_locator=spot.get('DXLocator'),
+    )
+
+
+def loads(content: bytes):
+    return orjson.loads(content) if orjson is not None else json.loads(content)
+
+
+def decode_dxheat_payload(content: bytes, debug: bool = False) -> list:
+    """DxheatRecords of a DXHeat response body (a JSON array of spots). Spots that don't match the
+    schema are logged and skipped."""
+    spots = loads(content)
+    if not isinstance(spots, list):
+        logger.error(f"DXHeat payload is not a list: {type(spots).__name__}")
+        return []
+    records = []
+    for spot in spots:
+        problem = validate_dxheat_spot(spot)
+        if problem is None:
+            try:
+                records.append(decode_dxheat_spot(spot))
+                continue
+            except ValueError as e:
+                problem = str(e)
+        logger.error(f"Skipping DXHeat spot, {problem}: {spot}")
+    if debug:
+        logger.debug(f"Decoded {len(records)} of {len(spots)} DXHeat spots")
+    return records
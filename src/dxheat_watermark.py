@@ -0,0 +1,105 @@
+from math import ceil
+from loguru import logger
+
+from settings import (
+    DXHEAT_LIMIT_INITIAL,
+    DXHEAT_LIMIT_MIN,
+    DXHEAT_LIMIT_MAX,
+    DXHEAT_LIMIT_HEADROOM,
+)
+
+RATE_SMOOTHING = 0.3  # weight of the latest poll in the new spots per poll average
+
+
+class BandWatermark:
+    def __init__(self, limit: int):
+        self.last_nr = None        # highest DXHeat Nr seen on the band with no gap below it
+        self.passed = set()        # Nrs above last_nr already put, while a gap below them is being filled
+        self.limit = limit         # spots to ask for on the next poll
+        self.rate = None           # smoothed new spots per poll
+        self.polls = 0
+        self.fetched = 0
+        self.new = 0
+        self.saturated = 0         # polls where every returned spot was new, so some may have been missed
+
+
+class DxheatWatermarks:
+    """
+    Per band high-water mark of the DXHeat spot number (Nr, increasing across all bands) and the
+    `limit` to poll the band with.
+
+    Spots at or below the mark were already put into the pipeline and are dropped right after
+    decoding. The limit follows the smoothed number of new spots per poll with DXHEAT_LIMIT_HEADROOM,
+    and jumps to DXHEAT_LIMIT_MAX when a poll returned only new spots: it may have missed older ones,
+    so the mark stays where it was until a poll overlaps it again.
+    The marks live in memory: after a restart the first poll of each band uses DXHEAT_LIMIT_INITIAL
+    and the write stage skips what dxheat_raw already has.
+    """
+
+    def __init__(self, initial_limit: int = DXHEAT_LIMIT_INITIAL, min_limit: int = DXHEAT_LIMIT_MIN,
+                 max_limit: int = DXHEAT_LIMIT_MAX, headroom: float = DXHEAT_LIMIT_HEADROOM):
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.headroom = headroom
+        self.bands = {}
+
+    def band(self, band: int) -> BandWatermark:
+        if band not in self.bands:
+            self.bands[band] = BandWatermark(limit=self.initial_limit)
+        return self.bands[band]
+
+    def limit(self, band: int) -> int:
+        return self.band(band).limit
+
+    def new_spots(self, band: int, spots: list) -> list:
+        """The DxheatRecords above the band's mark; moves the mark and adapts the band's limit."""
+        watermark = self.band(band)
+        last_nr = watermark.last_nr
+        if last_nr is None:
+            new = spots
+        else:
+            new = [spot for spot in spots if spot.number > last_nr and spot.number not in watermark.passed]
+
+        watermark.polls += 1
+        watermark.fetched += len(spots)
+        watermark.new += len(new)
+        if last_nr is None and spots:
+            # First poll with spots: all of them look new, which says nothing about the band's rate
+            watermark.last_nr = max(spot.number for spot in spots)
+            return new
+        if spots and len(new) == len(spots) and len(spots) >= watermark.limit:
+            watermark.saturated += 1
+            if watermark.limit < self.max_limit:
+                # Older new spots may be beyond the limit: keep the mark below them for the next poll
+                logger.info(f"DXHeat band {band}: all {len(spots)} spots were new, raising limit to {self.max_limit}")
+                watermark.passed.update(spot.number for spot in new)
+            else:
+                # No bigger poll can reach them
+                logger.warning(f"DXHeat band {band}: all {len(spots)} spots were new at the maximum limit, some may have been missed")
+                watermark.last_nr = max(spot.number for spot in spots)
+                watermark.passed.clear()
+            watermark.rate = max(watermark.rate or 0, len(new))
+            watermark.limit = self.max_limit
+            return new
+        if spots:
+            watermark.last_nr = max(last_nr, max(spot.number for spot in spots))
+            watermark.passed.clear()
+        if watermark.rate is None:
+            watermark.rate = len(new)
+        else:
+            watermark.rate += RATE_SMOOTHING * (len(new) - watermark.rate)
+        watermark.limit = min(self.max_limit, max(self.min_limit, ceil(watermark.rate * self.headroom)))
+        return new
+
+    def stats(self) -> dict:
+        return {
+            band: {
+                "last_nr": watermark.last_nr,
+                "limit": watermark.limit,
+                "fetched": watermark.fetched,
+                "new": watermark.new,
+                "saturated": watermark.saturated,
+            }
+            for band, watermark in sorted(self.bands.items())
+        }
@@ -0,0 +1,160 @@
+import os
+import pickle
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from loguru import logger
+from sqlalchemy import select
+
+from db_classes import GeoCache
+from settings import GEO_CACHE_MAX_AGE, GEO_CACHE_REFRESH_OVERLAP, GEO_CACHE_TOUCH_INTERVAL
+
+SNAPSHOT_VERSION = 2
+EVICTION_INTERVAL = 3600  # seconds between scans for expired entries
+
+
+def as_naive_utc(value: datetime) -> datetime:
+    # geo_cache.date_time is a timestamp without time zone holding UTC
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class GeoCacheStore:
+    """In-memory copy of the geo_cache table.
+
+    Loaded once with a column projection, then refreshed incrementally: each refresh only reads rows
+    whose date_time is past the high-water mark (minus GEO_CACHE_REFRESH_OVERLAP, since date_time is the
+    spot time rather than the write time). Entries older than GEO_CACHE_MAX_AGE are evicted, as
+    cleanup_database removes them from the table. An optional on-disk snapshot gives a fast warm start.
+
+    Writes go through dirty tracking: stage() marks new or changed entries, touch() marks entries seen
+    again after GEO_CACHE_TOUCH_INTERVAL (so cleanup keeps them), and take_dirty() returns each dirty
+    callsign once; restore_dirty() puts them back when the write failed. date_time is naive UTC
+    throughout, in memory and in the rows written.
+    """
+
+    def __init__(self, snapshot_filename: str|None = None):
+        self.entries: dict = {}
+        self.high_water_mark: datetime|None = None
+        self.snapshot_filename = snapshot_filename
+        self.evicted_at = None
+        self.dirty: dict = {}
+
+    def load_snapshot(self) -> bool:
+        if not self.snapshot_filename or not os.path.exists(self.snapshot_filename):
+            return False
+        try:
+            with open(self.snapshot_filename, "rb") as f:
+                snapshot = pickle.load(f)
+        except Exception as e:
+            logger.error(f"Failed to read geo_cache snapshot {self.snapshot_filename}: {e}")
+            return False
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            return False
+        self.entries = snapshot["entries"]
+        self.high_water_mark = snapshot["high_water_mark"]
+        logger.info(f"geo_cache snapshot loaded: {len(self.entries)} records, high-water mark {self.high_water_mark}")
+        return True
+
+    def save_snapshot(self):
+        if not self.snapshot_filename:
+            return
+        temp_filename = f"{self.snapshot_filename}.tmp"
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "entries": self.entries,
+            "high_water_mark": self.high_water_mark,
+        }
+        with open(temp_filename, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_filename, self.snapshot_filename)
+
+    def refresh(self, session, debug: bool = False) -> int:
+        query = select(
+            GeoCache.callsign,
+            GeoCache.locator,
+            GeoCache.lat,
+            GeoCache.lon,
+            GeoCache.country,
+            GeoCache.continent,
+            GeoCache.date_time,
+        )
+        if self.high_water_mark is not None:
+            query = query.where(GeoCache.date_time >= self.high_water_mark - timedelta(seconds=GEO_CACHE_REFRESH_OVERLAP))
+
+        rows = 0
+        for callsign, locator, lat, lon, country, continent, date_time in session.execute(query):
+            self._set(callsign, locator, lat, lon, country, continent, date_time)
+            rows += 1
+        if self.evicted_at is None or monotonic() - self.evicted_at >= EVICTION_INTERVAL:
+            self.evict_expired()
+            self.evicted_at = monotonic()
+        if debug:
+            logger.debug(f"geo_cache refresh: {rows} rows read, high-water mark {self.high_water_mark}")
+        return rows
+
+    def evict_expired(self):
+        cutoff = as_naive_utc(datetime.now(timezone.utc)) - timedelta(seconds=GEO_CACHE_MAX_AGE)
+        expired = [
+            callsign for callsign, entry in self.entries.items()
+            if entry['date_time'] is not None and entry['date_time'] < cutoff
+        ]
+        for callsign in expired:
+            del self.entries[callsign]
+
+    def stage(self, geo_cache_records):
+        for record in geo_cache_records:
+            entry = self.entries.get(record.callsign)
+            if entry is not None and (
+                entry['locator'], entry['lat'], entry['lon'], entry['country'], entry['continent']
+            ) == (record.locator, record.lat, record.lon, record.country, record.continent):
+                self.touch(record.callsign, record.date_time)
+                continue
+            self._set(record.callsign, record.locator, record.lat, record.lon, record.country, record.continent, record.date_time)
+            self.dirty[record.callsign] = {**record.to_dict(), 'date_time': as_naive_utc(record.date_time)}
+
+    def touch(self, callsign: str, date_time: datetime):
+        entry = self.entries.get(callsign)
+        date_time = as_naive_utc(date_time)
+        if entry is None or entry['date_time'] is None:
+            return
+        if date_time - entry['date_time'] < timedelta(seconds=GEO_CACHE_TOUCH_INTERVAL):
+            return
+        entry['date_time'] = date_time
+        if callsign not in self.dirty:
+            self.dirty[callsign] = {
+                'callsign': callsign,
+                'locator': entry['locator'],
+                'lat': entry['lat'],
+                'lon': entry['lon'],
+                'country': entry['country'],
+                'continent': entry['continent'],
+                'date': date_time.date(),
+                'time': date_time.time(),
+                'date_time': date_time,
+            }
+        else:
+            self.dirty[callsign].update(date=date_time.date(), time=date_time.time(), date_time=date_time)
+
+    def take_dirty(self) -> list:
+        dirty = list(self.dirty.values())
+        self.dirty = {}
+        return dirty
+
+    def restore_dirty(self, records: list):
+        """Mark records from take_dirty() dirty again after their write failed (newer changes win)."""
+        for record in records:
+            self.dirty.setdefault(record['callsign'], record)
+
+    def _set(self, callsign, locator, lat, lon, country, continent, date_time):
+        date_time = as_naive_utc(date_time)
+        self.entries[callsign] = {
+            'locator': locator,
+            'lat': lat,
+            'lon': lon,
+            'country': country,
+            'continent': continent,
+            'date_time': date_time,
+        }
+        if date_time is not None and (self.high_water_mark is None or date_time > self.high_water_mark):
+            self.high_water_mark = date_time
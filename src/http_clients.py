@@ -0,0 +1,36 @@
+import importlib.util
+import httpx
+
+from settings import (
+    HTTP2,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_CONNECT_TIMEOUT,
+    DXHEAT_TIMEOUT,
+    QRZ_TIMEOUT,
+)
+
+# httpx only speaks HTTP/2 when the optional h2 package is installed
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def create_async_client(timeout: float) -> httpx.AsyncClient:
+    """Pooled keep-alive client, meant to be shared for the lifetime of a collector run (or daemon)."""
+    return httpx.AsyncClient(
+        http2=HTTP2 and HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(timeout, connect=HTTP_CONNECT_TIMEOUT),
+    )
+
+
+def create_dxheat_client() -> httpx.AsyncClient:
+    return create_async_client(timeout=DXHEAT_TIMEOUT)
+
+
+def create_qrz_client() -> httpx.AsyncClient:
+    return create_async_client(timeout=QRZ_TIMEOUT)
@@ -68,7 +68,7 @@ def main(debug: bool = False):
 
     engine = create_engine(settings.DB_URL, echo=True)
 
-    tables = ['dxheat_raw', 'holy_spots', 'geo_cache', 'spots_with_issues']
+    tables = ['dxheat_raw', 'holy_spots', 'geo_cache', 'spots_with_issues', 'qrz_negative_cache']
     with engine.connect() as connection:
         connection.execution_options(isolation_level="AUTOCOMMIT")  # Set isolation level to autocommit
         try:
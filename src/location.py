@@ -1,7 +1,9 @@
 import re
 import csv
+from functools import lru_cache
 from typing import List
 from pathlib import Path
+import numpy as np
 from loguru import logger
 # from qrz import get_locator_from_qrz
 
@@ -16,6 +18,14 @@ callsign_to_locator_filename = f"{grandparent_folder}/src/prefixes_list.csv"
 PREFIXES_TO_LOCATORS = read_csv_to_list_of_tuples(filename=callsign_to_locator_filename)
 
 
+def compile_prefixes(prefixes_to_locators: List):
+    # One alternation with a named group per row. re tries the alternatives in order at the start of
+    # the callsign, so the first matching row wins, exactly like scanning the rows one by one.
+    pattern = "|".join(f"(?P<p{index}>{row[0]})" for index, row in enumerate(prefixes_to_locators))
+    return re.compile(pattern)
+PREFIXES_REGEX = compile_prefixes(PREFIXES_TO_LOCATORS)
+
+
 class Position:
     def __init__(self, lat:float, lon:float):
         self.lat = lat
@@ -27,15 +37,22 @@ class Position:
 
 
 
+@lru_cache(maxsize=16384)
+def resolve_callsign(callsign: str) -> tuple:
+    """Prefix based (locator, country, continent) of a callsign, (None, None, None) if no prefix matches."""
+    match = PREFIXES_REGEX.match(callsign.upper())
+    if match is None:
+        return None, None, None
+    # lastgroup is the outermost group that closed last, i.e. the row's own group
+    _, locator, country, continent = PREFIXES_TO_LOCATORS[int(match.lastgroup[1:])]
+    return locator, country, continent
+
+
 def resolve_locator(
         callsign:str, 
         # prefixes_to_locators:List
     ) -> str:
-    callsign=callsign.upper()
-    for regex, locator, country, continent in PREFIXES_TO_LOCATORS:
-        if re.match(regex+".*", callsign):
-            return locator
-    return None
+    return resolve_callsign(callsign)[0]
 
 # def resolve_country(callsign:str, prefixes_to_locators:List) -> str:
 #     callsign=callsign.upper()
@@ -49,11 +66,8 @@ def resolve_country_and_continent(
         callsign:str, 
         # prefixes_to_locators:List
     ):
-    callsign=callsign.upper()
-    for regex, locator, country, continent in PREFIXES_TO_LOCATORS:
-        if re.match(regex+".*", callsign):
-            return country, continent
-    return None, None
+    _, country, continent = resolve_callsign(callsign)
+    return country, continent
 
 
 def locator_to_coordinates(locator: str) -> dict:
@@ -118,3 +132,96 @@ def locator_to_coordinates(locator: str) -> dict:
         return None, None
 
 
+ASCII_0 = 48
+ASCII_A = 65
+
+
+def locators_to_coordinates(locators) -> tuple:
+    """Batch version of locator_to_coordinates for 4/6/8 character locators.
+
+    Returns (lat, lon, valid) arrays. Bad or missing locators don't raise: they get NaN and valid=False.
+    Valid ones give exactly the values locator_to_coordinates returns.
+    """
+    strings = np.array([locator.upper() if isinstance(locator, str) else "" for locator in locators], dtype=str)
+    count = len(strings)
+    if count == 0:
+        empty = np.empty(0)
+        return empty, empty, np.empty(0, dtype=bool)
+    lengths = np.char.str_len(strings)
+    # One row of 8 code points per locator, zero padded
+    codes = strings.astype("U8").view(np.uint32).reshape(count, 8).astype(np.int64)
+
+    def in_range(column, first, last):
+        return (codes[:, column] >= ord(first)) & (codes[:, column] <= ord(last))
+
+    has_subsquare = lengths >= 6
+    has_extended = lengths == 8
+    valid = (
+        ((lengths == 4) | has_subsquare & (lengths <= 8)) & (lengths % 2 == 0)
+        & in_range(0, "A", "R") & in_range(1, "A", "R")
+        & in_range(2, "0", "9") & in_range(3, "0", "9")
+        & (~has_subsquare | in_range(4, "A", "X") & in_range(5, "A", "X"))
+        & (~has_extended | in_range(6, "0", "9") & in_range(7, "0", "9"))
+    )
+    codes[~valid] = [ASCII_A, ASCII_A, ASCII_0, ASCII_0, ASCII_A, ASCII_A, ASCII_0, ASCII_0]
+    lon_sub_sq = np.where(has_subsquare, codes[:, 4] - ASCII_A, 0)
+    lat_sub_sq = np.where(has_subsquare, codes[:, 5] - ASCII_A, 0)
+    lon_ext_sq = np.where(has_extended, codes[:, 6] - ASCII_0, 0)
+    lat_ext_sq = np.where(has_extended, codes[:, 7] - ASCII_0, 0)
+
+    # Same additions, in the same order, as locator_to_coordinates
+    lon = np.full(count, -180.0)
+    lat = np.full(count, -90.0)
+    lon += 20.0 * (codes[:, 0] - ASCII_A)
+    lat += 10.0 * (codes[:, 1] - ASCII_A)
+    lon += 2.0 * (codes[:, 2] - ASCII_0)
+    lat += 1.0 * (codes[:, 3] - ASCII_0)
+    lon += 5.0 / 60 * lon_sub_sq
+    lat += 2.5 / 60 * lat_sub_sq
+    lon += 0.5 / 60 * lon_ext_sq
+    lat += 0.25 / 60 * lat_ext_sq
+
+    lat = np.trunc(lat * 10000) / 10000
+    lon = np.trunc(lon * 10000) / 10000
+    lat[~valid] = np.nan
+    lon[~valid] = np.nan
+    return lat, lon, valid
+
+
+def coordinates_to_locators(lats, lons, length: int = 6) -> tuple:
+    """Batch lat/lon to 4/6/8 character locators (subsquares in lower case, e.g. KM72jb).
+
+    Returns (locators, valid); coordinates that are NaN or out of range give "" and valid=False.
+    """
+    assert length in (4, 6, 8)
+    lat = np.asarray(lats, dtype=float)
+    lon = np.asarray(lons, dtype=float)
+    count = len(lat)
+    valid = (lat >= -90) & (lat <= 90) & (lon >= -180) & (lon <= 180)
+    # The north pole and the antimeridian belong to the last field
+    lat = np.minimum(np.where(valid, lat, 0) + 90, 180 - 1e-9)
+    lon = np.minimum(np.where(valid, lon, 0) + 180, 360 - 1e-9)
+
+    lon_field, lon = np.divmod(lon, 20.0)
+    lat_field, lat = np.divmod(lat, 10.0)
+    lon_sq, lon = np.divmod(lon, 2.0)
+    lat_sq, lat = np.divmod(lat, 1.0)
+    lon_sub_sq, lon = np.divmod(lon, 5.0 / 60)
+    lat_sub_sq, lat = np.divmod(lat, 2.5 / 60)
+    lon_ext_sq = np.minimum(lon // (0.5 / 60), 9)
+    lat_ext_sq = np.minimum(lat // (0.25 / 60), 9)
+
+    codes = np.zeros((count, 8), dtype=np.uint32)
+    codes[:, 0] = ASCII_A + lon_field
+    codes[:, 1] = ASCII_A + lat_field
+    codes[:, 2] = ASCII_0 + lon_sq
+    codes[:, 3] = ASCII_0 + lat_sq
+    if length >= 6:
+        codes[:, 4] = ord("a") + np.minimum(lon_sub_sq, 23)
+        codes[:, 5] = ord("a") + np.minimum(lat_sub_sq, 23)
+    if length == 8:
+        codes[:, 6] = ASCII_0 + lon_ext_sq
+        codes[:, 7] = ASCII_0 + lat_ext_sq
+    codes[~valid] = 0
+    locators = codes.view("U8").reshape(count)
+    return locators, valid
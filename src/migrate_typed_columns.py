@@ -0,0 +1,97 @@
+from loguru import logger
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import ProgrammingError, OperationalError
+
+from misc import string_to_boolean, open_log_file
+
+from settings import (
+    DEBUG,
+    DB_URL,
+)
+
+# Text columns that are typed since holy_spots/spots_with_issues/geo_cache schema version 2
+TYPED_COLUMNS = {
+    "holy_spots": {
+        "band": "smallint",
+        "frequency": "double precision",
+        "spotter_lat": "double precision",
+        "spotter_lon": "double precision",
+        "dx_lat": "double precision",
+        "dx_lon": "double precision",
+    },
+    "spots_with_issues": {
+        "band": "smallint",
+        "frequency": "double precision",
+        "spotter_lat": "double precision",
+        "spotter_lon": "double precision",
+        "dx_lat": "double precision",
+        "dx_lon": "double precision",
+    },
+    "geo_cache": {
+        "lat": "double precision",
+        "lon": "double precision",
+    },
+}
+
+NUMBER_REGEX = r"^\s*[-+]?[0-9]*\.?[0-9]+([eE][-+]?[0-9]+)?\s*$"
+
+
+def cast_expression(column: str, column_type: str) -> str:
+    # Anything that isn't a number (empty strings, 'None') becomes NULL instead of failing the migration
+    number = f"{column}::double precision"
+    if column_type == "smallint":
+        # The same as int(float(band)) in the old API
+        number = f"trunc({number})::smallint"
+    return f"CASE WHEN {column} ~ '{NUMBER_REGEX}' THEN {number} END"
+
+
+def migrate_table(connection, table: str, columns: dict, debug: bool = False):
+    existing_types = {column["name"]: str(column["type"]) for column in inspect(connection).get_columns(table)}
+    alterations = [
+        f"ALTER COLUMN {column} TYPE {column_type} USING {cast_expression(column, column_type)}"
+        for column, column_type in columns.items()
+        if existing_types.get(column) == "TEXT"
+    ]
+    if not alterations:
+        logger.info(f"Table {table}: already migrated")
+        return
+    # A single ALTER TABLE rewrites the table (and its indexes) once
+    statement = f"ALTER TABLE {table} " + ", ".join(alterations)
+    if debug:
+        logger.debug(statement)
+    connection.execute(text(statement))
+    logger.info(f"Table {table}: {len(alterations)} columns migrated")
+
+
+def canonicalize_modes(connection, table: str):
+    result = connection.execute(text(
+        f"UPDATE {table} SET mode = CASE WHEN upper(mode) IN ('USB', 'LSB') THEN 'SSB' ELSE upper(mode) END "
+        f"WHERE mode <> CASE WHEN upper(mode) IN ('USB', 'LSB') THEN 'SSB' ELSE upper(mode) END"
+    ))
+    logger.info(f"Table {table}: {result.rowcount} modes canonicalized")
+
+
+def main(debug: bool = False):
+    engine = create_engine(DB_URL, echo=False)
+    with engine.begin() as connection:
+        try:
+            for table, columns in TYPED_COLUMNS.items():
+                migrate_table(connection=connection, table=table, columns=columns, debug=debug)
+            for table in ("holy_spots", "spots_with_issues"):
+                canonicalize_modes(connection=connection, table=table)
+        except (ProgrammingError, OperationalError) as e:
+            logger.error(f'Error: {e}')
+            raise
+    with engine.connect() as connection:
+        connection.execution_options(isolation_level="AUTOCOMMIT")
+        for table in TYPED_COLUMNS:
+            connection.execute(text(f"VACUUM ANALYZE {table}"))
+
+
+if __name__ == "__main__":
+    if string_to_boolean(DEBUG):
+        logger.info("DEBUG is True")
+        open_log_file("logs/migrate_typed_columns")
+    else:
+        logger.info("DEBUG is False")
+    main(debug=string_to_boolean(DEBUG))
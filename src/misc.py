@@ -1,4 +1,7 @@
+import fcntl
+from contextlib import contextmanager
 from datetime import datetime
+from time import perf_counter
 from loguru import logger
 
 def string_to_boolean(value: str) -> bool:
@@ -25,3 +28,27 @@ def open_log_file(log_filename_prefix):
         template = "**** ERROR OPENING LOG FILE **** An exception of type {0} occured. Arguments: {1!r}"
         message = template.format(type(ex).__name__, ex.args)
         print(message)
+
+
+@contextmanager
+def stage_timer(timings: dict, stage: str):
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = round(perf_counter() - start, 3)
+
+
+def acquire_process_lock(lock_filename: str):
+    """Take an exclusive, non-blocking lock on lock_filename.
+
+    Returns the open lock file (keep a reference for as long as the lock should be held),
+    or None if another process already holds it.
+    """
+    lock_file = open(lock_filename, "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
@@ -0,0 +1,464 @@
+import asyncio
+import json
+from collections import Counter
+from time import perf_counter
+from typing import NamedTuple
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError, OperationalError
+
+from db_classes import DxheatRaw, HolySpot, GeoCache, SpotWithIssue, QrzNegativeCache
+from records import DxheatRecord
+from spots_collector import enrich_spot
+from bulk_writer import bulk_insert_do_nothing, bulk_insert_do_nothing_returning_ids, bulk_upsert
+from spot_dedup import SpotDedupIndex
+
+from settings import (
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_ENRICH_CONCURRENCY,
+    PIPELINE_BATCH_SIZE,
+    PIPELINE_BATCH_DELAY,
+    PIPELINE_DEDUP_WINDOW,
+    SPOTS_NOTIFY_CHANNEL,
+)
+
+# Kinds of items on the write queue
+RAW = "raw"
+SPOT = "spot"
+
+DXHEAT = "dxheat"
+BATCH_POLL_INTERVAL = 0.005
+NOTIFY_MAX_IDS = 500
+
+
+class StageStats:
+    """Throughput and input queue depth of one pipeline stage since the last report."""
+
+    def __init__(self, name: str, queue: asyncio.Queue|None = None):
+        self.name = name
+        self.queue = queue
+        self.reset()
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize() if self.queue is not None else 0
+
+    def observe_queue(self):
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+    def reset(self):
+        self.processed = 0
+        self.dropped = 0
+        self.max_queue_depth = self.queue_depth
+        self.started = perf_counter()
+
+    def report(self) -> dict:
+        elapsed = perf_counter() - self.started
+        return {
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "per_second": round(self.processed / elapsed, 1) if elapsed > 0 else 0.0,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+def split_spots_with_issues(holy_spots_records, debug: bool = False) -> tuple:
+    """Return (holy_spots, spots_with_issues) as lists of dicts, with the issues appended to the comments."""
+    good_records: int = 0
+    records_with_issues: int = 0
+    holy_spots_batch = []
+    spots_with_issues_batch = []
+    for record in holy_spots_records:
+        issue = False
+        issue_but_report = False
+        if debug:
+            logger.debug(f"{record=}")
+        holy_spot_record_dict = record.to_dict()
+        if not holy_spot_record_dict['spotter_locator']:
+            holy_spot_record_dict['comment'] += " *** Missing spotter locator ***"
+            issue = True
+        if not holy_spot_record_dict['dx_locator']:
+            holy_spot_record_dict['comment'] += " *** Missing dx locator ***"
+            issue = True
+        if holy_spot_record_dict['spotter_callsign']=='W3LPL':
+            holy_spot_record_dict['comment'] += " *** Spotter is W3LPL ***"
+            issue = True
+        if not holy_spot_record_dict['dx_country']:
+            holy_spot_record_dict['comment'] += " *** Missing dx_country ***"
+            issue_but_report = True
+
+        if not issue:
+            good_records += 1
+        else:
+            records_with_issues += 1
+            logger.error(f"Issues with spot:\n{holy_spot_record_dict}")
+        if issue_but_report:
+            records_with_issues += 1
+            logger.error(f"Issues with spot:\n{holy_spot_record_dict}")
+        if issue or issue_but_report:
+            spots_with_issues_batch.append(holy_spot_record_dict)
+        else:
+            holy_spots_batch.append(holy_spot_record_dict)
+    logger.info(f"Good records: {good_records}, records with issues: {records_with_issues}")
+    return holy_spots_batch, spots_with_issues_batch
+
+
+class WriteBatch(NamedTuple):
+    # Rows of one write batch, as dicts for the bulk writers
+    raw_records: list
+    holy_spots: list
+    spots_with_issues: list
+    geo_cache: list
+    negative_cache: list
+
+
+class PendingSpots:
+    """Spots put() with this tracker that are not written (or dropped) yet.
+
+    A spot counts once per item it becomes on the way (a DXHeat spot is both a raw and an enriched
+    write), so wait() returns when every one of them is done, however busy other sources keep the queues.
+    """
+
+    def __init__(self):
+        self.pending = 0
+        self.finished = asyncio.Event()
+        self.finished.set()
+
+    def __len__(self) -> int:
+        return self.pending
+
+    def add(self, count: int = 1):
+        self.pending += count
+        if self.pending > 0:
+            self.finished.clear()
+
+    def done(self, count: int = 1):
+        self.pending -= count
+        if self.pending <= 0:
+            self.finished.set()
+
+    async def wait(self):
+        await self.finished.wait()
+
+
+def notify_new_spots(session, ids: list, channel: str = SPOTS_NOTIFY_CHANNEL):
+    """NOTIFY channel with the range of new holy_spots ids, as JSON {"first_id", "last_id", "count"}."""
+    if not ids or not channel:
+        return
+    payload = json.dumps({"first_id": min(ids), "last_id": max(ids), "count": len(ids)})
+    session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": payload})
+
+
+def notify_updated_spots(session, ids: list, channel: str = SPOTS_NOTIFY_CHANNEL):
+    """NOTIFY channel with holy_spots ids whose rows were changed, as JSON {"updated": [ids]}."""
+    if not ids or not channel:
+        return
+    ids = sorted(set(ids))
+    # NOTIFY payloads are limited to 8000 bytes
+    for start in range(0, len(ids), NOTIFY_MAX_IDS):
+        payload = json.dumps({"updated": ids[start:start + NOTIFY_MAX_IDS]})
+        session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": payload})
+
+
+class SpotPipeline:
+    """
+    fetch -> parse -> dedup -> enrich -> write, connected by bounded asyncio queues.
+
+    Every source (DXHeat polling, telnet clusters, file replay) calls put() with a raw spot, the
+    function that parses it into a record (none for DXHeat records) and its name. Dedup drops
+    spots another source (or an earlier poll) already delivered, before they cost qrz.com lookups or
+    writes. Spots found in geo_cache pass enrich immediately and are committed with the next write
+    batch, while spots waiting for qrz.com are still being resolved.
+    """
+
+    def __init__(self, state, debug: bool = False,
+                 queue_size: int = PIPELINE_QUEUE_SIZE,
+                 enrich_concurrency: int = PIPELINE_ENRICH_CONCURRENCY,
+                 batch_size: int = PIPELINE_BATCH_SIZE,
+                 batch_delay: float = PIPELINE_BATCH_DELAY,
+                 dedup_window: float = PIPELINE_DEDUP_WINDOW):
+        self.state = state
+        self.debug = debug
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.raw_queue = asyncio.Queue(maxsize=queue_size)
+        self.parsed_queue = asyncio.Queue(maxsize=queue_size)
+        self.enrich_queue = asyncio.Queue(maxsize=queue_size)
+        self.write_queue = asyncio.Queue(maxsize=queue_size)
+        self.enrich_slots = asyncio.Semaphore(enrich_concurrency)
+        self.enrich_tasks = set()
+        self.dedup_index = SpotDedupIndex(window=dedup_window)
+        self.received = Counter()
+        self.duplicates = Counter()
+        self.tasks = []
+        self.stats = {
+            "fetch": StageStats("fetch"),
+            "parse": StageStats("parse", self.raw_queue),
+            "dedup": StageStats("dedup", self.parsed_queue),
+            "enrich": StageStats("enrich", self.enrich_queue),
+            "write": StageStats("write", self.write_queue),
+        }
+
+    def start(self):
+        if self.tasks:
+            return
+        self.tasks = [
+            asyncio.create_task(self.parse_stage()),
+            asyncio.create_task(self.dedup_stage()),
+            asyncio.create_task(self.enrich_stage()),
+            asyncio.create_task(self.write_stage()),
+        ]
+
+    async def join(self):
+        """Wait until the queues are empty; see PendingSpots to wait for some of the spots only."""
+        for queue in (self.raw_queue, self.parsed_queue, self.enrich_queue, self.write_queue):
+            await queue.join()
+
+    async def stop(self):
+        tasks = self.tasks + list(self.enrich_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def put(self, spot, parse=None, source: str = DXHEAT, pending: PendingSpots|None = None):
+        # parse is None for spots that are already records (DXHeat spots are decoded from the response bytes)
+        if pending is not None:
+            pending.add()
+        await self.raw_queue.put((source, parse, spot, pending))
+        self.stats["fetch"].processed += 1
+        self.received[source] += 1
+        self.stats["parse"].observe_queue()
+
+    def report_stats(self) -> dict:
+        """Per stage processed/dropped counts, throughput and queue depth since the previous report."""
+        report = {name: stats.report() for name, stats in self.stats.items()}
+        for stats in self.stats.values():
+            stats.reset()
+        report["sources"] = {
+            source: {"received": received, "duplicates": self.duplicates[source]}
+            for source, received in self.received.items()
+        }
+        self.received = Counter()
+        self.duplicates = Counter()
+        return report
+
+    def log_stats(self):
+        report = self.report_stats()
+        sources = report.pop("sources")
+        for name, report in report.items():
+            logger.info(f"Pipeline {name:6}: processed {report['processed']}, dropped {report['dropped']}, "
+                        f"{report['per_second']}/second, queue depth {report['queue_depth']} "
+                        f"(max {report['max_queue_depth']})")
+        for source, counts in sources.items():
+            logger.info(f"Pipeline source {source}: received {counts['received']}, duplicates {counts['duplicates']}")
+        logger.info(f"Pipeline dedup index: {len(self.dedup_index)} spots")
+
+    @staticmethod
+    def done(pending: PendingSpots|None, count: int = 1):
+        if pending is not None:
+            pending.done(count)
+
+    def forget(self, records):
+        # Spots that were not stored may be retried when a source delivers them again
+        for record in records:
+            self.dedup_index.forget(record)
+
+    async def parse_stage(self):
+        stats = self.stats["parse"]
+        while True:
+            source, parse, spot, pending = await self.raw_queue.get()
+            try:
+                record = parse(spot) if parse is not None else spot
+                if record is None:
+                    stats.dropped += 1
+                    self.done(pending)
+                    if self.debug:
+                        logger.debug(f"Can't parse spot {spot}")
+                    continue
+                await self.parsed_queue.put((source, record, pending))
+                self.stats["dedup"].observe_queue()
+                stats.processed += 1
+            except Exception as e:
+                stats.dropped += 1
+                self.done(pending)
+                logger.error(f"Can't parse spot {spot}: {e}")
+            finally:
+                self.raw_queue.task_done()
+
+    async def dedup_stage(self):
+        stats = self.stats["dedup"]
+        while True:
+            source, record, pending = await self.parsed_queue.get()
+            try:
+                if self.dedup_index.seen(record):
+                    stats.dropped += 1
+                    self.duplicates[source] += 1
+                    continue
+                stats.processed += 1
+                raw = isinstance(record, DxheatRecord)
+                if pending is not None:
+                    pending.add(int(raw) + int(record.valid))
+                if raw:
+                    await self.write_queue.put((RAW, record, None, pending))
+                    self.stats["write"].observe_queue()
+                if record.valid:
+                    await self.enrich_queue.put((record, pending))
+                    self.stats["enrich"].observe_queue()
+            finally:
+                self.done(pending)
+                self.parsed_queue.task_done()
+
+    async def enrich_stage(self):
+        while True:
+            record, pending = await self.enrich_queue.get()
+            await self.enrich_slots.acquire()
+            task = asyncio.create_task(self.enrich_one(record, pending))
+            self.enrich_tasks.add(task)
+            task.add_done_callback(self.enrich_tasks.discard)
+
+    async def enrich_one(self, record, pending: PendingSpots|None):
+        stats = self.stats["enrich"]
+        try:
+            result = await enrich_spot(
+                spot=record,
+                qrz_resolver=self.state.qrz_resolver,
+                geo_cache=self.state.geo_cache_store.entries,
+                debug=self.debug,
+            )
+            await self.write_queue.put((SPOT, record, result, pending))
+            self.stats["write"].observe_queue()
+            stats.processed += 1
+        except Exception as e:
+            stats.dropped += 1
+            self.done(pending)
+            self.forget([record])
+            logger.exception(f"Can't enrich spot {record}: {e}")
+        finally:
+            self.enrich_slots.release()
+            self.enrich_queue.task_done()
+
+    async def write_stage(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Micro-batch: whatever arrives within batch_delay of the first item, up to batch_size
+            batch = [await self.write_queue.get()]
+            deadline = loop.time() + self.batch_delay
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.write_queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(remaining, BATCH_POLL_INTERVAL))
+            writes = None
+            try:
+                writes = self.prepare_writes(batch)
+                # The database I/O runs in a thread: a slow Postgres doesn't stall enrich, qrz.com or the sources
+                await asyncio.to_thread(self.write_batch, writes)
+                self.stats["write"].processed += len(batch)
+            except Exception as e:
+                self.stats["write"].dropped += len(batch)
+                self.forget([record for _, record, _, _ in batch])
+                if writes is not None:
+                    # Written with the next batch instead
+                    self.state.geo_cache_store.restore_dirty(writes.geo_cache)
+                    self.state.qrz_resolver.restore_dirty_negative_cache(writes.negative_cache)
+                if isinstance(e, (ProgrammingError, OperationalError)):
+                    logger.error(f"Error: {e}")
+                else:
+                    logger.exception(f"Write batch failed: {e}")
+            finally:
+                for _, _, _, pending in batch:
+                    self.done(pending)
+                    self.write_queue.task_done()
+
+    def prepare_writes(self, batch: list) -> WriteBatch:
+        """The rows to write for a batch. Runs on the event loop: it stages geo_cache and takes the dirty
+        geo_cache and negative cache entries, which the enrich tasks use at the same time."""
+        raw_records = [record.to_dict() for kind, record, _, _ in batch if kind == RAW]
+        enriched = [result for kind, _, result, _ in batch if kind == SPOT]
+        if not enriched:
+            return WriteBatch(raw_records, [], [], [], [])
+        holy_spots_records = [holy_spot_record for holy_spot_record, _, _ in enriched]
+        holy_spots_batch, spots_with_issues_batch = split_spots_with_issues(holy_spots_records, debug=self.debug)
+        geo_cache_store = self.state.geo_cache_store
+        geo_cache_store.stage([
+            geo_cache_record
+            for _, geo_cache_spotter_record, geo_cache_dx_record in enriched
+            for geo_cache_record in (geo_cache_spotter_record, geo_cache_dx_record)
+            if geo_cache_record is not None
+        ])
+        for record in holy_spots_records:
+            geo_cache_store.touch(record.spotter_callsign, record.date_time)
+            geo_cache_store.touch(record.dx_callsign, record.date_time)
+        return WriteBatch(
+            raw_records=raw_records,
+            holy_spots=holy_spots_batch,
+            spots_with_issues=spots_with_issues_batch,
+            geo_cache=geo_cache_store.take_dirty(),
+            negative_cache=self.state.qrz_resolver.take_dirty_negative_cache(),
+        )
+
+    def write_batch(self, writes: WriteBatch):
+        """Write and commit one batch; runs in a worker thread, touching nothing but the database."""
+        with self.state.Session() as session:
+            try:
+                inserted, skipped = bulk_insert_do_nothing(
+                    session=session,
+                    model=DxheatRaw,
+                    records=writes.raw_records,
+                    index_elements=['date', 'time', 'spotter', 'dx_call'],
+                    debug=self.debug,
+                )
+                if writes.raw_records:
+                    logger.info(f"dxheat_raw inserted: {inserted}, already stored: {skipped}")
+
+                if writes.holy_spots or writes.spots_with_issues:
+                    # Removing duplication by: Define the conflict resolution (do nothing on conflict)
+                    holy_spot_ids = bulk_insert_do_nothing_returning_ids(
+                        session=session,
+                        model=HolySpot,
+                        records=writes.holy_spots,
+                        index_elements=['date', 'time', 'spotter_callsign', 'dx_callsign'],
+                    ) if writes.holy_spots else []
+                    logger.info(f"holy_spots inserted: {len(holy_spot_ids)}, "
+                                f"duplicates skipped: {len(writes.holy_spots) - len(holy_spot_ids)}")
+                    # Delivered to the API's LISTEN connection when (and only if) the batch commits
+                    notify_new_spots(session, holy_spot_ids)
+                    inserted, skipped = bulk_insert_do_nothing(
+                        session=session,
+                        model=SpotWithIssue,
+                        records=writes.spots_with_issues,
+                        index_elements=['date', 'time', 'spotter_callsign', 'dx_callsign'],
+                        debug=self.debug,
+                    )
+                    if writes.spots_with_issues:
+                        logger.info(f"spots_with_issues inserted: {inserted}, duplicates skipped: {skipped}")
+
+                inserted, updated = bulk_upsert(
+                    session=session,
+                    model=GeoCache,
+                    records=writes.geo_cache,
+                    index_elements=['callsign'],
+                    debug=self.debug,
+                )
+                if inserted or updated:
+                    logger.info(f"geo_cache inserted: {inserted}, updated: {updated}")
+                inserted, updated = bulk_upsert(
+                    session=session,
+                    model=QrzNegativeCache,
+                    records=writes.negative_cache,
+                    index_elements=['callsign'],
+                    debug=self.debug,
+                )
+                if inserted or updated:
+                    logger.info(f"qrz_negative_cache inserted: {inserted}, updated: {updated}")
+                session.commit()
+            except (ProgrammingError, OperationalError):
+                session.rollback()
+                raise
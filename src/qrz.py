@@ -22,7 +22,7 @@ def get_qrz_session_key(username, password, api_key):
         return None
 
 
-async def get_locator_from_qrz(qrz_session_key:str, callsign: str, delay:float=0, debug:bool=False) -> dict:
+async def get_locator_from_qrz(qrz_session_key:str, callsign: str, delay:float=0, client: httpx.AsyncClient|None=None, debug:bool=False) -> dict:
         if debug:
             logger.debug(f"{callsign=}   {delay=}")
         suffix_list = ["/M", "/P"]
@@ -33,8 +33,11 @@ async def get_locator_from_qrz(qrz_session_key:str, callsign: str, delay:float=0
             return {"locator": None, "error": "No qrz_session_key"}
         await asyncio.sleep(delay)
         url = f"https://xmldata.qrz.com/xml/current/?s={qrz_session_key};callsign={callsign}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, timeout=30)
+        if client is None:
+            async with httpx.AsyncClient() as client:
+                response = await client.get(url, timeout=30)
+        else:
+            response = await client.get(url)
         if debug:
             logger.debug(f"{response=}")
         
@@ -0,0 +1,226 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+import httpx
+from loguru import logger
+
+from qrz import get_locator_from_qrz
+from rate_limiter import AdaptiveRateLimiter
+from circuit_breaker import CircuitBreaker, OPEN
+from settings import (
+    QRZ_TIMEOUT,
+    QRZ_RESULT_TTL,
+    QRZ_BREAKER_FAILURES,
+    QRZ_BREAKER_RESET,
+    QRZ_RATE_LIMIT,
+    QRZ_MIN_RATE_LIMIT,
+    QRZ_BURST,
+    QRZ_MAX_IN_FLIGHT,
+    QRZ_LATENCY_TARGET,
+    QRZ_NEGATIVE_TTL_PERMANENT,
+    QRZ_NEGATIVE_TTL_TRANSIENT,
+)
+
+CIRCUIT_OPEN_ERROR = "qrz.com circuit open"
+NO_SESSION_ERROR = "No qrz_session_key"
+SESSION_ERRORS = ("Session Timeout", "Invalid session key")
+
+
+def normalize_callsign(callsign: str) -> str:
+    callsign = callsign.strip().upper()
+    for suffix in ["/M", "/P"]:
+        if callsign.endswith(suffix):
+            callsign = callsign[:-len(suffix)]
+    return callsign
+
+
+def utc_now() -> datetime:
+    # qrz_negative_cache.expires/date_time are timestamps without time zone holding UTC, like geo_cache
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def is_permanent_error(error: str) -> bool:
+    """qrz.com answered, but has no grid for the callsign."""
+    return error == "no user supplied grid" or error.startswith("Not found")
+
+
+def is_transient_error(result: dict) -> bool:
+    error = result.get("error")
+    return bool(error) and not is_permanent_error(error)
+
+
+def is_session_error(result: dict) -> bool:
+    """qrz.com no longer accepts the session key."""
+    return (result.get("error") or "").startswith(SESSION_ERRORS)
+
+
+class QrzResolver:
+    """Single-flight qrz.com locator lookups.
+
+    Concurrent lookups of the same (normalized) callsign share one in-flight request, and answers
+    (not transient errors) are reused for QRZ_RESULT_TTL seconds (the collector cycles and the telnet
+    sources share them, so nothing is reset per cycle). All requests go through one AdaptiveRateLimiter.
+
+    Failed lookups are kept in a negative cache (callsign -> error, permanent, expires) until they
+    expire; entries added since the last take_dirty_negative_cache() call are persisted by the collector.
+
+    A CircuitBreaker short-circuits lookups while qrz.com keeps failing or timing out. Callsigns whose
+    lookups were abandoned (see defer()) are kept for later re-enrichment. When qrz.com rejects the
+    session key, qrz_session_key is cleared so that the collector logs in again.
+    """
+
+    def __init__(self, qrz_session_key: str, client: httpx.AsyncClient|None = None):
+        self.qrz_session_key = qrz_session_key
+        self.client = client
+        self.rate_limiter = AdaptiveRateLimiter(
+            rate=QRZ_RATE_LIMIT,
+            burst=QRZ_BURST,
+            max_in_flight=QRZ_MAX_IN_FLIGHT,
+            min_rate=QRZ_MIN_RATE_LIMIT,
+            latency_target=QRZ_LATENCY_TARGET,
+        )
+        self.in_flight: dict = {}
+        self.results: dict = {}  # callsign -> (expires, result)
+        self.requests = 0
+        self.coalesced = 0
+        self.negative_cache: dict = {}
+        self.negative_cache_dirty: dict = {}
+        self.negative_hits = 0
+        self.circuit_breaker = CircuitBreaker(failure_threshold=QRZ_BREAKER_FAILURES, reset_timeout=QRZ_BREAKER_RESET)
+        self.deferred: set = set()
+
+    def defer(self, callsign: str):
+        self.deferred.add(normalize_callsign(callsign))
+
+    def take_deferred(self) -> set:
+        deferred = self.deferred
+        self.deferred = set()
+        return deferred
+
+    def load_negative_cache(self, negative_cache: dict):
+        self.negative_cache = negative_cache
+
+    def take_dirty_negative_cache(self) -> list:
+        records = [{'callsign': callsign, **entry} for callsign, entry in self.negative_cache_dirty.items()]
+        self.negative_cache_dirty = {}
+        return records
+
+    def restore_dirty_negative_cache(self, records: list):
+        """Mark records from take_dirty_negative_cache() dirty again after their write failed."""
+        for record in records:
+            callsign = record['callsign']
+            if callsign not in self.negative_cache_dirty:
+                self.negative_cache_dirty[callsign] = {key: value for key, value in record.items() if key != 'callsign'}
+
+    def remember_failure(self, callsign: str, error: str):
+        permanent = is_permanent_error(error)
+        ttl = QRZ_NEGATIVE_TTL_PERMANENT if permanent else QRZ_NEGATIVE_TTL_TRANSIENT
+        now = utc_now()
+        entry = {
+            'error': error,
+            'permanent': permanent,
+            'expires': now + timedelta(seconds=ttl),
+            'date_time': now,
+        }
+        self.negative_cache[callsign] = entry
+        self.negative_cache_dirty[callsign] = entry
+
+    def start_cycle(self, qrz_session_key: str):
+        """New session key and statistics; lookups in flight and remembered answers are kept."""
+        self.qrz_session_key = qrz_session_key
+        self.requests = 0
+        self.coalesced = 0
+        self.negative_hits = 0
+        self.evict_expired_results()
+
+    def remember_result(self, callsign: str, result: dict):
+        self.results[callsign] = (monotonic() + QRZ_RESULT_TTL, result)
+
+    def evict_expired_results(self):
+        now = monotonic()
+        expired = [callsign for callsign, (expires, _) in self.results.items() if expires <= now]
+        for callsign in expired:
+            del self.results[callsign]
+
+    async def get_locator(self, callsign: str, debug: bool = False) -> dict:
+        key = normalize_callsign(callsign)
+        remembered = self.results.get(key)
+        if remembered is not None:
+            expires, result = remembered
+            if expires > monotonic():
+                self.coalesced += 1
+                return result
+            del self.results[key]
+
+        negative = self.negative_cache.get(key)
+        if negative is not None:
+            if negative['expires'] > utc_now():
+                self.negative_hits += 1
+                result = {"locator": None, "error": negative['error']}
+                if negative['permanent']:
+                    self.remember_result(key, result)
+                return result
+            del self.negative_cache[key]
+
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._lookup(key, debug=debug))
+            self.in_flight[key] = task
+        else:
+            self.coalesced += 1
+        # Shielded so that a cancelled waiter doesn't cancel the request the other waiters share
+        return await asyncio.shield(task)
+
+    async def _lookup(self, callsign: str, debug: bool) -> dict:
+        try:
+            if not self.qrz_session_key:
+                # Login failed or the key was rejected: no request, no rate limit token, no breaker failure
+                return {"locator": None, "error": NO_SESSION_ERROR}
+            if not self.circuit_breaker.allow_request():
+                # Not remembered: the circuit may close again soon (callers defer the callsign)
+                return {"locator": None, "error": CIRCUIT_OPEN_ERROR}
+            await self.rate_limiter.acquire()
+            self.requests += 1
+            start = monotonic()
+            try:
+                result = await asyncio.wait_for(
+                    get_locator_from_qrz(
+                        qrz_session_key=self.qrz_session_key,
+                        callsign=callsign,
+                        client=self.client,
+                        debug=debug,
+                    ),
+                    timeout=QRZ_TIMEOUT,
+                )
+            except asyncio.TimeoutError:
+                logger.error(f"qrz.com lookup of {callsign} timed out")
+                result = {"locator": None, "error": "Exception: timeout"}
+            except Exception as e:
+                logger.error(f"qrz.com lookup of {callsign} failed: {e}")
+                result = {"locator": None, "error": f"Exception: {e}"}
+            # A rejected session key is no qrz.com failure: it answered
+            session_error = is_session_error(result)
+            success = session_error or not is_transient_error(result)
+            self.rate_limiter.release(latency=monotonic() - start, success=success)
+            if success:
+                self.circuit_breaker.record_success()
+            else:
+                self.circuit_breaker.record_failure()
+                if self.circuit_breaker.state == OPEN:
+                    logger.warning(f"qrz.com circuit is open after {self.circuit_breaker.failures} failures")
+            if debug:
+                logger.debug(f"qrz.com rate limit: {self.rate_limiter.rate:.1f} requests/second")
+        finally:
+            self.in_flight.pop(callsign, None)
+        if session_error:
+            # Says nothing about the callsign; the collector logs in again at the start of the next cycle
+            if self.qrz_session_key:
+                logger.warning(f"qrz.com rejected the session key: {result['error']}")
+            self.qrz_session_key = None
+            return result
+        if not is_transient_error(result):
+            # Timeouts and errors are retried once their negative cache entry expires
+            self.remember_result(callsign, result)
+        if result.get("error") and self.qrz_session_key:
+            self.remember_failure(callsign, result["error"])
+        return result
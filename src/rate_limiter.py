@@ -0,0 +1,47 @@
+import asyncio
+from time import monotonic
+
+
+class AdaptiveRateLimiter:
+    """Async token bucket with a cap on requests in flight.
+
+    The rate backs off multiplicatively when a request fails or is slower than latency_target,
+    and recovers additively (by a tenth of the configured rate) after each good response.
+    """
+
+    def __init__(self, rate: float, burst: int, max_in_flight: int, min_rate: float, latency_target: float):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self.latency_target = latency_target
+        self.tokens = float(burst)
+        self.updated = monotonic()
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        await self.in_flight.acquire()
+        try:
+            # Waiters take tokens one at a time, in arrival order
+            async with self.lock:
+                self._refill()
+                while self.tokens < 1:
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+                    self._refill()
+                self.tokens -= 1
+        except BaseException:
+            self.in_flight.release()
+            raise
+
+    def release(self, latency: float, success: bool):
+        self.in_flight.release()
+        if not success or latency > self.latency_target:
+            self.rate = max(self.min_rate, self.rate / 2)
+        else:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
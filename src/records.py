@@ -0,0 +1,98 @@
+from datetime import date, time, datetime
+from typing import NamedTuple
+
+# Plain records passed between the collector stages. They have the columns of the db_classes models
+# (without id) and the same to_dict(), but none of the ORM instrumentation; the models are only used
+# at the bulk-write boundary.
+
+
+class DxheatRecord(NamedTuple):
+    number: int
+    spotter: str
+    frequency: str
+    dx_call: str
+    time: time
+    date: date
+    date_time: datetime
+    beacon: bool
+    mm: bool
+    am: bool
+    valid: bool
+    lotw: bool|None
+    lotw_date: date|None
+    esql: bool|None
+    dx_homecall: str
+    comment: str
+    flag: str|None
+    band: str
+    mode: str
+    missing_mode: bool
+    continent_dx: str|None
+    continent_spotter: str
+    dx_locator: str|None
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+
+class HolySpotRecord(NamedTuple):
+    date: date
+    time: time
+    date_time: datetime
+    mode: str
+    missing_mode: bool
+    band: int|None
+    frequency: float|None
+    spotter_callsign: str
+    spotter_locator: str|None
+    spotter_lat: float|None
+    spotter_lon: float|None
+    spotter_country: str|None
+    spotter_continent: str|None
+    dx_callsign: str
+    dx_locator: str|None
+    dx_lat: float|None
+    dx_lon: float|None
+    dx_country: str|None
+    dxcc_number: int|None
+    dx_continent: str|None
+    comment: str
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+
+class GeoCacheRecord(NamedTuple):
+    callsign: str
+    locator: str|None
+    lat: float|None
+    lon: float|None
+    country: str|None
+    continent: str|None
+    date: date
+    time: time
+    date_time: datetime
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+
+class ClusterSpotRecord(NamedTuple):
+    # A "DX de" line from a telnet DX cluster, enriched like a DXHeat spot but not stored raw
+    source: str
+    spotter: str
+    frequency: float
+    dx_call: str
+    time: time
+    date: date
+    date_time: datetime
+    comment: str
+    band: int|None
+    mode: str
+    missing_mode: bool
+    dx_locator: str|None
+    spotter_locator: str|None
+    valid: bool = True
+
+    def to_dict(self) -> dict:
+        return self._asdict()
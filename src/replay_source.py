@@ -0,0 +1,47 @@
+import asyncio
+import json
+from pathlib import Path
+from loguru import logger
+
+from spots_collector import prepare_dxheat_record
+from telnet_source import prepare_cluster_record
+
+
+class FileReplaySource:
+    """
+    Replays a file of spots into the pipeline, one spot per line: DXHeat JSON objects (as returned by
+    dxheat.com) or "DX de" cluster lines. Other lines are skipped. `delay` seconds between spots.
+    """
+
+    def __init__(self, filename: str, delay: float = 0, debug: bool = False):
+        self.filename = filename
+        self.name = f"replay:{Path(filename).name}"
+        self.delay = delay
+        self.debug = debug
+        self.lines = 0
+
+    def parse_cluster_line(self, line: str):
+        return prepare_cluster_record(line, source=self.name)
+
+    async def run(self, pipeline, stop_event: asyncio.Event):
+        logger.info(f"Replaying {self.filename}")
+        with open(self.filename, 'r') as file:
+            for line in file:
+                if stop_event.is_set():
+                    break
+                line = line.strip()
+                if line.startswith("{"):
+                    try:
+                        spot = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        logger.error(f"{self.name}: bad JSON line: {e}")
+                        continue
+                    await pipeline.put(spot, parse=prepare_dxheat_record, source=self.name)
+                elif line.startswith("DX de"):
+                    await pipeline.put(line, parse=self.parse_cluster_line, source=self.name)
+                else:
+                    continue
+                self.lines += 1
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+        logger.info(f"Replayed {self.lines} spots from {self.filename}")
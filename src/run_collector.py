@@ -1,22 +1,36 @@
+import argparse
 import json
-from time import time
+import signal
+from datetime import datetime, timedelta, timezone
+from time import time, perf_counter
 import sys
 from pathlib import Path
 from loguru import logger
 import asyncio
-from sqlalchemy.dialects.postgresql import insert
+import httpx
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, select
+from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, select, update
 from sqlalchemy.exc import ProgrammingError, OperationalError
 
 import settings
-from db_classes import DxheatRaw, HolySpot, GeoCache, SpotWithIssue
-from spots_collector import get_dxheat_spots, prepare_dxheat_record, prepare_holy_spot
+from db_classes import HolySpot, GeoCache, QrzNegativeCache
+from records import GeoCacheRecord
+from spots_collector import get_dxheat_records, enrich_spot, dxcc_fallback
+from pipeline import SpotPipeline, PendingSpots, notify_updated_spots
+from telnet_source import create_telnet_sources
+from replay_source import FileReplaySource
+from dxheat_watermark import DxheatWatermarks
 from qrz import get_qrz_session_key
-from misc import string_to_boolean, open_log_file
+from qrz_resolver import QrzResolver, is_transient_error, utc_now
+from location import resolve_country_and_continent, locator_to_coordinates
+from geo_cache_store import GeoCacheStore
+from http_clients import create_dxheat_client, create_qrz_client
+from bulk_writer import bulk_upsert
+from misc import string_to_boolean, open_log_file, stage_timer, acquire_process_lock
 
 from settings import (
     DEBUG,
+    ENRICHMENT_DEADLINE,
     QRZ_USER,
     QRZ_PASSOWRD,
     QRZ_API_KEY,
@@ -37,105 +51,146 @@ def get_geo_cache_from_db(callsign: str, debug: bool = False):
 
 
 async def prepare_holy_spots_records(holy_spots_list: list, 
-                                     qrz_session_key: str, 
+                                     qrz_resolver: QrzResolver, 
                                      geo_cache: dict,
                                      debug: bool=False) -> list:
         start = time()
-        tasks = []
-        accumulated_delay = 0
-        engine = create_engine(settings.DB_URL, echo=False)
-        Session = sessionmaker(bind=engine)
-        session = Session()
-
-        with engine.connect() as connection:
-          connection.execution_options(isolation_level="AUTOCOMMIT")  # Set isolation level to autocommit
-          try:
-            for index, spot in enumerate(holy_spots_list):
-              if debug:
-                logger.debug(f"{spot=}")
-                logger.debug(spot.spotter)
-              if spot.spotter in geo_cache:
-                geo_cache_spotter = geo_cache[spot.spotter]
-              else:
-                geo_cache_spotter = None
-              if spot.dx_call in geo_cache:
-                geo_cache_dx = geo_cache[spot.dx_call]
-              else:
-                geo_cache_dx = None
-              if debug:
-                logger.debug(f"{geo_cache_spotter=}")
-                logger.debug(f"{geo_cache_dx=}")
-              #geo_cache_spotter = get_geo_cache_from_db(callsign=spot["spotter"], debug=debug)
-              #geo_cache_dx = get_geo_cache_from_db(callsign=spot["dx_call"], debug=debug)
-              if not geo_cache_spotter or not geo_cache_dx:
-                accumulated_delay += 1/20
-                delay = accumulated_delay 
-              else:
-                delay = 0
-
-              task = asyncio.create_task(prepare_holy_spot(
-                  date=spot.date,
-                  time=spot.time,
-                  mode=spot.mode,
-                  missing_mode=spot.missing_mode,
-                  band=spot.band,
-                  frequency=spot.frequency,
-                  spotter_callsign=spot.spotter,
-                  dx_callsign=spot.dx_call,
-                  dx_locator=spot.dx_locator,
-                  comment=spot.comment,
-                  qrz_session_key=qrz_session_key,
-                  geo_cache_spotter=geo_cache_spotter,
-                  geo_cache_dx=geo_cache_dx,
-                  delay=delay,
-                  debug=debug
-              ))
-              tasks.append(task)
-            all_records = await asyncio.gather(*tasks)
-            # logger.debug(f"{all_records=}")
-            holy_spots_records, geo_cache_spotter_records, geo_cache_dx_records = zip(*all_records)
-            if debug:
-                logger.debug(f"{holy_spots_records=}")
-                logger.debug(f"{geo_cache_spotter_records=}")
-                logger.debug(f"{geo_cache_dx_records=}")
-            end = time()
-            if debug:
-                logger.debug(f"Elasped time: {end - start:.2f} seconds")
-
-          except (ProgrammingError, OperationalError) as e:
-            logger.error(f"Error: {e}")
+        if not holy_spots_list:
+            return (), (), ()
+
+        all_records = await asyncio.gather(*[
+            enrich_spot(spot=spot, qrz_resolver=qrz_resolver, geo_cache=geo_cache, debug=debug)
+            for spot in holy_spots_list
+        ])
+        holy_spots_records, geo_cache_spotter_records, geo_cache_dx_records = zip(*all_records)
+        if debug:
+            logger.debug(f"{holy_spots_records=}")
+            logger.debug(f"{geo_cache_spotter_records=}")
+            logger.debug(f"{geo_cache_dx_records=}")
+        end = time()
+        log_resolver_stats(qrz_resolver)
+        if debug:
+            logger.debug(f"Elasped time: {end - start:.2f} seconds")
 
         return holy_spots_records, geo_cache_spotter_records, geo_cache_dx_records
 
 
-async def collect_dxheat_spots(debug=False):
+def log_resolver_stats(qrz_resolver: QrzResolver):
+    logger.info(f"qrz.com requests: {qrz_resolver.requests}, coalesced lookups: {qrz_resolver.coalesced}, "
+                f"negative cache hits: {qrz_resolver.negative_hits}, "
+                f"rate limit: {qrz_resolver.rate_limiter.rate:.1f} requests/second")
+    if qrz_resolver.deferred:
+        logger.warning(f"Enrichment deadline ({ENRICHMENT_DEADLINE} seconds) reached or qrz.com failed, "
+                       f"{len(qrz_resolver.deferred)} callsigns stored with prefix based locations until re-enrichment")
+
+
+async def reenrich_deferred_callsigns(Session, qrz_resolver: QrzResolver, debug=False) -> list:
+    """Retry qrz.com for callsigns whose spots were stored with prefix based locations after the
+    enrichment deadline or a transient qrz.com error, and update their recent holy_spots rows (announced on SPOTS_NOTIFY_CHANNEL
+    for the API's window). Returns GeoCache records to store."""
+    callsigns = qrz_resolver.take_deferred()
+    if not callsigns:
+        return []
+    lookups = {
+        callsign: asyncio.create_task(qrz_resolver.get_locator(callsign=callsign, debug=debug))
+        for callsign in callsigns
+    }
+    done, pending = await asyncio.wait(lookups.values(), timeout=ENRICHMENT_DEADLINE)
+
+    now = datetime.now(timezone.utc)
+    geo_cache_records = []
+    for callsign, task in lookups.items():
+        if task not in done:
+            task.cancel()
+            qrz_resolver.defer(callsign)
+            continue
+        result = task.result()
+        if is_transient_error(result):
+            # qrz.com down, circuit open: tried again after the next cycle
+            qrz_resolver.defer(callsign)
+            continue
+        locator = result["locator"]
+        if not locator:
+            # qrz.com has no grid, the stored prefix based location stays
+            continue
+        lat, lon = locator_to_coordinates(locator)
+        country, continent = dxcc_fallback(callsign, *resolve_country_and_continent(callsign=callsign))
+        geo_cache_records.append(GeoCacheRecord(
+            callsign=callsign,
+            locator=locator,
+            lat=lat,
+            lon=lon,
+            country=country,
+            continent=continent,
+            date=now.date(),
+            time=now.time(),
+            date_time=now,
+        ))
+    if not geo_cache_records:
+        return []
+    try:
+        updated_ids = await asyncio.to_thread(
+            update_reenriched_spots, Session, geo_cache_records, since=now - timedelta(hours=1)
+        )
+    except (ProgrammingError, OperationalError) as e:
+        logger.error(f"Error: {e}")
+        for record in geo_cache_records:
+            qrz_resolver.defer(record.callsign)
+        return []
+    logger.info(f"Re-enriched callsigns: {len(geo_cache_records)} of {len(callsigns)}, updated spots: {len(updated_ids)}")
+    return geo_cache_records
+
+
+def update_reenriched_spots(Session, geo_cache_records: list, since: datetime) -> list:
+    """Set the re-enriched locations on the holy_spots rows since `since`, in one short transaction
+    (run in a worker thread). Returns the ids of the updated rows."""
+    updated_ids = set()
+    with Session() as session:
+        for record in geo_cache_records:
+            for role in ("spotter", "dx"):
+                stmt = update(HolySpot).where(
+                    getattr(HolySpot, f"{role}_callsign") == record.callsign,
+                    HolySpot.date_time >= since,
+                ).values({
+                    f"{role}_locator": record.locator,
+                    f"{role}_lat": record.lat,
+                    f"{role}_lon": record.lon,
+                }).returning(HolySpot.id)
+                updated_ids.update(session.execute(stmt).scalars())
+        notify_updated_spots(session, list(updated_ids))
+        session.commit()
+    return sorted(updated_ids)
+
+
+async def fetch_dxheat_spots(pipeline: SpotPipeline, client: httpx.AsyncClient|None=None,
+                             watermarks: DxheatWatermarks|None=None, pending: PendingSpots|None=None,
+                             debug=False) -> int:
+    """Fetch all bands concurrently and feed each band's new spots into the pipeline as soon as they arrive.
+    With watermarks, spots already seen on a band are dropped and each band is polled with its own limit.
+    With pending, the spots are counted there until they are written."""
     bands = [160, 80, 60, 40, 30, 20, 17, 15, 12, 10, 6, 4]
-    start = time()
-    tasks = []
-    for band in bands:
-        task = asyncio.create_task(get_dxheat_spots(band=band, limit=30))
-        tasks.append(task)
-    all_spots = await asyncio.gather(*tasks)
-
-    if debug:
-        logger.debug(f"all_spots=\n{all_spots}")
-    end = time()
-    if debug:
-        logger.debug(f"Elasped time: {end - start:.2f} seconds")
 
-    spot_records = []
-    for spots_in_band in all_spots:
-        if debug:
-            logger.debug(f"list=\n{spots_in_band}")
-        for spot in spots_in_band:
-            if debug:
-                logger.debug(f"spot={spot}")
-            record = prepare_dxheat_record(spot)
-            spot_records.append(record)
+    async def fetch_band(band: int) -> int:
+        limit = watermarks.limit(band) if watermarks else settings.DXHEAT_LIMIT_INITIAL
+        try:
+            records = await get_dxheat_records(band=band, limit=limit, client=client)
+        except (httpx.HTTPError, ValueError) as e:
+            logger.error(f"DXHeat band {band} error: {e}")
+            return 0
+        if watermarks:
+            records = watermarks.new_spots(band, records)
+        for record in records:
             if debug:
                 logger.debug(f"record={record}")
+            await pipeline.put(record, pending=pending)
+        return len(records)
 
-    return spot_records
+    start = time()
+    spots_per_band = await asyncio.gather(*[fetch_band(band) for band in bands])
+    end = time()
+    if debug:
+        logger.debug(f"Elasped time: {end - start:.2f} seconds")
+    return sum(spots_per_band)
 
 
 def add_spot_to_spots_with_issues_file(spot:dict):
@@ -145,130 +200,237 @@ def add_spot_to_spots_with_issues_file(spot:dict):
         for key, value in spot.items():
             f.write(f'{key}: {value}\n')
 
-async def main(debug=False):
-    holy_spots_list = []
-    qrz_session_key = get_qrz_session_key(username=QRZ_USER, password=QRZ_PASSOWRD, api_key=QRZ_API_KEY)    
-    
-    # callsign_to_locator_filename = f"{grandparent_folder}/src/prefixes_list.csv"
-    # if debug:
-    #     logger.debug(f"{callsign_to_locator_filename=}")
-    # prefixes_to_locators = read_csv_to_list_of_tuples(filename=callsign_to_locator_filename)
-
-    engine = create_engine(settings.DB_URL, echo=False)
-    Session = sessionmaker(bind=engine)
-    session = Session()
-
-    with engine.connect() as connection:
-        connection.execution_options(isolation_level="AUTOCOMMIT")  # Set isolation level to autocommit
+class CollectorState:
+    """Resources that are kept warm between collector cycles."""
+
+    def __init__(self):
+        self.engine = create_engine(settings.DB_URL, echo=False, pool_pre_ping=True)
+        self.Session = sessionmaker(bind=self.engine)
+        self.dxheat_client = create_dxheat_client()
+        self.dxheat_watermarks = DxheatWatermarks()
+        self.qrz_client = create_qrz_client()
+        self.qrz_resolver = QrzResolver(qrz_session_key=None, client=self.qrz_client)
+        # Added after the first release, so create it on databases that predate it
+        QrzNegativeCache.__table__.create(bind=self.engine, checkfirst=True)
+        self.qrz_session_key = None
+        self.qrz_session_time = 0
+        self.geo_cache_store = GeoCacheStore(snapshot_filename=settings.GEO_CACHE_SNAPSHOT)
+        self.geo_cache_loaded = False
+        self.snapshot_time = 0
+        self.cycle_lock = asyncio.Lock()
+        self.cycles = 0
+        self.last_cycle_timings = {}
+        self.pipeline = SpotPipeline(state=self, debug=string_to_boolean(DEBUG))
+
+    async def ensure_qrz_session(self, debug=False):
+        if self.qrz_session_key and not self.qrz_resolver.qrz_session_key:
+            # qrz.com rejected the key before QRZ_SESSION_REFRESH (see QrzResolver)
+            self.qrz_session_key = None
+        if self.qrz_session_key and time() - self.qrz_session_time < settings.QRZ_SESSION_REFRESH:
+            return self.qrz_session_key
+        logger.info("Logging in to qrz.com")
         try:
-            # Reading GeoCache
+            qrz_session_key = await asyncio.to_thread(
+                get_qrz_session_key, username=QRZ_USER, password=QRZ_PASSOWRD, api_key=QRZ_API_KEY
+            )
+        except Exception as e:
+            logger.error(f"qrz.com login error: {e}")
+            qrz_session_key = None
+        if qrz_session_key:
+            self.qrz_session_key = qrz_session_key
+            self.qrz_session_time = time()
+        else:
+            logger.error("qrz.com login failed, keeping previous session key")
+        return self.qrz_session_key
+
+    def ensure_geo_cache(self, session, debug=False):
+        store = self.geo_cache_store
+        if not self.geo_cache_loaded:
             logger.info("Reading geo_cache from database")
-            geo_cache = { 
-                row.callsign: {
-                    'locator': row.locator, 
-                    'lat': row.lat, 
-                    'lon': row.lon, 
-                    'country': row.country,
-                    'continent': row.continent,
-                } 
-                for row in session.query(GeoCache).all()
+            store.load_snapshot()
+            self.load_negative_cache(session=session)
+        rows = store.refresh(session=session, debug=debug)
+        if debug:
+            logger.debug(f"{json.dumps(store.entries, indent=4, sort_keys=False, default=str)}")
+        logger.info(f"geo_cache records: {len(store.entries)}, read from database: {rows}")
+        if not self.geo_cache_loaded or time() - self.snapshot_time >= settings.GEO_CACHE_SNAPSHOT_INTERVAL:
+            store.save_snapshot()
+            self.snapshot_time = time()
+        self.geo_cache_loaded = True
+        return store.entries
+
+    async def write_geo_cache(self, debug=False):
+        """Upsert the dirty geo_cache entries in a short transaction, in a worker thread."""
+        records = self.geo_cache_store.take_dirty()
+
+        def write():
+            with self.Session() as session:
+                bulk_upsert(session=session, model=GeoCache, records=records, index_elements=['callsign'], debug=debug)
+                session.commit()
+
+        try:
+            await asyncio.to_thread(write)
+        except BaseException:
+            self.geo_cache_store.restore_dirty(records)
+            raise
+
+    def load_negative_cache(self, session):
+        negative_cache = {
+            row.callsign: {
+                'error': row.error,
+                'permanent': row.permanent,
+                'expires': row.expires,
+                'date_time': row.date_time,
             }
-            if debug:
-                logger.debug(f"{json.dumps(geo_cache, indent=4, sort_keys=False)}")
-            logger.info(f"geo_cache records: {len(geo_cache)}")
-
-            #  dxheat_raw
-            logger.info("Collecting spots from DXHeat")
-            spot_records = await collect_dxheat_spots(debug=debug)
-            for record in spot_records:
-                dxheat_record_to_dict = record.to_dict()
-                stmt = insert(DxheatRaw).values(**dxheat_record_to_dict)
-                # Define the conflict resolution (do nothing on conflict)
-                stmt = stmt.on_conflict_do_nothing(
-                    index_elements=['date', 'time', 'spotter', 'dx_call']
-                    # index_elements=['id'],  # The unique column causing the conflict
-                )                
-                # Execute the statement
-                session.execute(stmt)
-
-                if  record.valid:
-                    holy_spots_list.append(record)
-            logger.info(f"DXHeat records: {len(spot_records)}")
-            
-            # holy_spot
-            logger.info("Preparing Holy Spots")
-            holy_spots_records, geo_cache_spotter_records, geo_cache_dx_records = await prepare_holy_spots_records(holy_spots_list=holy_spots_list, 
-                                                                  qrz_session_key=qrz_session_key,
-                                                                  geo_cache=geo_cache,
-                                                                  debug=debug)
-            logger.info(f"Holy Spots records: {len(holy_spots_records)}")
-            logger.info("Adding Holy Spots to database")
-            good_records: int = 0
-            records_with_issues: int = 0
-            for record in holy_spots_records:
-                issue = False
-                issue_but_report = False
-                if debug:
-                    logger.debug(f"{record=}")
-                holy_spot_record_dict = record.to_dict()
-                if not holy_spot_record_dict['spotter_locator']:
-                    holy_spot_record_dict['comment'] += " *** Missing spotter locator ***"
-                    issue = True
-                if not holy_spot_record_dict['dx_locator']:
-                    holy_spot_record_dict['comment'] += " *** Missing dx locator ***"
-                    issue = True
-                if holy_spot_record_dict['spotter_callsign']=='W3LPL':
-                    holy_spot_record_dict['comment'] += " *** Spotter is W3LPL ***"
-                    issue = True
-                if not holy_spot_record_dict['dx_country']:
-                    holy_spot_record_dict['comment'] += " *** Missing dx_country ***"
-                    issue_but_report = True
-
-                if not issue:
-                    good_records += 1
-                    stmt = insert(HolySpot).values(**holy_spot_record_dict)
-                else:
-                    records_with_issues += 1
-                    stmt = insert(SpotWithIssue).values(**holy_spot_record_dict)
-                    logger.error(f"Issues with spot:\n{holy_spot_record_dict}")
-                if issue_but_report:
-                    records_with_issues += 1
-                    stmt = insert(SpotWithIssue).values(**holy_spot_record_dict)
-                    logger.error(f"Issues with spot:\n{holy_spot_record_dict}")
-                # Removing duplication by: Define the conflict resolution (do nothing on conflict)
-                stmt = stmt.on_conflict_do_nothing(
-                    index_elements=['date', 'time', 'spotter_callsign', 'dx_callsign']
-                )                
-                # Execute the statement
-                session.execute(stmt)
-            logger.info(f"Good records: {good_records}, records with issues: {records_with_issues}")
-
-            session.commit()
-
-            # geo_cache
-            logger.info("Updating geo_cache")
-            for record in geo_cache_spotter_records + geo_cache_dx_records:
-                if debug:
-                    logger.debug(f"{record=}")
-                geo_cache_record_dict = record.to_dict()
-                stmt = insert(GeoCache).values(**geo_cache_record_dict)
-                # Removing duplication by: Define the conflict resolution (do nothing on conflict)
-                stmt = stmt.on_conflict_do_update(
-                    index_elements=['callsign'],
-                    set_={col: getattr(stmt.excluded, col) for col in geo_cache_record_dict}
-                )                
-                # Execute the statement
-                session.execute(stmt)
-            session.commit()
-
-            # DX Lite
-            # TBD
-
-        except (ProgrammingError, OperationalError) as e:
-            logger.error(f"Error: {e}")
+            for row in session.query(QrzNegativeCache).filter(QrzNegativeCache.expires > utc_now()).all()
+        }
+        self.qrz_resolver.load_negative_cache(negative_cache)
+        logger.info(f"qrz_negative_cache records: {len(negative_cache)}")
+
+    async def close(self):
+        await self.pipeline.stop()
+        self.geo_cache_store.save_snapshot()
+        await self.dxheat_client.aclose()
+        await self.qrz_client.aclose()
+        self.engine.dispose()
+
+
+async def run_cycle(state: CollectorState, debug=False):
+    timings = {}
+    cycle_start = perf_counter()
+
+    with stage_timer(timings, "qrz_login"):
+        qrz_session_key = await state.ensure_qrz_session(debug=debug)
+        state.qrz_resolver.start_cycle(qrz_session_key=qrz_session_key)
+
+    # Sessions are opened around each database step only: no connection sits idle in a transaction
+    # (holding back VACUUM) while the cycle waits for DXHeat, the pipeline or qrz.com
+    try:
+        # Reading GeoCache
+        with stage_timer(timings, "geo_cache_read"):
+            with state.Session() as session:
+                state.ensure_geo_cache(session=session, debug=debug)
+
+        # dxheat_raw, holy_spots, spots_with_issues and geo_cache are written by the pipeline
+        state.pipeline.start()
+        logger.info("Collecting spots from DXHeat")
+        # Only this cycle's spots are waited for, telnet and replay spots keep flowing meanwhile
+        pending = PendingSpots()
+        with stage_timer(timings, "dxheat_fetch"):
+            spots = await fetch_dxheat_spots(
+                pipeline=state.pipeline,
+                client=state.dxheat_client,
+                watermarks=state.dxheat_watermarks,
+                pending=pending,
+                debug=debug,
+            )
+        logger.info(f"DXHeat new records: {spots}")
+        if debug:
+            logger.debug(f"DXHeat bands: {state.dxheat_watermarks.stats()}")
+        with stage_timer(timings, "pipeline_drain"):
+            try:
+                await asyncio.wait_for(pending.wait(), timeout=settings.PIPELINE_DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"DXHeat spots not written after {settings.PIPELINE_DRAIN_TIMEOUT} seconds, {len(pending)} items pending")
+        log_resolver_stats(state.qrz_resolver)
+        state.pipeline.log_stats()
+
+        with stage_timer(timings, "reenrich"):
+            geo_cache_records = await reenrich_deferred_callsigns(
+                Session=state.Session, qrz_resolver=state.qrz_resolver, debug=debug
+            )
+            if geo_cache_records:
+                state.geo_cache_store.stage(geo_cache_records)
+                await state.write_geo_cache(debug=debug)
+
+        # DX Lite
+        # TBD
+
+    except (ProgrammingError, OperationalError) as e:
+        logger.error(f"Error: {e}")
+
+    timings["total"] = round(perf_counter() - cycle_start, 3)
+    state.cycles += 1
+    state.last_cycle_timings = timings
+    logger.info(f"Cycle {state.cycles} timings (seconds): {timings}")
+    return timings
+
+
+def start_sources(sources: list, pipeline: SpotPipeline, stop_event: asyncio.Event) -> list:
+    """Fan-in: every source streams into the one pipeline, whose dedup stage drops cross-source duplicates."""
+    pipeline.start()
+    tasks = [asyncio.create_task(source.run(pipeline=pipeline, stop_event=stop_event)) for source in sources]
+    if sources:
+        logger.info(f"Sources started: {[source.name for source in sources]}")
+    return tasks
+
+
+async def main(debug=False, replay_files: list = ()):
+    state = CollectorState()
+    try:
+        await run_cycle(state=state, debug=debug)
+        if replay_files:
+            sources = [FileReplaySource(filename=filename, debug=debug) for filename in replay_files]
+            await asyncio.gather(*start_sources(sources, pipeline=state.pipeline, stop_event=asyncio.Event()))
+            await state.pipeline.join()
+            state.pipeline.log_stats()
+    finally:
+        await state.close()
+
+
+async def run_daemon(interval: float, debug=False, replay_files: list = ()):
+    """Run collector cycles every `interval` seconds, keeping the engine, qrz.com session and geo_cache warm.
+    Telnet cluster sources (TELNET_CLUSTERS) and replayed files stream into the same pipeline between cycles."""
+    state = CollectorState()
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    logger.info(f"Collector daemon started, interval={interval} seconds")
+    sources = create_telnet_sources(settings.TELNET_CLUSTERS, settings.TELNET_CALLSIGN, debug=debug)
+    sources += [FileReplaySource(filename=filename, debug=debug) for filename in replay_files]
+    source_tasks = []
+    next_run = loop.time()
+    try:
+        while not stop_event.is_set():
+            # Overlap guard: a cycle never starts while the previous one is still running
+            async with state.cycle_lock:
+                try:
+                    await run_cycle(state=state, debug=debug)
+                except Exception as e:
+                    logger.exception(f"Collector cycle failed: {e}")
+
+            # After the first cycle, so qrz.com and geo_cache are ready for them
+            if sources and not source_tasks:
+                source_tasks = start_sources(sources, pipeline=state.pipeline, stop_event=stop_event)
+
+            next_run += interval
+            now = loop.time()
+            if next_run < now:
+                skipped = int((now - next_run) // interval) + 1
+                logger.warning(f"Cycle took longer than the interval, skipping {skipped} cycle(s)")
+                next_run += skipped * interval
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=next_run - now)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        for task in source_tasks:
+            task.cancel()
+        await asyncio.gather(*source_tasks, return_exceptions=True)
+        await state.close()
+        logger.info("Collector daemon stopped")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collect DXHeat spots into the holy_cluster database")
+    parser.add_argument("--daemon", action="store_true", help="keep running and collect every --interval seconds")
+    parser.add_argument("--interval", type=float, default=settings.COLLECTOR_INTERVAL, help="seconds between cycles in daemon mode")
+    parser.add_argument("--replay", nargs="+", default=[], metavar="FILE",
+                        help="also feed spots from files (DXHeat JSON or \"DX de\" lines, one per line)")
+    args = parser.parse_args()
+
     start = time()
     # logger.info(f"DEBUG={DEBUG}")
     if string_to_boolean(DEBUG):
@@ -276,7 +438,17 @@ if __name__ == "__main__":
         open_log_file("logs/run_collector")
     else:
         logger.info("DEBUG is False")
-    asyncio.run(main(debug=string_to_boolean(DEBUG)))
+
+    # Don't let runs pile up: exit if another collector (cron run or daemon) is still working
+    lock_file = acquire_process_lock(settings.COLLECTOR_LOCK_FILE)
+    if lock_file is None:
+        logger.warning(f"Another collector is running ({settings.COLLECTOR_LOCK_FILE} is locked), exiting")
+        sys.exit(0)
+
+    if args.daemon:
+        asyncio.run(run_daemon(interval=args.interval, debug=string_to_boolean(DEBUG), replay_files=args.replay))
+    else:
+        asyncio.run(main(debug=string_to_boolean(DEBUG), replay_files=args.replay))
     end = time()
     if DEBUG:
         logger.debug(f"Elasped time: {end - start:.2f} seconds")
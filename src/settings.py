@@ -20,29 +20,75 @@ DATABASE = "holy_cluster"
 GENERAL_DB_URL = f"postgresql+psycopg2://{PSQL_USERNAME}:{PSQL_PASSWORD}@{HOST}:{PORT}"
 DB_URL = f"{GENERAL_DB_URL}/{DATABASE}"
 
-FT8_HF_FREQUENCIES = [
-    (1840.0, 1843.0),   # 160m
-    (3573.0, 3575.0),   # 80m
-    (5357.0, 5360.5),   # 60m
-    (7074.0, 7077.0),   # 40m
-    (10136.0, 10139.0), # 30m
-    (14074.0, 14077.0), # 20m
-    (18100.0, 18104.0), # 17m
-    (21074.0, 21077.0), # 15m
-    (24915.0, 24918.0), # 12m
-    (28074.0, 28077.0), # 10m
-    (50313.0, 50316.0), # 6m
-    (50323.0, 50326.0), # 6m alternative
-]
-
-FT4_HF_FREQUENCIES = [
-    (3575.0, 3578.0),   # 80m
-    (70475.0, 70478.0),  # 40m
-    (10140.0, 10143.0),  # 30m
-    (14080.0, 14083.0),  # 20m
-    (18104.0, 18107.0),  # 17m
-    (21140.0, 21143.0),  # 15m
-    (24919.0, 24922.0),  # 12m
-    (28180.0, 28183.0),  # 10m
-    (50318.0, 50321.0)  # 6m
-]
\ No newline at end of file
+# Collector daemon
+COLLECTOR_INTERVAL = env.float("COLLECTOR_INTERVAL", 60)  # seconds between cycle starts
+COLLECTOR_LOCK_FILE = env.str("COLLECTOR_LOCK_FILE", "/tmp/holycluster_collector.lock")
+QRZ_SESSION_REFRESH = env.float("QRZ_SESSION_REFRESH", 6 * 3600)  # re-login to qrz.com after this many seconds
+
+# In-memory geo_cache
+GEO_CACHE_MAX_AGE = env.float("GEO_CACHE_MAX_AGE", 24 * 3600)  # same age cleanup_database deletes at
+GEO_CACHE_REFRESH_OVERLAP = env.float("GEO_CACHE_REFRESH_OVERLAP", 3600)  # re-read rows this far behind the high-water mark
+GEO_CACHE_SNAPSHOT = env.str("GEO_CACHE_SNAPSHOT", None)  # optional pickle file for fast warm start
+GEO_CACHE_SNAPSHOT_INTERVAL = env.float("GEO_CACHE_SNAPSHOT_INTERVAL", 300)
+GEO_CACHE_TOUCH_INTERVAL = env.float("GEO_CACHE_TOUCH_INTERVAL", 3600)  # rewrite unchanged rows seen again after this long, so cleanup keeps them
+
+# Shared HTTP clients (DXHeat and qrz.com)
+HTTP2 = env.bool("HTTP2", True)  # used only when the h2 package is installed
+HTTP_MAX_CONNECTIONS = env.int("HTTP_MAX_CONNECTIONS", 20)
+HTTP_MAX_KEEPALIVE_CONNECTIONS = env.int("HTTP_MAX_KEEPALIVE_CONNECTIONS", 10)
+HTTP_KEEPALIVE_EXPIRY = env.float("HTTP_KEEPALIVE_EXPIRY", 120)
+HTTP_CONNECT_TIMEOUT = env.float("HTTP_CONNECT_TIMEOUT", 5)
+DXHEAT_TIMEOUT = env.float("DXHEAT_TIMEOUT", 15)
+
+# Spots asked from DXHeat per band and poll, adapted to each band's rate of new spots (DXHeat returns at most 50)
+DXHEAT_LIMIT_INITIAL = env.int("DXHEAT_LIMIT_INITIAL", 30)
+DXHEAT_LIMIT_MIN = env.int("DXHEAT_LIMIT_MIN", 5)
+DXHEAT_LIMIT_MAX = env.int("DXHEAT_LIMIT_MAX", 50)
+DXHEAT_LIMIT_HEADROOM = env.float("DXHEAT_LIMIT_HEADROOM", 2)  # limit = new spots per poll * headroom
+QRZ_TIMEOUT = env.float("QRZ_TIMEOUT", 30)
+QRZ_RESULT_TTL = env.float("QRZ_RESULT_TTL", 600)  # seconds a qrz.com answer is reused for the same callsign
+
+# qrz.com request rate limiter
+QRZ_RATE_LIMIT = env.float("QRZ_RATE_LIMIT", 20)  # requests per second
+QRZ_MIN_RATE_LIMIT = env.float("QRZ_MIN_RATE_LIMIT", 1)  # lowest rate adaptive back-off goes down to
+QRZ_BURST = env.int("QRZ_BURST", 5)
+QRZ_MAX_IN_FLIGHT = env.int("QRZ_MAX_IN_FLIGHT", 10)
+QRZ_LATENCY_TARGET = env.float("QRZ_LATENCY_TARGET", 5)  # seconds, slower responses count as back-off signal
+
+# qrz.com negative cache: how long failed lookups are answered locally
+QRZ_NEGATIVE_TTL_PERMANENT = env.float("QRZ_NEGATIVE_TTL_PERMANENT", 7 * 24 * 3600)  # no grid / not found
+QRZ_NEGATIVE_TTL_TRANSIENT = env.float("QRZ_NEGATIVE_TTL_TRANSIENT", 600)  # HTTP errors, timeouts, other qrz.com errors
+
+# qrz.com circuit breaker: after this many consecutive failures/timeouts, skip qrz.com for QRZ_BREAKER_RESET seconds
+QRZ_BREAKER_FAILURES = env.int("QRZ_BREAKER_FAILURES", 5)
+QRZ_BREAKER_RESET = env.float("QRZ_BREAKER_RESET", 60)
+
+# Spots still waiting for qrz.com after this many seconds are stored with prefix based locations
+ENRICHMENT_DEADLINE = env.float("ENRICHMENT_DEADLINE", 20)
+
+# Rows per multi-row INSERT statement (Postgres allows up to 65535 bind parameters per statement)
+BULK_INSERT_CHUNK_SIZE = env.int("BULK_INSERT_CHUNK_SIZE", 1000)
+
+# Collector pipeline: bounded queues between the fetch, parse, dedup, enrich and write stages
+PIPELINE_QUEUE_SIZE = env.int("PIPELINE_QUEUE_SIZE", 1000)
+# Spots being enriched at the same time (qrz.com lookups are limited separately by the rate limiter)
+PIPELINE_ENRICH_CONCURRENCY = env.int("PIPELINE_ENRICH_CONCURRENCY", 200)
+# A write batch is committed when it has this many spots or its first spot waited this many seconds
+PIPELINE_BATCH_SIZE = env.int("PIPELINE_BATCH_SIZE", 500)
+PIPELINE_BATCH_DELAY = env.float("PIPELINE_BATCH_DELAY", 0.05)
+# Spots seen (from any source) within this many seconds are not enriched again
+PIPELINE_DEDUP_WINDOW = env.int("PIPELINE_DEDUP_WINDOW", 2 * 3600)
+DEDUP_FREQUENCY_STEP = env.float("DEDUP_FREQUENCY_STEP", 1.0)  # kHz, frequency rounding of the dedup key
+# Seconds a cycle waits for the pipeline to write the DXHeat spots it fetched
+PIPELINE_DRAIN_TIMEOUT = env.float("PIPELINE_DRAIN_TIMEOUT", 60)
+
+# NOTIFY channel for new holy_spots ids, LISTENed to by the API (empty: don't notify)
+SPOTS_NOTIFY_CHANNEL = env.str("SPOTS_NOTIFY_CHANNEL", "holy_spots")
+
+# Telnet DX cluster sources (daemon mode), e.g. TELNET_CLUSTERS=dxc.ve7cc.net:23,dxusa.net:7300
+TELNET_CLUSTERS = env.list("TELNET_CLUSTERS", [])
+TELNET_CALLSIGN = env.str("TELNET_CALLSIGN", None)  # login callsign, e.g. 4X5BR-1
+TELNET_CONNECT_TIMEOUT = env.float("TELNET_CONNECT_TIMEOUT", 10)
+TELNET_IDLE_TIMEOUT = env.float("TELNET_IDLE_TIMEOUT", 300)  # reconnect when nothing was received for this long
+TELNET_RECONNECT_MIN = env.float("TELNET_RECONNECT_MIN", 1)  # backoff between reconnects, doubled up to the max
+TELNET_RECONNECT_MAX = env.float("TELNET_RECONNECT_MAX", 120)
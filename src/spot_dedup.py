@@ -0,0 +1,57 @@
+from collections import deque
+from time import monotonic
+
+from band_plan import parse_frequency
+
+from settings import PIPELINE_DEDUP_WINDOW, DEDUP_FREQUENCY_STEP
+
+
+def spot_key(record, frequency_step: float = DEDUP_FREQUENCY_STEP) -> tuple:
+    """(spotter, dx, frequency bucket, minute) of a DxheatRecord or ClusterSpotRecord."""
+    frequency = parse_frequency(record.frequency)
+    bucket = round(frequency / frequency_step) if frequency is not None else None
+    minute = int(record.date_time.timestamp()) // 60
+    return record.spotter.upper(), record.dx_call.upper(), bucket, minute
+
+
+class SpotDedupIndex:
+    """
+    Spots seen in the last `window` seconds, from any source.
+
+    Sources round frequency and time differently (DXHeat vs. cluster nodes vs. skimmers), so a spot
+    is a duplicate when a key within one frequency bucket and one minute of its own was seen.
+    """
+
+    def __init__(self, window: float = PIPELINE_DEDUP_WINDOW, frequency_step: float = DEDUP_FREQUENCY_STEP):
+        self.window = window
+        self.frequency_step = frequency_step
+        self.keys = {}            # key -> monotonic time it was added
+        self.expiry = deque()     # (monotonic time, key), oldest first
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def seen(self, record) -> bool:
+        """True if the spot is a duplicate; otherwise remember it and return False."""
+        now = monotonic()
+        self.evict(now)
+        key = spot_key(record, self.frequency_step)
+        spotter, dx, bucket, minute = key
+        buckets = (bucket,) if bucket is None else (bucket - 1, bucket, bucket + 1)
+        for near_bucket in buckets:
+            for near_minute in (minute - 1, minute, minute + 1):
+                if (spotter, dx, near_bucket, near_minute) in self.keys:
+                    return True
+        self.keys[key] = now
+        self.expiry.append((now, key))
+        return False
+
+    def forget(self, record):
+        self.keys.pop(spot_key(record, self.frequency_step), None)
+
+    def evict(self, now: float):
+        while self.expiry and now - self.expiry[0][0] >= self.window:
+            added, key = self.expiry.popleft()
+            # Forgotten and seen again since: the newer entry stays
+            if self.keys.get(key) == added:
+                del self.keys[key]
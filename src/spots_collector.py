@@ -1,28 +1,30 @@
 from datetime import datetime, timezone
-# import asyncio
-import json
-import re
+import asyncio
 from loguru import logger
 import httpx
 
-from db_classes import DxheatRaw, HolySpot, GeoCache
-from location import resolve_locator, resolve_country_and_continent, locator_to_coordinates
-from qrz import get_locator_from_qrz
+from records import HolySpotRecord, GeoCacheRecord
+from location import resolve_callsign, locator_to_coordinates
+from dxcc import resolve_dxcc, DxccEntity
+from band_plan import classify_spot, parse_band, parse_frequency
+from dxheat_decoder import loads, validate_dxheat_spot, decode_dxheat_spot, decode_dxheat_payload
+from qrz_resolver import QrzResolver, is_transient_error
 
-from settings import (
-    FT8_HF_FREQUENCIES,
-    FT4_HF_FREQUENCIES
-)
+from settings import ENRICHMENT_DEADLINE
 
 
-async def get_dxheat_spots(band:int, limit:int=30, debug:bool=False) -> list|None:
+async def fetch_dxheat_payload(band:int, limit:int=30, debug:bool=False, client: httpx.AsyncClient|None=None) -> bytes|None:
+    """The raw response body of a DXHeat spots request, None if it failed."""
     assert isinstance(band, int)
     assert isinstance(limit, int)
     limit = min(50, limit)
     
     url = f"https://dxheat.com/source/spots/?a={limit}&b={band}&cdx=EU&cdx=NA&cdx=SA&cdx=AS&cdx=AF&cdx=OC&cdx=AN&cde=EU&cde=NA&cde=SA&cde=AS&cde=AF&cde=OC&cde=AN&m=CW&m=PHONE&m=DIGI&valid=1&spam=0"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, timeout=15)
+    if client is None:
+        async with httpx.AsyncClient() as client:
+            response = await client.get(url, timeout=15)
+    else:
+        response = await client.get(url)
     if debug:
         logger.debug(f"{response.content}")
 
@@ -30,64 +32,46 @@ async def get_dxheat_spots(band:int, limit:int=30, debug:bool=False) -> list|Non
     if response.status_code == 200:
         if debug:
             logger.debug(f"band={band}, limit={limit}")
-        # Parse JSON string to a Python list
-        spots = []
-        for spot in json.loads(response.content):
-            if debug:
-                logger.debug(f"spot={spot}")
-            spots.append(spot)
-        return spots
+        return response.content
     else:
+        return None
+
+
+async def get_dxheat_spots(band:int, limit:int=30, debug:bool=False, client: httpx.AsyncClient|None=None) -> list|None:
+    content = await fetch_dxheat_payload(band=band, limit=limit, debug=debug, client=client)
+    if content is None:
         return []
+    # Parse JSON string to a Python list
+    return loads(content)
 
 
-def prepare_dxheat_record(spot, debug=False):
-    time = datetime.strptime(spot['Time'], '%H:%M').time()
-    date = datetime.strptime(spot['Date'], '%d/%m/%y').date()
-    missing_mode = False
-    if "Mode" not in spot:
-      spot["Mode"] = "SSB"
-      missing_mode = True
-    if not 'DXLocator' in spot:
-        spot['DXLocator'] =  None
-    record = DxheatRaw(
-        number=spot['Nr'],
-        spotter=spot['Spotter'],
-        frequency=spot['Frequency'],
-        dx_call=spot['DXCall'],
-        time=time,
-        date=date,
-        date_time=datetime.combine(date, time, tzinfo=timezone.utc),
-        beacon=spot['Beacon'],
-        mm=spot['MM'],
-        am=spot['AM'],
-        valid=spot['Valid'],
-        lotw=spot['LOTW'] if 'LOTW' in spot else None,
-        lotw_date=datetime.strptime(spot['LOTW_Date'], '%m/%d/%Y').date() if 'LOTW_Date' in spot else None,
-        esql=spot['EQSL'] if 'EQSL' in spot else None,
-        dx_homecall=spot['DXHomecall'],
-        comment=spot['Comment'],
-        flag=spot.get('Flag'),
-        band=str(spot['Band']),
-        mode=spot['Mode'],
-        missing_mode=missing_mode,
-        continent_dx=spot.get('Continent_dx'),
-        continent_spotter=spot['Continent_spotter'],
-        dx_locator=spot['DXLocator']
-    )
+async def get_dxheat_records(band:int, limit:int=30, debug:bool=False, client: httpx.AsyncClient|None=None) -> list:
+    """DxheatRecords straight from the response bytes, see dxheat_decoder."""
+    content = await fetch_dxheat_payload(band=band, limit=limit, debug=debug, client=client)
+    if content is None:
+        return []
+    return decode_dxheat_payload(content, debug=debug)
+
 
+def prepare_dxheat_record(spot, debug=False):
+    problem = validate_dxheat_spot(spot)
+    if problem is not None:
+        raise ValueError(problem)
+    record = decode_dxheat_spot(spot)
+    if debug:
+        logger.debug(f"{record=}")
     return record
 
 
-def is_value_in_range(value, range):
-    try:
-        value = float(value)
-        for lower, upper in range:
-            if lower <= value <= upper:
-                return True
-    except ValueError:
-        return False
-    return False
+def dxcc_fallback(callsign: str, country: str|None, continent: str|None, dxcc_entity: DxccEntity|None = None) -> tuple:
+    """(country, continent), from the DXCC list when the prefixes gave no country:
+    prefixes_list.csv doesn't know every entity."""
+    if not country:
+        dxcc_entity = dxcc_entity or resolve_dxcc(callsign)
+        if dxcc_entity:
+            return dxcc_entity.name, dxcc_entity.continent
+    return country, continent
+
 
 async def prepare_holy_spot(
     date,
@@ -100,13 +84,17 @@ async def prepare_holy_spot(
     dx_callsign: str,
     dx_locator: str,
     comment: str,
-    qrz_session_key: str,
+    qrz_resolver: QrzResolver|None,  # None: don't wait for qrz.com, use prefix based locations
     geo_cache_spotter: dict,
     geo_cache_dx: dict,
-    delay: float = 0,
+    spotter_locator: str|None = None,  # sent by the source (telnet clusters with set/dxgrid)
     debug: bool = False
 ):
 
+    # geo_cache records only for values that didn't come from geo_cache, and not for prefix based
+    # fallbacks after a transient qrz.com error (deferred for re-enrichment instead)
+    cache_spotter = not geo_cache_spotter
+    cache_dx = not geo_cache_dx
     if  geo_cache_spotter:
         spotter_locator = geo_cache_spotter["locator"]
         spotter_lat = geo_cache_spotter["lat"]
@@ -114,22 +102,19 @@ async def prepare_holy_spot(
         spotter_country = geo_cache_spotter["country"]
         spotter_continent = geo_cache_spotter["continent"]
     else:
-        spotter_locator = await get_locator_from_qrz(
-            qrz_session_key=qrz_session_key, 
-            callsign=spotter_callsign,
-            delay=delay, 
-            debug=debug
-        )
-        spotter_locator=spotter_locator["locator"]
-        spotter_country, spotter_continent = resolve_country_and_continent(
-            callsign=spotter_callsign, 
-            # prefixes_to_locators=prefixes_to_locators
+        if not spotter_locator and qrz_resolver is not None:
+            spotter_locator = await qrz_resolver.get_locator(
+                callsign=spotter_callsign,
+                debug=debug
             )
+            if is_transient_error(spotter_locator):
+                qrz_resolver.defer(spotter_callsign)
+                cache_spotter = False
+            spotter_locator=spotter_locator["locator"]
+        prefix_locator, spotter_country, spotter_continent = resolve_callsign(spotter_callsign)
+        spotter_country, spotter_continent = dxcc_fallback(spotter_callsign, spotter_country, spotter_continent)
         if not spotter_locator:
-            spotter_locator = resolve_locator(
-                callsign=spotter_callsign, 
-                # prefixes_to_locators=prefixes_to_locators
-            )
+            spotter_locator = prefix_locator
             
         spotter_lat, spotter_lon = locator_to_coordinates(spotter_locator)
 
@@ -140,38 +125,36 @@ async def prepare_holy_spot(
         dx_country = geo_cache_dx["country"]
         dx_continent = geo_cache_dx["continent"]
     else:
-        dx_country, dx_continent = resolve_country_and_continent(
-            callsign=dx_callsign, 
-            # prefixes_to_locators=prefixes_to_locators
-        )
-        if not dx_locator:
-            dx_locator = await get_locator_from_qrz(
-                qrz_session_key=qrz_session_key, 
+        prefix_locator, dx_country, dx_continent = resolve_callsign(dx_callsign)
+        if not dx_locator and qrz_resolver is not None:
+            dx_locator = await qrz_resolver.get_locator(
                 callsign=dx_callsign, 
                 debug=debug
             )
             if debug:
               logger.debug(f"callsign={dx_callsign},   dx_locator={dx_locator}")
-            # if 'locator' in dx_locator:
+            if is_transient_error(dx_locator):
+                qrz_resolver.defer(dx_callsign)
+                cache_dx = False
             dx_locator = dx_locator["locator"]
             
-            if not dx_locator or not 'locator' in dx_locator:
-                dx_locator = resolve_locator(
-                    callsign=dx_callsign, 
-                    # prefixes_to_locators=prefixes_to_locators
-                    )
+        if not dx_locator:
+            dx_locator = prefix_locator
             
         dx_lat, dx_lon = locator_to_coordinates(dx_locator)
 
-    if is_value_in_range(frequency, FT8_HF_FREQUENCIES) or re.search("FT8", comment.upper()):
-        mode = "FT8"    
-    elif is_value_in_range(frequency, FT4_HF_FREQUENCIES) or re.search("FT4", comment.upper()):
-        mode = "FT4"
+    dxcc_entity = resolve_dxcc(dx_callsign)
+    dx_country, dx_continent = dxcc_fallback(dx_callsign, dx_country, dx_continent, dxcc_entity=dxcc_entity)
+
+    frequency = parse_frequency(frequency)
+    plan_band, mode = classify_spot(frequency, comment, mode)
+    band = parse_band(band) or plan_band
+    date_time = datetime.combine(date, time, tzinfo=timezone.utc)
 
-    holy_spot_record = HolySpot(
+    holy_spot_record = HolySpotRecord(
         date=date,  
         time=time,  
-        date_time=datetime.combine(date, time, tzinfo=timezone.utc),
+        date_time=date_time,
         mode=mode,
         missing_mode=missing_mode,
         band=band,
@@ -187,30 +170,77 @@ async def prepare_holy_spot(
         dx_lat=dx_lat,
         dx_lon=dx_lon,
         dx_country=dx_country,
+        dxcc_number=dxcc_entity.entity_code if dxcc_entity else None,
         dx_continent=dx_continent,
         comment=comment
-
     )
-    geo_cache_spotter_record = GeoCache(
-        callsign=spotter_callsign,
-        locator=spotter_locator,
-        lat=spotter_lat,
-        lon=spotter_lon,
-        country=spotter_country,
-        continent=spotter_continent,
-        date=date,  
-        time=time,  
-        date_time=datetime.combine(date, time, tzinfo=timezone.utc),
+    geo_cache_spotter_record = None
+    if cache_spotter:
+        geo_cache_spotter_record = GeoCacheRecord(
+            callsign=spotter_callsign,
+            locator=spotter_locator,
+            lat=spotter_lat,
+            lon=spotter_lon,
+            country=spotter_country,
+            continent=spotter_continent,
+            date=date,  
+            time=time,  
+            date_time=date_time,
         )
-    geo_cache_dx_record = GeoCache(
-        callsign=dx_callsign,
-        locator=dx_locator,
-        lat=dx_lat,
-        lon=dx_lon,
-        country=dx_country,
-        continent=dx_continent,
-        date=date,  
-        time=time,
-        date_time=datetime.combine(date, time, tzinfo=timezone.utc),
+    geo_cache_dx_record = None
+    if cache_dx:
+        geo_cache_dx_record = GeoCacheRecord(
+            callsign=dx_callsign,
+            locator=dx_locator,
+            lat=dx_lat,
+            lon=dx_lon,
+            country=dx_country,
+            continent=dx_continent,
+            date=date,  
+            time=time,
+            date_time=date_time,
+        )
+    return holy_spot_record, geo_cache_spotter_record, geo_cache_dx_record
+
+
+async def enrich_spot(spot, qrz_resolver: QrzResolver, geo_cache: dict, debug: bool = False) -> tuple:
+    """prepare_holy_spot() for a DxheatRecord or ClusterSpotRecord; after ENRICHMENT_DEADLINE seconds the
+    spot is prepared with prefix based locations instead and its callsigns are deferred for re-enrichment.
+    A spotter grid sent by the cluster is used (and cached) instead of asking qrz.com."""
+    spotter_locator = getattr(spot, "spotter_locator", None)  # DxheatRecords have none
+    spot_arguments = dict(
+        date=spot.date,
+        time=spot.time,
+        mode=spot.mode,
+        missing_mode=spot.missing_mode,
+        band=spot.band,
+        frequency=spot.frequency,
+        spotter_callsign=spot.spotter,
+        dx_callsign=spot.dx_call,
+        dx_locator=spot.dx_locator,
+        spotter_locator=spotter_locator,
+        comment=spot.comment,
+        geo_cache_spotter=geo_cache.get(spot.spotter),
+        geo_cache_dx=geo_cache.get(spot.dx_call),
+        debug=debug
     )
+    if debug:
+        logger.debug(f"geo_cache_spotter={spot_arguments['geo_cache_spotter']}")
+        logger.debug(f"geo_cache_dx={spot_arguments['geo_cache_dx']}")
+    try:
+        # Don't let a slow or failing qrz.com hold back the spot
+        return await asyncio.wait_for(
+            prepare_holy_spot(qrz_resolver=qrz_resolver, **spot_arguments), timeout=ENRICHMENT_DEADLINE
+        )
+    except asyncio.TimeoutError:
+        if debug:
+            logger.debug(f"Enrichment deadline ({ENRICHMENT_DEADLINE} seconds) reached for {spot.spotter} -> {spot.dx_call}")
+    holy_spot_record, geo_cache_spotter_record, geo_cache_dx_record = await prepare_holy_spot(qrz_resolver=None, **spot_arguments)
+    # Fallback locations are not cached, the callsigns are looked up again by reenrich_deferred_callsigns()
+    if not spot_arguments['geo_cache_spotter'] and not spotter_locator:
+        qrz_resolver.defer(spot.spotter)
+        geo_cache_spotter_record = None
+    if not spot_arguments['geo_cache_dx'] and not spot.dx_locator:
+        qrz_resolver.defer(spot.dx_call)
+        geo_cache_dx_record = None
     return holy_spot_record, geo_cache_spotter_record, geo_cache_dx_record
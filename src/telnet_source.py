@@ -0,0 +1,189 @@
+import asyncio
+import random
+import re
+from datetime import datetime, timedelta, timezone
+from loguru import logger
+
+from records import ClusterSpotRecord
+
+from settings import (
+    TELNET_CONNECT_TIMEOUT,
+    TELNET_IDLE_TIMEOUT,
+    TELNET_RECONNECT_MIN,
+    TELNET_RECONNECT_MAX,
+)
+
+# DX de SP3OCC:     3702.0  SP100IARU    95th PZK - 100th IARU SSB          28 1442Z JO92
+# The token before the time is the dx grid (set/dxgrid) or ITU zone, the one after it the spotter grid.
+DX_LINE_REGEX = re.compile(
+    r"^DX de\s+(?P<spotter>[^:\s]+?)(?:-#)?:\s*(?P<frequency>\d+(?:\.\d+)?)\s+(?P<dx>\S+)\s*"
+    r"(?P<comment>.*?)\s+(?:(?P<dx_grid>\S+)\s+)?(?P<time>\d{4})Z(?:\s+(?P<spotter_grid>\S+))?\s*$"
+)
+LOCATOR_REGEX = re.compile(r"^[A-R]{2}[0-9]{2}(?:[A-X]{2})?$", re.IGNORECASE)
+ITU_ZONE_REGEX = re.compile(r"^[0-9]{1,2}$")
+MODE_REGEX = re.compile(r"\b(CW|SSB|USB|LSB|FT8|FT4|RTTY|PSK31|PSK63|JT65|FM|AM)\b", re.IGNORECASE)
+LOGIN_PROMPT_REGEX = re.compile(rb"(login|call)\s*:?\s*$", re.IGNORECASE)
+
+LOGIN_COMMANDS = ["set/dxgrid", "unset/beep"]
+LOGIN_TIMEOUT = 30  # seconds to wait for the login prompt
+PROMPT_BUFFER_SIZE = 4096
+
+
+def locator_or_none(token: str|None) -> str|None:
+    if token and LOCATOR_REGEX.match(token):
+        return token.upper()
+    return None
+
+
+def parse_dx_line(line: str) -> dict|None:
+    match = DX_LINE_REGEX.match(line.strip())
+    if not match:
+        return None
+    comment = match["comment"].strip()
+    dx_grid = match["dx_grid"]
+    if dx_grid and not locator_or_none(dx_grid) and not ITU_ZONE_REGEX.match(dx_grid):
+        # No grid/zone column, the last word belongs to the comment
+        comment = f"{comment} {dx_grid}".strip()
+    return {
+        "spotter_callsign": match["spotter"].upper(),
+        "frequency": float(match["frequency"]),
+        "dx_callsign": match["dx"].upper(),
+        "comment": comment,
+        "dx_locator": locator_or_none(dx_grid),
+        "time": match["time"],
+        "spotter_locator": locator_or_none(match["spotter_grid"]),
+    }
+
+
+def spot_date_time(hhmm: str, now: datetime) -> datetime:
+    # Cluster lines only carry HHMM (UTC); a time ahead of now was spotted before midnight
+    date_time = now.replace(hour=int(hhmm[:2]), minute=int(hhmm[2:]), second=0, microsecond=0)
+    if date_time - now > timedelta(hours=1):
+        date_time -= timedelta(days=1)
+    return date_time
+
+
+def prepare_cluster_record(line: str, source: str, now: datetime|None = None) -> ClusterSpotRecord|None:
+    spot = parse_dx_line(line)
+    if spot is None:
+        return None
+    date_time = spot_date_time(spot["time"], now or datetime.now(timezone.utc))
+    mode_match = MODE_REGEX.search(spot["comment"])
+    return ClusterSpotRecord(
+        source=source,
+        spotter=spot["spotter_callsign"],
+        frequency=spot["frequency"],
+        dx_call=spot["dx_callsign"],
+        time=date_time.time(),
+        date=date_time.date(),
+        date_time=date_time,
+        comment=spot["comment"],
+        band=None,  # from the band plan
+        # Like DXHeat spots without a mode
+        mode=mode_match[1].upper() if mode_match else "SSB",
+        missing_mode=mode_match is None,
+        dx_locator=spot["dx_locator"],
+        spotter_locator=spot["spotter_locator"],
+    )
+
+
+class TelnetClusterSource:
+    """
+    A persistent telnet session with a DX cluster node: login, set/dxgrid, then every "DX de" line
+    is put into the pipeline as it arrives. Reconnects with exponential backoff.
+    """
+
+    def __init__(self, host: str, port: int, callsign: str,
+                 reconnect_min: float = TELNET_RECONNECT_MIN,
+                 reconnect_max: float = TELNET_RECONNECT_MAX,
+                 idle_timeout: float = TELNET_IDLE_TIMEOUT,
+                 debug: bool = False):
+        self.host = host
+        self.port = port
+        self.callsign = callsign
+        self.name = f"{host}:{port}"
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.idle_timeout = idle_timeout
+        self.debug = debug
+        self.connections = 0
+        self.lines = 0
+
+    def parse(self, line: str) -> ClusterSpotRecord|None:
+        return prepare_cluster_record(line, source=self.name)
+
+    async def run(self, pipeline, stop_event: asyncio.Event):
+        backoff = self.reconnect_min
+        while not stop_event.is_set():
+            try:
+                lines = await self.session(pipeline)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                logger.warning(f"Cluster {self.name}: {type(e).__name__} {e}")
+                lines = 0
+            if lines:
+                # The session worked, so this is a fresh disconnect
+                backoff = self.reconnect_min
+            delay = random.uniform(backoff / 2, backoff)
+            logger.info(f"Cluster {self.name}: reconnecting in {delay:.1f} seconds")
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            backoff = min(backoff * 2, self.reconnect_max)
+
+    async def session(self, pipeline) -> int:
+        """One connection; returns the number of spot lines received before it ended."""
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), timeout=TELNET_CONNECT_TIMEOUT
+        )
+        self.connections += 1
+        lines = 0
+        try:
+            await self.login(reader, writer)
+            logger.info(f"Cluster {self.name}: logged in as {self.callsign}")
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=self.idle_timeout)
+                if not line:
+                    logger.warning(f"Cluster {self.name}: connection closed")
+                    return lines
+                line = line.decode(errors="ignore").strip()
+                if self.debug:
+                    logger.debug(f"Cluster {self.name}: {line}")
+                if not line.startswith("DX de"):
+                    continue
+                lines += 1
+                self.lines += 1
+                await pipeline.put(line, parse=self.parse, source=self.name)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def login(self, reader, writer):
+        # The prompt has no newline, so read chunks until it shows up
+        buffer = b""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + LOGIN_TIMEOUT
+        while not LOGIN_PROMPT_REGEX.search(buffer.rstrip()):
+            chunk = await asyncio.wait_for(reader.read(PROMPT_BUFFER_SIZE), timeout=max(deadline - loop.time(), 0))
+            if not chunk:
+                raise asyncio.IncompleteReadError(buffer, None)
+            buffer = (buffer + chunk)[-PROMPT_BUFFER_SIZE:]
+        writer.write(f"{self.callsign}\n".encode())
+        for command in LOGIN_COMMANDS:
+            writer.write(f"{command}\n".encode())
+        await writer.drain()
+
+
+def create_telnet_sources(clusters: list, callsign: str|None, debug: bool = False) -> list:
+    """TelnetClusterSource for each "host:port" in clusters."""
+    if clusters and not callsign:
+        logger.error("TELNET_CLUSTERS is set but TELNET_CALLSIGN isn't, not connecting to telnet clusters")
+        return []
+    sources = []
+    for cluster in clusters:
+        host, _, port = cluster.rpartition(":")
+        sources.append(TelnetClusterSource(host=host, port=int(port), callsign=callsign, debug=debug))
+    return sources
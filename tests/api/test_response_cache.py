@@ -0,0 +1,65 @@
+import gzip
+import json
+import random
+import sys
+import timeit
+from pathlib import Path
+from loguru import logger
+
+grandparent_folder = Path(__file__).parents[2] # 2 directories up
+sys.path.append(f"{grandparent_folder}/src/api")
+sys.path.append(f"{grandparent_folder}/tests/api")
+from spot_window import SpotWindow
+from response_cache import SpotsResponseCache, accepted_encodings, etag_matches
+from test_spot_window import holy_spots_rows, now
+
+
+if __name__ == '__main__':
+    random.seed(1)
+    window = SpotWindow(hours=2)
+    rows = holy_spots_rows(first_id=1, count=1000)
+    window.append(rows)
+    window.evict(now)
+    window.loaded = True
+    cache = SpotsResponseCache(size=8)
+
+    response = cache.response(window, since=now - 3600, last_id=None, accept_encoding="gzip, br;q=0", if_none_match=None)
+    assert response.headers["content-encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.body)) == window.query(since=now - 3600)
+    etag = response.headers["etag"]
+
+    # Same spots, different since: the same entry and ETag
+    same = cache.response(window, since=now - 3600 + 1, last_id=None, accept_encoding=None, if_none_match=None)
+    assert json.loads(same.body) == window.query(since=now - 3600 + 1)
+    assert (same.headers["etag"] == etag) == (window.query(since=now - 3600 + 1) == window.query(since=now - 3600))
+    assert "content-encoding" not in same.headers
+
+    not_modified = cache.response(window, since=now - 3600, last_id=None, accept_encoding="gzip", if_none_match=etag)
+    assert not_modified.status_code == 304 and not not_modified.body
+
+    # New spots change the ETag
+    window.append(holy_spots_rows(first_id=1001, count=1))
+    changed = cache.response(window, since=now - 3600, last_id=None, accept_encoding="gzip", if_none_match=etag)
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+
+    # So do spots changed in place (re-enriched locations)
+    etag = changed.headers["etag"]
+    corrected = list(rows[999])
+    corrected[8:10] = [40.7, -74.0]
+    window.update([tuple(corrected)])
+    updated = cache.response(window, since=now - 3600, last_id=None, accept_encoding=None, if_none_match=etag)
+    assert updated.status_code == 200 and updated.headers["etag"] != etag
+    assert [spot["dx_loc"] for spot in json.loads(updated.body) if spot["id"] == 1000] == [[-74.0, 40.7]]
+
+    empty = cache.response(window, since=now - 3600, last_id=window.last_id, accept_encoding=None, if_none_match=None)
+    assert json.loads(empty.body) == []
+
+    assert accepted_encodings("br;q=1.0, gzip;q=0, identity") == {"br", "identity"}
+    assert etag_matches('"a", W/"b"', 'W/"b"') and not etag_matches('W/"c"', 'W/"b"')
+
+    number = 1000
+    seconds = timeit.timeit(
+        lambda: cache.response(window, since=now - 3600, last_id=None, accept_encoding="gzip", if_none_match=None),
+        number=number,
+    )
+    logger.debug(f"cached /spots response, last hour: {seconds / number * 1e6:.1f} us ({cache.hits} hits, {cache.misses} misses)")
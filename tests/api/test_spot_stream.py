@@ -0,0 +1,93 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+grandparent_folder = Path(__file__).parents[2] # 2 directories up
+sys.path.append(f"{grandparent_folder}/src/api")
+from fastapi import websockets
+from spot_stream import SpotFilter, SpotStream
+
+
+def spot(spot_id: int, band: int, mode: str, dx_continent: str) -> dict:
+    return {"id": spot_id, "band": band, "mode": mode, "dx_continent": dx_continent}
+
+
+spots = [spot(3, 20, "CW", "EU"), spot(2, 40, "FT8", "AS"), spot(1, 20, "SSB", None)]
+
+
+class FakeWebSocket:
+    client = "test"
+
+    def __init__(self):
+        self.sent = []
+        self.incoming = asyncio.Queue()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        self.sent.append(json.loads(message))
+
+    async def receive_json(self):
+        message = await self.incoming.get()
+        if message is None:
+            raise websockets.WebSocketDisconnect()
+        return message
+
+    async def close(self, code: int):
+        pass
+
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+async def main():
+    stream = SpotStream(queue_size=2)
+    everything = stream.subscribe(SpotFilter())
+    cw_on_20 = stream.subscribe(SpotFilter(bands="20", modes="cw"))
+    asia = stream.subscribe(SpotFilter(continents=["as"]))
+    nothing = stream.subscribe(SpotFilter(bands=["6"]))
+
+    stream.publish(spots)
+    assert [s["id"] for s in json.loads(everything.queue.get_nowait())["spots"]] == [3, 2, 1]
+    assert [s["id"] for s in json.loads(cw_on_20.queue.get_nowait())["spots"]] == [3]
+    assert [s["id"] for s in json.loads(asia.queue.get_nowait())["spots"]] == [2]
+    assert nothing.queue.empty()
+
+    stream.publish(spots[:1], "update")
+    assert json.loads(everything.queue.get_nowait()) == {"type": "update", "spots": spots[:1]}
+    cw_on_20.queue.get_nowait()
+
+    # A subscriber that doesn't drain its queue is dropped, the others keep getting spots
+    for _ in range(3):
+        stream.publish(spots)
+        everything.queue.get_nowait()
+    assert asia.slow.is_set() and asia not in stream.subscribers
+    assert everything in stream.subscribers and stream.dropped == 2  # asia and cw_on_20
+
+    # A client connecting before the window's first load gets its snapshot once the load is done
+    stream = SpotStream(queue_size=2)
+    window = []
+    ready = asyncio.Event()
+    websocket = FakeWebSocket()
+    serving = asyncio.create_task(stream.serve(websocket, SpotFilter(), lambda spot_filter: spot_filter.apply(window), ready=ready))
+    await settle()
+    assert not websocket.sent and not stream.subscribers
+    window.extend(spots)
+    ready.set()
+    await settle()
+    assert websocket.sent == [{"type": "snapshot", "spots": spots}]
+    # ... then the spots published after it
+    stream.publish([spot(4, 20, "CW", "EU")])
+    await settle()
+    assert websocket.sent[-1] == {"type": "spots", "spots": [spot(4, 20, "CW", "EU")]}
+    websocket.incoming.put_nowait(None)
+    await serving
+    assert not stream.subscribers
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
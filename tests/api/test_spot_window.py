@@ -0,0 +1,83 @@
+import random
+import sys
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+from loguru import logger
+
+grandparent_folder = Path(__file__).parents[2] # 2 directories up
+sys.path.append(f"{grandparent_folder}/src/api")
+from spot_window import SpotWindow
+
+now = 1_747_580_000
+calls = ["4X5BR", "DL1ABC", "W1AW", "JA1XYZ", "G4ABC", "EA8ABC", "VK2AA", "ZS6NOP", "LU1EFG", "R1FJ"]
+
+
+def holy_spots_rows(first_id: int, count: int) -> list:
+    # Spots are stored a little out of time order, like the collector writes them
+    rows = []
+    for spot_id in range(first_id, first_id + count):
+        spot_time = now - 3 * 3600 + (spot_id - first_id) * 10 + random.randint(-300, 0)
+        rows.append((
+            spot_id, datetime.fromtimestamp(spot_time, tz=timezone.utc),
+            random.choice(calls), 32.1, 34.8, "Israel", "AS",
+            random.choice(calls), None if spot_id % 7 == 0 else 51.5, -0.1, "England", "EU",
+            14074.0, None if spot_id % 11 == 0 else 20, random.choice(["CW", "SSB", "FT8"]), f"comment {spot_id}",
+        ))
+    return rows
+
+
+def reference_query(rows: list, since: int, last_id: int|None) -> list:
+    return [
+        row[0] for row in sorted(rows, key=lambda row: row[0], reverse=True)
+        if row[1].timestamp() > since and (last_id is None or row[0] > last_id)
+    ]
+
+
+if __name__ == '__main__':
+    random.seed(1)
+    rows = holy_spots_rows(first_id=1, count=1000)
+    window = SpotWindow(hours=2)
+    window.append(rows[:600])
+    window.append(rows[500:])  # overlapping refresh: ids already held are skipped
+    assert len(window) == 1000
+    window.evict(now)
+    window.loaded = True
+    kept = [row for row in rows if row[1].timestamp() > window.start]
+    assert len(window) <= 1000 and window.ids[0] <= kept[0][0]
+
+    for since, last_id in [(now - 3600, None), (now - 7200, None), (now - 600, 900), (now - 3600, 999), (now, None)]:
+        assert window.covers(since)
+        assert [spot["id"] for spot in window.query(since=since, last_id=last_id)] == reference_query(rows, since, last_id)
+    assert not window.covers(now - 3 * 3600)
+
+    spot = window.query(since=now - 3600)[0]
+    row = rows[spot["id"] - 1]
+    assert spot["dx_callsign"] == row[7] and spot["mode"] == row[14] and spot["time"] == int(row[1].timestamp())
+    assert [spot["dx_loc"][1] for spot in window.query(since=now - 3600) if spot["id"] % 7 == 0] == [None] * sum(
+        1 for spot in window.query(since=now - 3600) if spot["id"] % 7 == 0)
+    assert all(spot["band"] is None for spot in window.query(since=now - 3600) if spot["id"] % 11 == 0)
+
+    # Re-enriched rows are replaced in place (time kept), rows no longer in the window are ignored
+    version = window.version
+    first_id = window.ids[0]
+    corrected = list(rows[first_id + 9])
+    corrected[8:10] = [40.7, -74.0]
+    indexes = window.update([tuple(corrected), rows[0]])
+    assert indexes == [10] and window.version == version + 1
+    spot = window.spots(indexes)[0]
+    assert spot["id"] == first_id + 10 and spot["dx_loc"] == [-74.0, 40.7]
+    assert window.update([rows[0]]) == [] and window.version == version + 1
+
+    # Dictionaries are rebuilt once they are mostly strings no longer in the window
+    window.dictionaries["spotter_callsign"].values.extend(f"OLD{number}" for number in range(5000))
+    expected = window.query(since=now - 3600)
+    window.evict(now)
+    assert len(window.dictionaries["spotter_callsign"]) <= len(calls) + 1
+    assert window.query(since=now - 3600) == expected
+
+    number = 200
+    seconds = timeit.timeit(lambda: window.query(since=now - 3600, last_id=window.last_id - 20), number=number)
+    logger.debug(f"SpotWindow.query, 20 new spots: {seconds / number * 1e6:.1f} us")
+    seconds = timeit.timeit(lambda: window.query(since=now - 3600), number=20)
+    logger.debug(f"SpotWindow.query, last hour: {seconds / 20 * 1e3:.2f} ms")
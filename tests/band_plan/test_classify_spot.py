@@ -0,0 +1,64 @@
+import re
+import sys
+import random
+import timeit
+from pathlib import Path
+from loguru import logger
+
+grandparent_folder = Path(__file__).parents[2] # 2 directories up
+sys.path.append(f"{grandparent_folder}")
+from src.band_plan import BAND_PLAN, classify_spot, classify_with_table
+
+FT8_HF_FREQUENCIES = [(segment.lower, segment.upper) for segment in BAND_PLAN if segment.mode == "FT8"]
+FT4_HF_FREQUENCIES = [(segment.lower, segment.upper) for segment in BAND_PLAN if segment.mode == "FT4"]
+
+
+def is_value_in_range(value, range):
+    try:
+        value = float(value)
+        for lower, upper in range:
+            if lower <= value <= upper:
+                return True
+    except ValueError:
+        return False
+    return False
+
+
+def classify_spot_linear(frequency, comment, mode):
+    # The original implementation from prepare_holy_spot
+    if is_value_in_range(frequency, FT8_HF_FREQUENCIES) or re.search("FT8", comment.upper()):
+        mode = "FT8"
+    elif is_value_in_range(frequency, FT4_HF_FREQUENCIES) or re.search("FT4", comment.upper()):
+        mode = "FT4"
+    return mode
+
+
+comments = ["", "CQ", "FT8 -12dB", "ft4 +3", "TNX QSO", "FT4 then FT8"]
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    bounds = [bound for segment in BAND_PLAN for bound in (segment.lower, segment.upper)]
+    frequencies = [str(bound + offset) for bound in bounds for offset in (-0.1, 0, 0.1)]
+    frequencies += [str(round(random.uniform(1700, 150000), 1)) for _ in range(5000)]
+    frequencies += ["", "abc"]
+    spots = [(frequency, random.choice(comments), random.choice(["CW", "SSB", "DIGI"])) for frequency in frequencies]
+
+    for frequency, comment, mode in spots:
+        band, classified_mode = classify_spot(frequency, comment, mode)
+        assert classified_mode == classify_spot_linear(frequency, comment, mode), (frequency, comment)
+        try:
+            assert band == classify_with_table(float(frequency), BAND_PLAN)[0], frequency
+        except ValueError:
+            assert band is None
+
+    assert classify_spot("7048.0", "", "DIGI") == (40, "FT4")
+    # 70475.0 used to be listed as 40m FT4, which tagged 4m spots as FT4
+    assert classify_spot("70476.0", "", "DIGI") == (4, "DIGI")
+
+    number = 20
+    linear = timeit.timeit(lambda: [classify_spot_linear(*spot) for spot in spots], number=number)
+    indexed = timeit.timeit(lambda: [classify_spot(*spot) for spot in spots], number=number)
+    lookups = number * len(spots)
+    logger.debug(f"linear scan:    {linear / lookups * 1e6:6.2f} us per spot (mode only)")
+    logger.debug(f"interval index: {indexed / lookups * 1e6:6.2f} us per spot (band and mode)")
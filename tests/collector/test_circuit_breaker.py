@@ -0,0 +1,93 @@
+import asyncio
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+grandparent_folder = Path(__file__).parents[2] # 2 directories up
+sys.path.append(f"{grandparent_folder}/src")
+import circuit_breaker
+import qrz_resolver
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+from qrz_resolver import QrzResolver, CIRCUIT_OPEN_ERROR
+from run_collector import reenrich_deferred_callsigns
+from spots_collector import enrich_spot
+from telnet_source import prepare_cluster_record
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def failing_lookup(qrz_session_key, callsign, client=None, debug=False):
+    raise ConnectionError("qrz.com is down")
+
+
+async def main():
+    # qrz.com keeps failing: after QRZ_BREAKER_FAILURES requests, lookups are refused without a request
+    qrz_resolver.get_locator_from_qrz = failing_lookup
+    resolver = QrzResolver(qrz_session_key="key")
+    threshold = resolver.circuit_breaker.failure_threshold
+    for number in range(threshold):
+        result = await resolver.get_locator(f"DL{number}ABC")
+        assert result["error"] == "Exception: qrz.com is down"
+    assert resolver.circuit_breaker.state == OPEN
+    result = await resolver.get_locator("G4ABC")
+    assert result == {"locator": None, "error": CIRCUIT_OPEN_ERROR}
+    assert resolver.requests == threshold
+    # Refusals are not remembered: neither negative cache nor answer memo
+    assert "G4ABC" not in resolver.negative_cache and "G4ABC" not in resolver.results
+
+    # Spots enriched meanwhile get prefix based locations that aren't cached, their callsigns are deferred ...
+    now = datetime(2025, 5, 18, 14, 50, tzinfo=timezone.utc)
+    record = prepare_cluster_record("DX de SP3OCC:     3702.0  SP100IARU    95th PZK          28 1442Z", source="test", now=now)
+    holy_spot, geo_cache_spotter, geo_cache_dx = await enrich_spot(record, qrz_resolver=resolver, geo_cache={})
+    assert holy_spot.spotter_locator and geo_cache_spotter is None and geo_cache_dx is None
+    assert resolver.deferred == {"SP3OCC", "SP100IARU"} and resolver.requests == threshold
+    # ... and stay deferred while the circuit is open, until qrz.com can be asked again
+    assert await reenrich_deferred_callsigns(Session=None, qrz_resolver=resolver) == []
+    assert resolver.deferred == {"SP3OCC", "SP100IARU"}
+
+
+if __name__ == '__main__':
+    clock = FakeClock()
+    circuit_breaker.monotonic = clock
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+
+    # Closed: failures below the threshold, and a success resets the count
+    assert breaker.allow_request()
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow_request()
+
+    # Open after threshold consecutive failures: refused until reset_timeout has passed
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow_request()
+    clock.now += 59
+    assert not breaker.allow_request()
+
+    # Half-open: exactly one trial goes through
+    clock.now += 1
+    assert breaker.allow_request() and breaker.state == HALF_OPEN
+    assert not breaker.allow_request()
+
+    # A failed trial opens it again, for another reset_timeout
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow_request()
+    clock.now += 30
+    assert not breaker.allow_request()
+    clock.now += 30
+    assert breaker.allow_request() and not breaker.allow_request()
+
+    # A successful trial closes it
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.failures == 0
+    assert breaker.allow_request() and breaker.allow_request()
+
+    asyncio.run(main())
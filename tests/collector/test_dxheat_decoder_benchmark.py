@@ -0,0 +1,107 @@
+import json
+import random
+import sys
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+from loguru import logger
+
+grandparent_folder = Path(__file__).parents[2] # 2 directories up
+sys.path.append(f"{grandparent_folder}/src")
+from records import DxheatRecord
+from dxheat_decoder import decode_dxheat_payload, parse_dxheat_time, parse_dxheat_date, parse_lotw_date
+
+# Usage: python test_dxheat_decoder_benchmark.py [payload.json ...]
+# Recorded DXHeat responses (the raw body of https://dxheat.com/source/spots/?a=50&b=20...) can be
+# given on the command line; without them a payload shaped like one is generated.
+
+
+def prepare_dxheat_record_strptime(spot):
+    # The previous implementation: json.loads, a copy of every spot, strptime per field
+    spot = dict(spot)
+    time = datetime.strptime(spot['Time'], '%H:%M').time()
+    date = datetime.strptime(spot['Date'], '%d/%m/%y').date()
+    missing_mode = False
+    if "Mode" not in spot:
+        spot["Mode"] = "SSB"
+        missing_mode = True
+    if not 'DXLocator' in spot:
+        spot['DXLocator'] = None
+    return DxheatRecord(
+        number=spot['Nr'],
+        spotter=spot['Spotter'],
+        frequency=spot['Frequency'],
+        dx_call=spot['DXCall'],
+        time=time,
+        date=date,
+        date_time=datetime.combine(date, time, tzinfo=timezone.utc),
+        beacon=spot['Beacon'],
+        mm=spot['MM'],
+        am=spot['AM'],
+        valid=spot['Valid'],
+        lotw=spot['LOTW'] if 'LOTW' in spot else None,
+        lotw_date=datetime.strptime(spot['LOTW_Date'], '%m/%d/%Y').date() if 'LOTW_Date' in spot else None,
+        esql=spot['EQSL'] if 'EQSL' in spot else None,
+        dx_homecall=spot['DXHomecall'],
+        comment=spot['Comment'],
+        flag=spot.get('Flag'),
+        band=str(spot['Band']),
+        mode=spot['Mode'],
+        missing_mode=missing_mode,
+        continent_dx=spot.get('Continent_dx'),
+        continent_spotter=spot['Continent_spotter'],
+        dx_locator=spot['DXLocator'],
+    )
+
+
+def decode_strptime(content: bytes) -> list:
+    spots = []
+    for spot in json.loads(content):
+        spots.append(spot)
+    return [prepare_dxheat_record_strptime(spot) for spot in spots]
+
+
+def generated_payload(spots: int = 50) -> bytes:
+    random.seed(1)
+    calls = ["4X5BR", "DL1ABC", "W1AW", "JA1XYZ", "G4ABC", "EA8ABC", "VK2AA", "ZS6NOP", "LU1EFG", "R1FJ"]
+    payload = []
+    for number in range(spots):
+        spot = {
+            "Nr": 63474769 + number, "Spotter": random.choice(calls), "Frequency": f"{14000 + random.random() * 350:.1f}",
+            "DXCall": random.choice(calls), "Time": f"14:{40 + number // 20:02}", "Date": "18/05/25",
+            "Beacon": False, "MM": False, "AM": False, "Valid": True, "DXHomecall": random.choice(calls),
+            "Comment": random.choice(["CQ", "FT8 -12dB", "tnx QSO", ""]), "Flag": "de", "Band": 20,
+            "Continent_dx": "EU", "Continent_spotter": "EU",
+        }
+        if number % 4:
+            spot["Mode"] = random.choice(["CW", "SSB", "DIGI"])
+        if number % 3 == 0:
+            spot["DXLocator"] = "JN58"
+        if number % 2:
+            spot["LOTW"] = True
+            spot["LOTW_Date"] = "05/12/2025"
+        payload.append(spot)
+    return json.dumps(payload).encode()
+
+
+if __name__ == '__main__':
+    payloads = [Path(filename).read_bytes() for filename in sys.argv[1:]] or [generated_payload()]
+
+    for content in payloads:
+        assert decode_dxheat_payload(content) == decode_strptime(content)
+
+    # Schema failures are skipped, not raised
+    bad = json.dumps([{"Nr": "x"}, json.loads(payloads[0])[0]]).encode()
+    assert len(decode_dxheat_payload(bad)) == 1
+    assert parse_dxheat_time("09:05").minute == 5
+    assert parse_dxheat_date("01/02/26").isoformat() == "2026-02-01"
+    assert parse_lotw_date("02/01/2026").isoformat() == "2026-02-01"
+
+    number = 200
+    spots = number * sum(len(json.loads(content)) for content in payloads)
+    strptime = timeit.timeit(lambda: [decode_strptime(content) for content in payloads], number=number)
+    for parser in (parse_dxheat_time, parse_dxheat_date, parse_lotw_date):
+        parser.cache_clear()
+    decoder = timeit.timeit(lambda: [decode_dxheat_payload(content) for content in payloads], number=number)
+    logger.debug(f"json + strptime:  {strptime / spots * 1e6:8.2f} us per spot")
+    logger.debug(f"dxheat_decoder:   {decoder / spots * 1e6:8.2f} us per spot")
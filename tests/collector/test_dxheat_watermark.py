@@ -0,0 +1,45 @@
+import sys
+from types import SimpleNamespace
+from pathlib import Path
+
+grandparent_folder = Path(__file__).parents[2] # 2 directories up
+sys.path.append(f"{grandparent_folder}/src")
+from dxheat_watermark import DxheatWatermarks
+
+
+def poll(spots, limit):
+    # DXHeat returns the newest `limit` spots of the band, newest first
+    return [SimpleNamespace(number=nr) for nr in reversed(spots[-limit:])]
+
+
+if __name__ == '__main__':
+    watermarks = DxheatWatermarks(initial_limit=30, min_limit=5, max_limit=50, headroom=2)
+    band_spots = list(range(1000, 1040))
+
+    first = watermarks.new_spots(20, poll(band_spots, watermarks.limit(20)))
+    assert len(first) == 30 and watermarks.limit(20) == 30
+
+    # Nothing new: nothing passes, and the limit goes down to the minimum
+    assert watermarks.new_spots(20, poll(band_spots, watermarks.limit(20))) == []
+    assert watermarks.limit(20) == 5
+
+    # Only the 3 spots above the mark pass
+    band_spots += [1040, 1041, 1042]
+    new = watermarks.new_spots(20, poll(band_spots, watermarks.limit(20)))
+    assert [spot.number for spot in new] == [1042, 1041, 1040]
+    assert watermarks.band(20).last_nr == 1042
+
+    # A burst bigger than the limit: every spot is new, so the next poll uses the maximum
+    band_spots += list(range(1043, 1070))
+    new = watermarks.new_spots(20, poll(band_spots, watermarks.limit(20)))
+    assert len(new) == 5 and watermarks.limit(20) == 50
+    assert watermarks.band(20).saturated == 1
+
+    # The next poll reaches back to the mark: the missed spots pass, the ones already put don't
+    new = watermarks.new_spots(20, poll(band_spots, watermarks.limit(20)))
+    assert sorted(spot.number for spot in new) == list(range(1043, 1065))
+    assert watermarks.band(20).last_nr == 1069 and not watermarks.band(20).passed
+
+    # A dead band goes down to the minimum
+    assert watermarks.new_spots(160, []) == []
+    assert watermarks.limit(160) == 5
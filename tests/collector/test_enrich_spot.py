@@ -0,0 +1,126 @@
+import asyncio
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+grandparent_folder = Path(__file__).parents[2] # 2 directories up
+sys.path.append(f"{grandparent_folder}/src")
+import qrz_resolver
+import spots_collector
+from db_classes import HolySpot
+from location import locator_to_coordinates, resolve_callsign
+from qrz_resolver import QrzResolver
+from run_collector import reenrich_deferred_callsigns
+from spots_collector import enrich_spot
+from telnet_source import prepare_cluster_record
+
+now = datetime(2025, 5, 18, 14, 50, tzinfo=timezone.utc)
+
+
+class FakeResolver:
+    """Answers every callsign with one grid and remembers what it was asked."""
+
+    def __init__(self, locator: str = "KM72JB"):
+        self.locator = locator
+        self.lookups = []
+        self.deferred = set()
+
+    async def get_locator(self, callsign: str, debug: bool = False) -> dict:
+        self.lookups.append(callsign)
+        return {"locator": self.locator}
+
+    def defer(self, callsign: str):
+        self.deferred.add(callsign)
+
+
+class HangingResolver(FakeResolver):
+    """qrz.com never answers."""
+
+    async def get_locator(self, callsign: str, debug: bool = False) -> dict:
+        self.lookups.append(callsign)
+        await asyncio.Event().wait()
+
+
+async def failing_lookup(qrz_session_key, callsign, client=None, debug=False):
+    raise ConnectionError("qrz.com is down")
+
+
+async def not_found_lookup(qrz_session_key, callsign, client=None, debug=False):
+    return {"locator": None, "error": f"Not found: {callsign}"}
+
+
+async def main():
+    # The cluster sends the spotter's grid: used and cached without asking qrz.com
+    record = prepare_cluster_record("DX de SP3OCC:     3702.0  SP100IARU    95th PZK          28 1442Z JO92", source="test", now=now)
+    resolver = FakeResolver()
+    holy_spot, geo_cache_spotter, geo_cache_dx = await enrich_spot(record, qrz_resolver=resolver, geo_cache={})
+    assert resolver.lookups == ["SP100IARU"]
+    assert holy_spot.spotter_locator == "JO92"
+    assert (holy_spot.spotter_lat, holy_spot.spotter_lon) == locator_to_coordinates("JO92")
+    assert geo_cache_spotter.callsign == "SP3OCC" and geo_cache_spotter.locator == "JO92"
+    assert geo_cache_dx.locator == "KM72JB"
+
+    # geo_cache still comes first
+    geo_cache = {"SP3OCC": {"locator": "JO82", "lat": 52.5, "lon": 17.0, "country": "Poland", "continent": "EU"}}
+    resolver = FakeResolver()
+    holy_spot, geo_cache_spotter, _ = await enrich_spot(record, qrz_resolver=resolver, geo_cache=geo_cache)
+    assert holy_spot.spotter_locator == "JO82" and geo_cache_spotter is None
+
+    # Without a grid the spotter is looked up
+    record = prepare_cluster_record("DX de SP3OCC:     3702.0  SP100IARU    95th PZK          28 1442Z", source="test", now=now)
+    resolver = FakeResolver()
+    holy_spot, _, _ = await enrich_spot(record, qrz_resolver=resolver, geo_cache={})
+    assert sorted(resolver.lookups) == ["SP100IARU", "SP3OCC"] and holy_spot.spotter_locator == "KM72JB"
+
+    # Deadline: the spot is stored with prefix based locations, the callsigns wait for re-enrichment
+    # and are not cached; a dx grid from the spot isn't deferred
+    spots_collector.ENRICHMENT_DEADLINE = 0.05
+    resolver = HangingResolver()
+    holy_spot, geo_cache_spotter, geo_cache_dx = await enrich_spot(record, qrz_resolver=resolver, geo_cache={})
+    assert resolver.lookups and resolver.deferred == {"SP3OCC", "SP100IARU"}
+    assert holy_spot.spotter_locator == resolve_callsign("SP3OCC")[0]
+    assert holy_spot.dx_locator == resolve_callsign("SP100IARU")[0]
+    assert geo_cache_spotter is None and geo_cache_dx is None
+
+    with_dx_grid = prepare_cluster_record("DX de DJ5LA:     24891.0  VP2VI        QSX 24892.30  CW    FK78 1442Z", source="test", now=now)
+    resolver = HangingResolver()
+    holy_spot, geo_cache_spotter, geo_cache_dx = await enrich_spot(with_dx_grid, qrz_resolver=resolver, geo_cache={})
+    assert resolver.deferred == {"DJ5LA"} and holy_spot.dx_locator == "FK78" and geo_cache_dx.locator == "FK78"
+
+    # qrz.com failing (not hanging): prefix based locations right away, not cached, callsigns deferred
+    qrz_resolver.get_locator_from_qrz = failing_lookup
+    resolver = QrzResolver(qrz_session_key="key")
+    holy_spot, geo_cache_spotter, geo_cache_dx = await enrich_spot(record, qrz_resolver=resolver, geo_cache={})
+    assert holy_spot.spotter_locator == resolve_callsign("SP3OCC")[0]
+    assert resolver.deferred == {"SP3OCC", "SP100IARU"} and geo_cache_spotter is None and geo_cache_dx is None
+
+    # qrz.com has no grid: the prefix based location is final and cached
+    qrz_resolver.get_locator_from_qrz = not_found_lookup
+    resolver = QrzResolver(qrz_session_key="key")
+    holy_spot, geo_cache_spotter, geo_cache_dx = await enrich_spot(record, qrz_resolver=resolver, geo_cache={})
+    assert not resolver.deferred and geo_cache_spotter.locator == resolve_callsign("SP3OCC")[0]
+    assert geo_cache_dx.locator == holy_spot.dx_locator == resolve_callsign("SP100IARU")[0]
+
+    # Entities prefixes_list.csv doesn't know get their country from the DXCC list, spotter and dx alike,
+    # also when re-enriched
+    assert resolve_callsign("HT0ABC")[1] is None
+    record = prepare_cluster_record("DX de HT0ABC:     14074.0  HT0XYZ       FT8 -12 dB                1443Z", source="test", now=now)
+    holy_spot, geo_cache_spotter, geo_cache_dx = await enrich_spot(record, qrz_resolver=FakeResolver(), geo_cache={})
+    assert holy_spot.spotter_country == holy_spot.dx_country == "Nicaragua"
+    assert geo_cache_spotter.country == geo_cache_dx.country == "Nicaragua"
+    # One connection for the test and the worker thread that updates holy_spots
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    HolySpot.__table__.create(bind=engine)
+    resolver = FakeResolver()
+    resolver.take_deferred = lambda: {"HT0ABC"}
+    geo_cache_records = await reenrich_deferred_callsigns(sessionmaker(bind=engine), qrz_resolver=resolver)
+    assert [(record.callsign, record.country, record.continent) for record in geo_cache_records] == [
+        ("HT0ABC", geo_cache_spotter.country, geo_cache_spotter.continent)
+    ]
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,48 @@
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+grandparent_folder = Path(__file__).parents[2] # 2 directories up
+sys.path.append(f"{grandparent_folder}/src")
+from db_classes import GeoCache
+from geo_cache_store import GeoCacheStore
+from records import GeoCacheRecord
+from settings import GEO_CACHE_TOUCH_INTERVAL
+
+
+def geo_cache_record(callsign: str, locator: str, date_time: datetime) -> GeoCacheRecord:
+    return GeoCacheRecord(callsign=callsign, locator=locator, lat=52.5, lon=17.0, country="Poland", continent="EU",
+                          date=date_time.date(), time=date_time.time(), date_time=date_time)
+
+
+if __name__ == '__main__':
+    # Spots carry tz-aware UTC times; entries and dirty rows hold naive UTC, like the column
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    naive_now = now.replace(tzinfo=None)
+    store = GeoCacheStore()
+    store.stage([geo_cache_record("SP3OCC", "JO82", now), geo_cache_record("DJ5LA", "JO44", now - timedelta(hours=2))])
+    assert store.entries["SP3OCC"]["date_time"] == naive_now and store.high_water_mark == naive_now
+    records = store.take_dirty()
+    assert all(record["date_time"].tzinfo is None for record in records)
+    assert {record["callsign"]: record["date_time"] for record in records}["SP3OCC"] == naive_now
+
+    # Seen again later: touched, still naive
+    later = now + timedelta(seconds=GEO_CACHE_TOUCH_INTERVAL)
+    store.stage([geo_cache_record("DJ5LA", "JO44", later)])
+    touched = store.take_dirty()
+    assert len(touched) == 1 and touched[0]["date_time"] == later.replace(tzinfo=None)
+
+    # Written and read back by another process: same times, same high-water mark
+    engine = create_engine("sqlite://")
+    GeoCache.__table__.create(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        session.add_all(GeoCache(**record) for record in [records[0], touched[0]])
+        session.commit()
+    restarted = GeoCacheStore()
+    with Session() as session:
+        assert restarted.refresh(session=session) == 2
+    assert restarted.high_water_mark == later.replace(tzinfo=None)
+    assert restarted.entries == store.entries
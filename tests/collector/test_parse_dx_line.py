@@ -1,5 +1,10 @@
 import json
-from test_telnet import parse_dx_line
+import sys
+from pathlib import Path
+
+grandparent_folder = Path(__file__).parents[2] # 2 directories up
+sys.path.append(f"{grandparent_folder}/src")
+from telnet_source import parse_dx_line
 
 
 lines = [
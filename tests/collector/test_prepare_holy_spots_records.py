@@ -7,10 +7,11 @@ from loguru import logger
 import asyncio
 
 import settings
-from db_classes import DxheatRaw, HolySpot, GeoCache, SpotWithIssue
+from records import DxheatRecord
 from spots_collector import get_dxheat_spots, prepare_dxheat_record, prepare_holy_spot
 from run_collector import prepare_holy_spots_records 
 from qrz import get_qrz_session_key
+from qrz_resolver import QrzResolver
 from misc import string_to_boolean, open_log_file
 
 from settings import (
@@ -27,18 +28,18 @@ async def main(debug=False):
     if debug:
         logger.debug(f"{qrz_session_key=}")
 
-    record = DxheatRaw(
-        number='63474769',
+    record = DxheatRecord(
+        number=63474769,
         spotter='IW3GTZ',
         frequency='14180.0',
         dx_call='IZ3WUW/P',
         time=time(15,57,00),
         date=date(2025,5,18),
         date_time=datetime(2025, 5, 18, 15, 57, 0),
-        beacon='f',
-        mm='f',
-        am='f',
-        valid='t',
+        beacon=False,
+        mm=False,
+        am=False,
+        valid=True,
         lotw=None,
         lotw_date=None,
         esql=None,
@@ -47,7 +48,7 @@ async def main(debug=False):
         flag='it',
         band='20.0',
         mode='USB',
-        missing_mode='f',
+        missing_mode=False,
         continent_dx='EU',
         continent_spotter='EU',
         dx_locator='JN61GV'
@@ -61,7 +62,7 @@ async def main(debug=False):
     ]
 
     holy_spots_records, geo_cache_spotter_records, geo_cache_dx_records = await prepare_holy_spots_records(holy_spots_list=holy_spots_list, 
-                                                            qrz_session_key=qrz_session_key,
+                                                            qrz_resolver=QrzResolver(qrz_session_key=qrz_session_key),
                                                             geo_cache=geo_cache,
                                                             debug=debug)
 
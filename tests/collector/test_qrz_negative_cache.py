@@ -0,0 +1,93 @@
+import asyncio
+import sys
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+grandparent_folder = Path(__file__).parents[2] # 2 directories up
+sys.path.append(f"{grandparent_folder}/src")
+import qrz_resolver
+from db_classes import QrzNegativeCache
+from qrz_resolver import QrzResolver, utc_now
+from run_collector import CollectorState
+from settings import QRZ_NEGATIVE_TTL_PERMANENT, QRZ_NEGATIVE_TTL_TRANSIENT
+
+
+class FakeQrz:
+    """get_locator_from_qrz replacement answering from a dict, counting requests."""
+
+    def __init__(self, answers: dict):
+        self.answers = answers
+        self.callsigns = []
+
+    async def __call__(self, qrz_session_key, callsign, client=None, debug=False) -> dict:
+        self.callsigns.append(callsign)
+        return self.answers[callsign]
+
+
+def close_to(value, expected) -> bool:
+    return abs((value - expected).total_seconds()) < 5
+
+
+async def main():
+    fake = FakeQrz({
+        "SP3OCC": {"locator": None, "error": "Not found: SP3OCC"},
+        "DJ5LA": {"locator": None, "error": "no user supplied grid"},
+        "VP2VI": {"locator": None, "error": "qrz response code 503"},
+        "OH6BG": {"locator": "KP32"},
+    })
+    qrz_resolver.get_locator_from_qrz = fake
+    resolver = QrzResolver(qrz_session_key="key")
+    for callsign in fake.answers:
+        await resolver.get_locator(callsign)
+
+    # TTL: qrz.com knowing no grid is permanent, everything else transient; answers aren't cached
+    now = utc_now()
+    cache = resolver.negative_cache
+    assert set(cache) == {"SP3OCC", "DJ5LA", "VP2VI"}
+    assert cache["SP3OCC"]["permanent"] and cache["DJ5LA"]["permanent"] and not cache["VP2VI"]["permanent"]
+    assert close_to(cache["SP3OCC"]["expires"], now + timedelta(seconds=QRZ_NEGATIVE_TTL_PERMANENT))
+    assert close_to(cache["VP2VI"]["expires"], now + timedelta(seconds=QRZ_NEGATIVE_TTL_TRANSIENT))
+    # Naive UTC, like the timestamp without time zone columns
+    assert all(entry["expires"].tzinfo is None and entry["date_time"].tzinfo is None for entry in cache.values())
+
+    # Hits don't ask qrz.com; the transient error isn't kept in the answer memo either
+    del resolver.results["SP3OCC"]
+    assert await resolver.get_locator("SP3OCC") == {"locator": None, "error": "Not found: SP3OCC"}
+    assert await resolver.get_locator("VP2VI") == {"locator": None, "error": "qrz response code 503"}
+    assert resolver.negative_hits == 2 and len(fake.callsigns) == 4
+
+    # Expired entries are dropped and the callsign is asked again
+    cache["VP2VI"]["expires"] = utc_now() - timedelta(seconds=1)
+    fake.answers["VP2VI"] = {"locator": "FK78"}
+    assert await resolver.get_locator("VP2VI") == {"locator": "FK78"}
+    assert "VP2VI" not in cache and fake.callsigns[-1] == "VP2VI"
+
+    # Persist and load: the dirty entries written to the table come back in a new process
+    records = resolver.take_dirty_negative_cache()
+    assert {record["callsign"] for record in records} == {"SP3OCC", "DJ5LA", "VP2VI"}
+    assert resolver.take_dirty_negative_cache() == []
+    engine = create_engine("sqlite://")
+    QrzNegativeCache.__table__.create(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        session.add_all(QrzNegativeCache(**record) for record in records if record["callsign"] != "VP2VI")
+        session.add(QrzNegativeCache(callsign="G4ABC", error="qrz response code 503", permanent=False,
+                                     expires=utc_now() - timedelta(seconds=1), date_time=utc_now()))
+        session.commit()
+
+    fake = FakeQrz({})
+    qrz_resolver.get_locator_from_qrz = fake
+    restarted = QrzResolver(qrz_session_key="key")
+    with Session() as session:
+        CollectorState.load_negative_cache(SimpleNamespace(qrz_resolver=restarted), session=session)
+    assert set(restarted.negative_cache) == {"SP3OCC", "DJ5LA"}
+    assert restarted.negative_cache["SP3OCC"] == cache["SP3OCC"]
+    assert await restarted.get_locator("DJ5LA") == {"locator": None, "error": "no user supplied grid"}
+    assert not fake.callsigns and not restarted.take_dirty_negative_cache()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+import asyncio
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+grandparent_folder = Path(__file__).parents[2] # 2 directories up
+sys.path.append(f"{grandparent_folder}/src")
+import qrz_resolver
+import run_collector
+from location import resolve_callsign
+from qrz_resolver import QrzResolver
+from run_collector import CollectorState
+from spots_collector import enrich_spot
+from telnet_source import prepare_cluster_record
+
+now = datetime(2025, 5, 18, 14, 50, tzinfo=timezone.utc)
+
+
+class FakeQrz:
+    """get_locator_from_qrz replacement: holds every request until released, counts them."""
+
+    def __init__(self, result: dict|None = None, error: Exception|None = None):
+        self.result = result
+        self.error = error
+        self.callsigns = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, qrz_session_key, callsign, client=None, debug=False) -> dict:
+        self.callsigns.append(callsign)
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+async def lookup_all(resolver: QrzResolver, fake: FakeQrz, callsigns: list) -> list:
+    qrz_resolver.get_locator_from_qrz = fake
+    tasks = [asyncio.create_task(resolver.get_locator(callsign)) for callsign in callsigns]
+    await asyncio.sleep(0.01)
+    fake.release.set()
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def main():
+    # N concurrent misses for one callsign (/P and /M included): one request, every caller gets the answer
+    resolver = QrzResolver(qrz_session_key="key")
+    fake = FakeQrz(result={"locator": "JN61GV"})
+    results = await lookup_all(resolver, fake, ["IZ3WUW"] * 8 + ["IZ3WUW/P", "iz3wuw/m"])
+    assert fake.callsigns == ["IZ3WUW"] and resolver.requests == 1 and resolver.coalesced == 9
+    assert results == [{"locator": "JN61GV"}] * 10
+    assert not resolver.in_flight
+    # ... and later lookups are answered from the memo
+    assert await resolver.get_locator("IZ3WUW/P") == {"locator": "JN61GV"} and resolver.requests == 1
+
+    # A failing request: every waiter gets the error, the memo doesn't keep it
+    resolver = QrzResolver(qrz_session_key="key")
+    fake = FakeQrz(error=ConnectionError("qrz.com is down"))
+    results = await lookup_all(resolver, fake, ["SP3OCC"] * 5)
+    assert len(fake.callsigns) == 1
+    assert results == [{"locator": None, "error": "Exception: qrz.com is down"}] * 5
+    assert "SP3OCC" not in resolver.results and "SP3OCC" in resolver.negative_cache
+    # Once the negative cache entry has gone the callsign is asked again
+    del resolver.negative_cache["SP3OCC"]
+    fake = FakeQrz(result={"locator": "JO92"})
+    results = await lookup_all(resolver, fake, ["SP3OCC"] * 3)
+    assert fake.callsigns == ["SP3OCC"] and results == [{"locator": "JO92"}] * 3
+
+    # An exception raised by the shared lookup itself reaches every waiter and leaves nothing behind
+    resolver = QrzResolver(qrz_session_key="key")
+    fake = FakeQrz(result={"locator": "JO92"})
+
+    async def broken_acquire():
+        await fake.release.wait()
+        raise RuntimeError("broken rate limiter")
+
+    resolver.rate_limiter.acquire = broken_acquire
+    results = await lookup_all(resolver, fake, ["SP3OCC"] * 4)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert not resolver.in_flight and not resolver.results and not resolver.negative_cache
+
+    # qrz.com ends the session early: the key is dropped, nothing is remembered or counted against qrz.com ...
+    resolver = QrzResolver(qrz_session_key="old key")
+    fake = FakeQrz(result={"locator": None, "error": "Session Timeout"})
+    results = await lookup_all(resolver, fake, ["SP3OCC", "SP3OCC/P"])
+    assert results == [{"locator": None, "error": "Session Timeout"}] * 2 and len(fake.callsigns) == 1
+    assert resolver.qrz_session_key is None and resolver.circuit_breaker.failures == 0
+    assert not resolver.results and not resolver.negative_cache and not resolver.negative_cache_dirty
+    # Without a key nothing is asked, rate limited or counted as a failure
+    tokens = resolver.rate_limiter.tokens
+    for number in range(resolver.circuit_breaker.failure_threshold + 1):
+        assert await resolver.get_locator(f"DL{number}ABC") == {"locator": None, "error": "No qrz_session_key"}
+    assert len(fake.callsigns) == 1 and resolver.requests == 1 and resolver.rate_limiter.tokens == tokens
+    assert resolver.circuit_breaker.failures == 0 and not resolver.results and not resolver.negative_cache
+    # ... and the next cycle logs in again, although QRZ_SESSION_REFRESH hasn't passed
+    run_collector.get_qrz_session_key = lambda username, password, api_key: "new key"
+    state = SimpleNamespace(qrz_resolver=resolver, qrz_session_key="old key", qrz_session_time=run_collector.time())
+    assert await CollectorState.ensure_qrz_session(state) == "new key"
+    resolver.start_cycle(qrz_session_key=state.qrz_session_key)
+    fake = FakeQrz(result={"locator": "JO92"})
+    assert await lookup_all(resolver, fake, ["SP3OCC"]) == [{"locator": "JO92"}]
+    assert await CollectorState.ensure_qrz_session(state) == "new key"
+
+    # DX without a grid in the spot: the qrz.com grid string, or the prefix locator on an error
+    record = prepare_cluster_record("DX de SP3OCC:     3702.0  SP100IARU    95th PZK          28 1442Z JO92", source="test", now=now)
+    qrz_resolver.get_locator_from_qrz = FakeQrz(result={"locator": "KO02MD"})
+    qrz_resolver.get_locator_from_qrz.release.set()
+    holy_spot, _, geo_cache_dx = await enrich_spot(record, qrz_resolver=QrzResolver(qrz_session_key="key"), geo_cache={})
+    assert holy_spot.dx_locator == "KO02MD" and geo_cache_dx.locator == "KO02MD"
+
+    qrz_resolver.get_locator_from_qrz = FakeQrz(result={"locator": None, "error": "Not found: SP100IARU"})
+    qrz_resolver.get_locator_from_qrz.release.set()
+    holy_spot, _, _ = await enrich_spot(record, qrz_resolver=QrzResolver(qrz_session_key="key"), geo_cache={})
+    assert holy_spot.dx_locator == resolve_callsign("SP100IARU")[0]
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
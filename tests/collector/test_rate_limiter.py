@@ -0,0 +1,110 @@
+import asyncio
+import sys
+from pathlib import Path
+
+grandparent_folder = Path(__file__).parents[2] # 2 directories up
+sys.path.append(f"{grandparent_folder}/src")
+import rate_limiter
+from rate_limiter import AdaptiveRateLimiter
+
+real_sleep = asyncio.sleep
+
+
+class FakeClock:
+    """monotonic() replacement; sleeping moves it forward instead of waiting."""
+
+    resolution = 1e-6  # like a real timer: float rounding can't leave the bucket a hair short forever
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, delay: float):
+        self.now += max(delay, self.resolution)
+        await real_sleep(0)
+
+
+async def settle():
+    for _ in range(10):
+        await real_sleep(0)
+
+
+async def main(clock: FakeClock):
+    # Token bucket: a burst goes out at once, then requests are spaced at the rate
+    limiter = AdaptiveRateLimiter(rate=10, burst=3, max_in_flight=100, min_rate=1, latency_target=5)
+    for _ in range(3):
+        await limiter.acquire()
+    assert clock.now == 0
+    await limiter.acquire()
+    assert abs(clock.now - 0.1) < 1e-5
+    for _ in range(10):
+        await limiter.acquire()
+    assert abs(clock.now - 1.1) < 1e-5
+    # Idle time refills the bucket up to the burst only
+    clock.now += 60
+    start = clock.now
+    for _ in range(3):
+        await limiter.acquire()
+    assert clock.now == start
+    await limiter.acquire()
+    assert clock.now > start
+
+    # In-flight cap: the third request waits for a release, with tokens to spare
+    limiter = AdaptiveRateLimiter(rate=10, burst=10, max_in_flight=2, min_rate=1, latency_target=5)
+    await limiter.acquire()
+    await limiter.acquire()
+    third = asyncio.create_task(limiter.acquire())
+    await settle()
+    assert not third.done()
+    limiter.release(latency=0.1, success=True)
+    await settle()
+    assert third.done()
+    # A cancelled waiter gives its in-flight slot back
+    fourth = asyncio.create_task(limiter.acquire())
+    await settle()
+    fourth.cancel()
+    await settle()
+    limiter.release(latency=0.1, success=True)
+    fifth = asyncio.create_task(limiter.acquire())
+    await settle()
+    assert fifth.done()
+
+    # Failures and slow responses halve the rate, down to min_rate
+    limiter = AdaptiveRateLimiter(rate=10, burst=10, max_in_flight=10, min_rate=1, latency_target=5)
+    for _ in range(6):
+        await limiter.acquire()
+    limiter.release(latency=0.1, success=False)
+    assert limiter.rate == 5
+    limiter.release(latency=6, success=True)
+    assert limiter.rate == 2.5
+    limiter.release(latency=0.1, success=False)
+    limiter.release(latency=0.1, success=False)
+    assert limiter.rate == 1
+    limiter.release(latency=0.1, success=False)
+    assert limiter.rate == 1
+    # Good responses add a tenth of the configured rate, up to it
+    limiter.release(latency=0.1, success=True)
+    assert limiter.rate == 2
+    for _ in range(10):
+        await limiter.acquire()
+        limiter.release(latency=0.1, success=True)
+    assert limiter.rate == 10
+
+    # At the floor, requests are spaced at min_rate
+    limiter = AdaptiveRateLimiter(rate=10, burst=1, max_in_flight=10, min_rate=1, latency_target=5)
+    for _ in range(4):
+        await limiter.acquire()
+        limiter.release(latency=0.1, success=False)
+    assert limiter.rate == 1
+    start = clock.now
+    await limiter.acquire()
+    assert abs(clock.now - start - 1) < 1e-5
+
+
+if __name__ == '__main__':
+    clock = FakeClock()
+    rate_limiter.monotonic = clock
+    asyncio.sleep = clock.sleep
+    asyncio.run(main(clock))
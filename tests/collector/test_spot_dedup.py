@@ -0,0 +1,56 @@
+import sys
+import time
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+from loguru import logger
+
+grandparent_folder = Path(__file__).parents[2] # 2 directories up
+sys.path.append(f"{grandparent_folder}/src")
+from spot_dedup import SpotDedupIndex
+from spots_collector import prepare_dxheat_record
+from telnet_source import prepare_cluster_record
+
+now = datetime(2025, 5, 18, 14, 50, tzinfo=timezone.utc)
+
+dxheat_spot = {
+    "Nr": 63474769, "Spotter": "IW3GTZ", "Frequency": "14074.0", "DXCall": "JA1XYZ", "Time": "14:42",
+    "Date": "18/05/25", "Beacon": False, "MM": False, "AM": False, "Valid": True, "DXHomecall": "JA1XYZ",
+    "Comment": "FT8", "Band": 20, "Mode": "DIGI", "Continent_spotter": "EU",
+}
+
+
+def cluster_record(line):
+    return prepare_cluster_record(line, source="test", now=now)
+
+
+if __name__ == '__main__':
+    index = SpotDedupIndex(window=3600, frequency_step=1.0)
+    assert not index.seen(prepare_dxheat_record(dict(dxheat_spot)))
+    # The same spot from a cluster node, rounded differently and a minute later
+    assert index.seen(cluster_record("DX de IW3GTZ:    14074.4  JA1XYZ       FT8 -10dB        1443Z"))
+    assert index.seen(cluster_record("DX de IW3GTZ:    14073.6  JA1XYZ       FT8               1442Z"))
+    # Different dx, spotter, frequency or time are new spots
+    assert not index.seen(cluster_record("DX de IW3GTZ:    14074.0  JA2XYZ       FT8               1442Z"))
+    assert not index.seen(cluster_record("DX de DL1ABC:    14074.0  JA1XYZ       FT8               1442Z"))
+    assert not index.seen(cluster_record("DX de IW3GTZ:    21074.0  JA1XYZ       FT8               1442Z"))
+    assert not index.seen(cluster_record("DX de IW3GTZ:    14074.0  JA1XYZ       FT8               1445Z"))
+    # Forgotten spots (not stored) can come again
+    record = cluster_record("DX de G4ABC:      7030.0  VK2AA        CW                1440Z")
+    assert not index.seen(record)
+    index.forget(record)
+    assert not index.seen(record)
+
+    short_window = SpotDedupIndex(window=0.05)
+    assert not short_window.seen(record)
+    time.sleep(0.1)
+    assert not short_window.seen(record)
+    assert len(short_window) == 1
+
+    records = [
+        cluster_record(f"DX de DL{number % 500}ABC:  {14000 + number % 300}.0  JA{number}XYZ   CW   1442Z")
+        for number in range(20000)
+    ]
+    index = SpotDedupIndex(window=3600)
+    seconds = timeit.timeit(lambda: [index.seen(record) for record in records], number=1)
+    logger.debug(f"SpotDedupIndex.seen: {seconds / len(records) * 1e6:.2f} us per spot, {len(index)} keys")
@@ -0,0 +1,84 @@
+import asyncio
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from loguru import logger
+
+grandparent_folder = Path(__file__).parents[2] # 2 directories up
+sys.path.append(f"{grandparent_folder}/src")
+from telnet_source import TelnetClusterSource, parse_dx_line, prepare_cluster_record
+
+CALLSIGN = "4X5BR-1"
+
+lines = [
+"DX de SP3OCC:     3702.0  SP100IARU    95th PZK - 100th IARU SSB                                                     28 1442Z JO92",
+"DX de KC1LAA:    28471.0  CX7RM        USB                                                                           14 1442Z  8",
+"DX de DJ5LA:     24891.0  VP2VI        QSX 24892.30  CW                                                            FK78 1442Z JO44",
+"DX de OH6BG-#:   14074.0  JA1XYZ       FT8 -12 dB                                    1443Z",
+]
+
+
+class FakePipeline:
+    def __init__(self):
+        self.records = []
+
+    async def put(self, spot, parse, source):
+        self.records.append(parse(spot))
+
+
+class FakeCluster:
+    """Login prompt, expects the callsign and set/dxgrid, sends the spot lines, then hangs up."""
+
+    def __init__(self):
+        self.connections = 0
+        self.received = []
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        writer.write(b"\xff\xfb\x01Welcome to the fake cluster\r\nlogin: ")
+        await writer.drain()
+        for _ in range(3):
+            self.received.append((await reader.readline()).decode().strip())
+        writer.write(f"Hello {CALLSIGN}\r\n".encode())
+        for line in lines:
+            # Split writes: the source has to put lines together itself
+            encoded = (line + "\r\n").encode()
+            writer.write(encoded[:20])
+            await writer.drain()
+            writer.write(encoded[20:])
+            await writer.drain()
+        writer.close()
+
+
+async def main():
+    cluster = FakeCluster()
+    server = await asyncio.start_server(cluster.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    source = TelnetClusterSource(host="127.0.0.1", port=port, callsign=CALLSIGN, reconnect_min=0.1, reconnect_max=0.2)
+    pipeline = FakePipeline()
+    stop_event = asyncio.Event()
+    task = asyncio.create_task(source.run(pipeline=pipeline, stop_event=stop_event))
+    while len(pipeline.records) < 2 * len(lines):
+        await asyncio.sleep(0.05)
+    stop_event.set()
+    await task
+    server.close()
+
+    assert cluster.received[:3] == [CALLSIGN, "set/dxgrid", "unset/beep"], cluster.received
+    assert cluster.connections >= 2 and source.connections == cluster.connections
+    for record in pipeline.records:
+        logger.debug(record)
+    first = pipeline.records[0]
+    assert (first.spotter, first.dx_call, first.frequency, first.mode, first.missing_mode) == ("SP3OCC", "SP100IARU", 3702.0, "SSB", False)
+    assert first.comment == "95th PZK - 100th IARU SSB" and first.dx_locator is None
+    assert pipeline.records[1].mode == "USB"
+    assert pipeline.records[2].dx_locator == "FK78" and pipeline.records[2].mode == "CW"
+    assert pipeline.records[3].spotter == "OH6BG" and pipeline.records[3].comment == "FT8 -12 dB"
+
+
+if __name__ == '__main__':
+    assert parse_dx_line("not a spot") is None
+    # 23:59 seen at 00:01 was spotted yesterday
+    record = prepare_cluster_record(lines[0].replace("1442Z", "2359Z"), source="test", now=datetime(2025, 5, 18, 0, 1, tzinfo=timezone.utc))
+    assert record.date_time == datetime(2025, 5, 17, 23, 59, tzinfo=timezone.utc)
+    asyncio.run(main())
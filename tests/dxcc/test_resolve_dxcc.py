@@ -0,0 +1,28 @@
+import sys
+import timeit
+from pathlib import Path
+from loguru import logger
+
+grandparent_folder = Path(__file__).parents[2] # 2 directories up
+sys.path.append(f"{grandparent_folder}")
+from src.dxcc import resolve_dxcc
+
+call_signs = [
+    "4X5BR", "DL1ABC", "W1AW", "KH6ABC", "KL7AA", "EA8ABC", "EA8/DL1ABC", "DL1ABC/EA8",
+    "IZ3WUW/P", "W1ABC/4", "G4ABC/MM", "UA9ABC", "R1FJ", "VP2VI", "3B8AA", "SP100IARU",
+    "GM3ABC", "JA1XYZ", "VK2AA", "ZS6NOP", "LU1EFG", "CX7RM", "9A3KLM", "OZ1FGH",
+]
+
+
+if __name__ == '__main__':
+    for callsign in call_signs:
+        entity = resolve_dxcc(callsign)
+        logger.debug(f"{callsign=:12} {entity}")
+
+    number = 200
+    resolve_dxcc.cache_clear()
+    uncached = timeit.timeit(lambda: [resolve_dxcc.__wrapped__(callsign) for callsign in call_signs], number=number)
+    cached = timeit.timeit(lambda: [resolve_dxcc(callsign) for callsign in call_signs], number=number)
+    lookups = number * len(call_signs)
+    logger.debug(f"indexed regex: {uncached / lookups * 1e6:6.2f} us per callsign ({lookups / uncached:,.0f} per second)")
+    logger.debug(f"with LRU:      {cached / lookups * 1e6:6.2f} us per callsign ({lookups / cached:,.0f} per second)")
@@ -0,0 +1,47 @@
+import sys
+import timeit
+import random
+from pathlib import Path
+from loguru import logger
+
+grandparent_folder = Path(__file__).parents[2] # 2 directories up
+sys.path.append(f"{grandparent_folder}")
+from src.location import locator_to_coordinates, locators_to_coordinates, coordinates_to_locators
+
+
+def random_locator(length: int) -> str:
+    fields = "ABCDEFGHIJKLMNOPQR"
+    subsquares = "abcdefghijklmnopqrstuvwx"
+    digits = "0123456789"
+    locator = random.choice(fields) + random.choice(fields) + random.choice(digits) + random.choice(digits)
+    if length >= 6:
+        locator += random.choice(subsquares) + random.choice(subsquares)
+    if length == 8:
+        locator += random.choice(digits) + random.choice(digits)
+    return locator
+
+
+bad_locators = [None, "", "KM7", "KM72j", "ZZ00", "KM72jb1", "KMAB", "KM72jb12345"]
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    locators = [random_locator(random.choice([4, 6, 8])) for _ in range(20000)]
+
+    lat, lon, valid = locators_to_coordinates(locators + bad_locators)
+    assert valid[:len(locators)].all()
+    assert not valid[len(locators):].any()
+    for index, locator in enumerate(locators):
+        assert locator_to_coordinates(locator) == (lat[index], lon[index]), locator
+
+    six_characters = [locator[:6] for locator in locators if len(locator) >= 6]
+    lat, lon, _ = locators_to_coordinates(six_characters)
+    # Move into the subsquare so truncation doesn't put us in the neighbour
+    back, valid = coordinates_to_locators(lat + 0.01, lon + 0.02, length=6)
+    assert valid.all()
+    assert list(back) == six_characters
+
+    scalar = timeit.timeit(lambda: [locator_to_coordinates(locator) for locator in locators], number=5)
+    batch = timeit.timeit(lambda: locators_to_coordinates(locators), number=5)
+    logger.debug(f"locator_to_coordinates:  {scalar / 5 / len(locators) * 1e6:8.3f} us per locator")
+    logger.debug(f"locators_to_coordinates: {batch / 5 / len(locators) * 1e6:8.3f} us per locator")
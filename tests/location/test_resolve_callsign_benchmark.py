@@ -0,0 +1,45 @@
+import re
+import sys
+import timeit
+from pathlib import Path
+from loguru import logger
+
+grandparent_folder = Path(__file__).parents[2] # 2 directories up
+sys.path.append(f"{grandparent_folder}")
+from src.location import PREFIXES_TO_LOCATORS, resolve_callsign
+
+
+def resolve_callsign_linear(callsign: str):
+    # The original implementation: a re.match per prefixes_list.csv row
+    callsign = callsign.upper()
+    for regex, locator, country, continent in PREFIXES_TO_LOCATORS:
+        if re.match(regex + ".*", callsign):
+            return locator, country, continent
+    return None, None, None
+
+
+random_call_signs = [
+    "W1ABC", "VE2DEF", "G3GHI", "JA4JKL", "VK5MNO",
+    "DL6PQR", "EA7STU", "F8VWX", "PA9YZA", "SM0BCD",
+    "LU1EFG", "ZS2HIJ", "9A3KLM", "RA4NOP", "YB5QRS",
+    "ZL6TUV", "CE7WXY", "5B8ZAB", "HB9CDE", "OZ1FGH",
+    "4X5BR", "EA8ABC", "KH6ABC", "VP2VI", "3B8AA",
+    "SP100IARU", "R1FJ", "CX7RM", "4U1UN", "ZZ9ZZZ",
+]
+
+
+if __name__ == '__main__':
+    for callsign in random_call_signs:
+        assert resolve_callsign_linear(callsign) == resolve_callsign(callsign), callsign
+
+    number = 200
+    linear = timeit.timeit(lambda: [resolve_callsign_linear(callsign) for callsign in random_call_signs], number=number)
+    resolve_callsign.cache_clear()
+    compiled = timeit.timeit(
+        lambda: [resolve_callsign.__wrapped__(callsign) for callsign in random_call_signs], number=number
+    )
+    memoized = timeit.timeit(lambda: [resolve_callsign(callsign) for callsign in random_call_signs], number=number)
+    lookups = number * len(random_call_signs)
+    logger.debug(f"linear scan:     {linear / lookups * 1e6:8.2f} us per callsign")
+    logger.debug(f"compiled regex:  {compiled / lookups * 1e6:8.2f} us per callsign")
+    logger.debug(f"compiled + LRU:  {memoized / lookups * 1e6:8.2f} us per callsign")